@@ -0,0 +1,109 @@
+# common/binned.py
+# Pre-binned copy of the features: every feature column is quantized to small
+# integer bin codes (uint8 for <=255 bins) and stored as one row-major .npy
+# matrix that readers np.load(..., mmap_mode="r") without any parquet decode.
+#
+#   <run_dir>/binned/X.npy      bin codes, rows x features
+#   <run_dir>/binned/y.npy      target (float32)
+#   <run_dir>/binned/bins.json  columns, bin edges, dtype
+#
+# Code 0 is "missing"; value v of a column falls in bin searchsorted(edges, v) + 1,
+# so codes are monotone in the value and tree splits on codes are splits on edges.
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BINNED_DIR = "binned"
+# bins per feature, missing bin included (<=256 -> uint8, else uint16)
+MAX_BINS = min(int(os.environ.get("CROPSENSE_MAX_BINS", "255")), 65535)
+# edges are fitted on a sample; quantiles of 200k rows are plenty for 255 bins
+EDGE_SAMPLE_ROWS = 200_000
+
+
+def _bin_dtype(max_bins: int):
+    return np.uint8 if max_bins <= 256 else np.uint16
+
+
+def fit_edges(values: np.ndarray, max_bins: int = MAX_BINS, seed: int = 0) -> np.ndarray:
+    """Upper bin boundaries for one column (at most max_bins - 2 of them)"""
+    v = values[~np.isnan(values)]
+    if len(v) > EDGE_SAMPLE_ROWS:
+        v = np.random.default_rng(seed).choice(v, EDGE_SAMPLE_ROWS, replace=False)
+    uniq = np.unique(v)
+    if len(uniq) <= max_bins - 1:
+        # low cardinality (codes, flags): one bin per distinct value
+        return (uniq[:-1] + uniq[1:]) / 2
+    return np.unique(np.quantile(v, np.linspace(0, 1, max_bins - 1)[1:-1]))
+
+
+def _to_codes(values: np.ndarray, edges: np.ndarray, dtype) -> np.ndarray:
+    codes = np.searchsorted(edges, values, side="right") + 1
+    codes[np.isnan(values)] = 0
+    return codes.astype(dtype)
+
+
+def write_binned(df: pd.DataFrame, feature_columns: List[str], target: Optional[str],
+                 run_dir: Path, max_bins: int = MAX_BINS) -> Path:
+    out = run_dir / BINNED_DIR
+    out.mkdir(parents=True, exist_ok=True)
+    dtype = _bin_dtype(max_bins)
+
+    # fill the memmap column by column so no full float copy is held
+    X = np.lib.format.open_memmap(out / "X.npy", mode="w+", dtype=dtype,
+                                  shape=(len(df), len(feature_columns)))
+    edges = {}
+    for j, c in enumerate(feature_columns):
+        values = df[c].to_numpy(dtype=np.float64, na_value=np.nan)
+        e = fit_edges(values, max_bins)
+        X[:, j] = _to_codes(values, e, dtype)
+        edges[c] = e.tolist()
+    X.flush()
+    del X
+
+    if target is not None:
+        np.save(out / "y.npy", df[target].to_numpy(dtype=np.float32, na_value=np.nan))
+    meta = {"columns": feature_columns, "edges": edges, "dtype": np.dtype(dtype).name,
+            "rows": len(df), "target": target, "max_bins": max_bins}
+    (out / "bins.json").write_text(json.dumps(meta))
+    return out
+
+
+def binned_exists(run_dir: Optional[Path]) -> bool:
+    return run_dir is not None and (run_dir / BINNED_DIR / "bins.json").exists()
+
+
+def load_binning(run_dir: Path) -> dict:
+    return json.loads((run_dir / BINNED_DIR / "bins.json").read_text())
+
+
+def load_binned(run_dir: Path, mmap: bool = True) -> Tuple[np.ndarray, Optional[np.ndarray], dict]:
+    """(bin code matrix, target, binning meta) of a run; the matrix is memory-mapped"""
+    base = run_dir / BINNED_DIR
+    meta = load_binning(run_dir)
+    X = np.load(base / "X.npy", mmap_mode="r" if mmap else None)
+    y = np.load(base / "y.npy", mmap_mode="r" if mmap else None) if (base / "y.npy").exists() else None
+    return X, y, meta
+
+
+def apply_bins(df: pd.DataFrame, binning: dict) -> np.ndarray:
+    """Bin already-preprocessed rows the same way the stored matrix was binned"""
+    dtype = np.dtype(binning["dtype"])
+    out = np.zeros((len(df), len(binning["columns"])), dtype=dtype)
+    for j, c in enumerate(binning["columns"]):
+        if c in df.columns:
+            values = df[c].to_numpy(dtype=np.float64, na_value=np.nan)
+            out[:, j] = _to_codes(values, np.asarray(binning["edges"][c]), dtype)
+    return out
+
+
+def bin_counts(run_dir: Path, column: str) -> Dict[str, list]:
+    """Histogram of one feature straight from the bin codes (no parquet read)"""
+    X, _, meta = load_binned(run_dir)
+    j = meta["columns"].index(column)
+    edges = meta["edges"][column]
+    counts = np.bincount(X[:, j], minlength=len(edges) + 2)
+    return {"edges": edges, "missing": int(counts[0]), "counts": counts[1:].tolist()}
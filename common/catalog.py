@@ -0,0 +1,302 @@
+# common/catalog.py
+# SQLite catalog of raw files in data/raw (written by the collector, read by the
+# collector's /list and the preprocessor's latest-file lookup). Listing is keyset
+# paginated on (ingested_at, id), so a page costs O(page) however many files exist.
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .hashing import CHUNK_SIZE, sha256_file
+
+RAW_DIR = Path("data/raw")
+CATALOG_PATH = Path(os.environ.get("CROPSENSE_CATALOG_DB", str(RAW_DIR / "_catalog.db")))
+# JSON sha256 -> path index used before the catalog existed (imported once)
+LEGACY_INDEX = RAW_DIR / "_index.json"
+MAX_PAGE = 500
+
+_thread_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def get_connection() -> sqlite3.Connection:
+    """Connection for the current thread"""
+    if getattr(_thread_local, "conn", None) is None:
+        CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(CATALOG_PATH, check_same_thread=False, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        # WAL: readers (preprocessor, /list) don't block the collector's writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        _thread_local.conn = conn
+    return _thread_local.conn
+
+
+@contextmanager
+def transaction():
+    conn = get_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def init_catalog():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        with transaction() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS raw_files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    sha256 TEXT UNIQUE NOT NULL,
+                    size INTEGER,
+                    rows INTEGER,
+                    columns TEXT,
+                    format TEXT,
+                    source TEXT,
+                    ingested_at TEXT NOT NULL
+                )"""
+            )
+            # lineage: small files merged by data_collector/compaction.py point at their
+            # compacted file and are deleted (retired_at set, row kept) after retention
+            have = {c[1] for c in conn.execute("PRAGMA table_info(raw_files)")}
+            for col, decl in (("compacted_into", "INTEGER REFERENCES raw_files(id)"),
+                              ("compacted_at", "TEXT"), ("retired_at", "TEXT")):
+                if col not in have:
+                    conn.execute(f"ALTER TABLE raw_files ADD COLUMN {col} {decl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS raw_files_ingested ON raw_files (ingested_at, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS raw_files_source ON raw_files (source, ingested_at, id)")
+            empty = conn.execute("SELECT COUNT(*) FROM raw_files").fetchone()[0] == 0
+        _initialized = True
+    if empty:
+        _backfill()
+
+
+def _iso(ts: datetime) -> str:
+    # fixed width so ingested_at sorts correctly as text
+    return ts.isoformat(timespec="microseconds") + "Z"
+
+
+def _ingest_time(p: Path) -> str:
+    # collector file names carry the ingest time (raw_crop_20251002T205131Z.csv)
+    m = re.search(r"(\d{8}T\d{6})Z", p.name)
+    if m:
+        return _iso(datetime.strptime(m.group(1), "%Y%m%dT%H%M%S"))
+    return _iso(datetime.utcfromtimestamp(p.stat().st_mtime))
+
+
+def _backfill():
+    """First run: catalog what's already on disk (oldest copy of a payload wins)"""
+    known = {}
+    if LEGACY_INDEX.exists():
+        known = {path: digest for digest, path in json.loads(LEGACY_INDEX.read_text()).items()}
+    if not RAW_DIR.exists():
+        return
+    for p in sorted([*RAW_DIR.glob("*.csv"), *RAW_DIR.glob("*.parquet")], key=lambda p: p.name):
+        digest = known.get(str(p)) or sha256_file(p)
+        register(p, digest, source="backfill", ingested_at=_ingest_time(p))
+
+
+def profile(path) -> Dict[str, object]:
+    """Row count and column names (parquet: from the footer; CSV: header + newline count)"""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        md = pq.read_metadata(path)
+        return {"rows": md.num_rows, "columns": md.schema.to_arrow_schema().names, "format": "parquet"}
+    columns = [str(c).strip() for c in pd.read_csv(path, nrows=0).columns]
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1  # no trailing newline
+    return {"rows": max(0, lines - 1), "columns": columns, "format": "csv"}
+
+
+def register(path, sha256: str, source: Optional[str] = None,
+             ingested_at: Optional[str] = None) -> Optional[int]:
+    """Add a raw file and return its id; None if its content (or path) is already catalogued"""
+    init_catalog()
+    info = profile(path)
+    try:
+        with transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO raw_files (path, sha256, size, rows, columns, format, source, ingested_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(path), sha256, Path(path).stat().st_size, info["rows"], json.dumps(info["columns"]),
+                 info["format"], source, ingested_at or _iso(datetime.utcnow())))
+        return cur.lastrowid
+    except sqlite3.IntegrityError:
+        return None
+
+
+def replace_path(sha256: str, new_path):
+    """Point an entry at a converted copy of the same payload (e.g. CSV -> parquet)"""
+    info = profile(new_path)
+    with transaction() as conn:
+        conn.execute("UPDATE raw_files SET path = ?, size = ?, rows = ?, columns = ?, format = ? WHERE sha256 = ?",
+                     (str(new_path), Path(new_path).stat().st_size, info["rows"],
+                      json.dumps(info["columns"]), info["format"], sha256))
+
+
+def reinstate(path, sha256: str, source: Optional[str] = None) -> Optional[int]:
+    """Point a stale entry (retired, or its file gone) at a fresh copy of its payload.
+
+    The sha256 stays UNIQUE after retirement, so a re-upload can't be registered anew.
+    """
+    init_catalog()
+    info = profile(path)
+    with transaction() as conn:
+        r = conn.execute(
+            "UPDATE raw_files SET path = ?, size = ?, rows = ?, columns = ?, format = ?, source = ?,"
+            " ingested_at = ?, compacted_into = NULL, compacted_at = NULL, retired_at = NULL"
+            " WHERE sha256 = ? RETURNING id",
+            (str(path), Path(path).stat().st_size, info["rows"], json.dumps(info["columns"]), info["format"],
+             source, _iso(datetime.utcnow()), sha256)).fetchone()
+    return r["id"] if r is not None else None
+
+
+def _row(r: sqlite3.Row) -> dict:
+    d = dict(r)
+    d["columns"] = json.loads(d["columns"]) if d["columns"] else []
+    return d
+
+
+def _forget(conn: sqlite3.Connection, entry_id: int):
+    # the file was deleted behind our back
+    conn.execute("DELETE FROM raw_files WHERE id = ?", (entry_id,))
+    conn.commit()
+
+
+def get(entry_id: int) -> Optional[dict]:
+    init_catalog()
+    r = get_connection().execute("SELECT * FROM raw_files WHERE id = ?", (entry_id,)).fetchone()
+    return _row(r) if r is not None else None
+
+
+def lookup(sha256: str) -> Optional[dict]:
+    """Entry holding this payload; for a compacted file, the compacted file's entry"""
+    init_catalog()
+    conn = get_connection()
+    r = conn.execute("SELECT * FROM raw_files WHERE sha256 = ?", (sha256,)).fetchone()
+    if r is None:
+        return None
+    if r["compacted_into"] is not None:
+        merged = get(r["compacted_into"])
+        if merged is not None and os.path.exists(merged["path"]):
+            return merged
+    if not os.path.exists(r["path"]):
+        if r["retired_at"] is None:
+            _forget(conn, r["id"])
+        return None
+    return _row(r)
+
+
+def latest() -> Optional[dict]:
+    """Most recently ingested raw file that still exists (compacted originals excluded)"""
+    init_catalog()
+    conn = get_connection()
+    while True:
+        r = conn.execute("SELECT * FROM raw_files WHERE compacted_into IS NULL"
+                         " ORDER BY ingested_at DESC, id DESC LIMIT 1").fetchone()
+        if r is None:
+            return None
+        if os.path.exists(r["path"]):
+            return _row(r)
+        _forget(conn, r["id"])
+
+
+def list_files(limit: int = 50, cursor: Optional[str] = None, source: Optional[str] = None,
+               fmt: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+               name: Optional[str] = None, include_compacted: bool = False) -> dict:
+    """Newest first. ``cursor`` is the next_cursor of the previous page."""
+    init_catalog()
+    where, args = [], []
+    if not include_compacted:
+        where.append("compacted_into IS NULL")
+    if cursor:
+        at, entry_id = cursor.rsplit("|", 1)
+        where.append("(ingested_at < ? OR (ingested_at = ? AND id < ?))")
+        args += [at, at, int(entry_id)]
+    if source:
+        # "upload" matches "upload:<filename>" etc.
+        where.append("(source = ? OR source LIKE ?)")
+        args += [source, source + ":%"]
+    if fmt:
+        where.append("format = ?")
+        args.append(fmt)
+    if since:
+        where.append("ingested_at >= ?")
+        args.append(since)
+    if until:
+        where.append("ingested_at < ?")
+        args.append(until)
+    if name:
+        where.append("path LIKE ?")
+        args.append(f"%{name}%")
+    limit = max(1, min(limit, MAX_PAGE))
+    sql = "SELECT * FROM raw_files"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY ingested_at DESC, id DESC LIMIT ?"
+    rows = [_row(r) for r in get_connection().execute(sql, args + [limit + 1]).fetchall()]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = f"{rows[-1]['ingested_at']}|{rows[-1]['id']}" if more else None
+    return {"files": rows, "next_cursor": next_cursor}
+
+
+# ---------- compaction lineage ----------
+
+def compaction_candidates(max_size: int) -> List[dict]:
+    """Live, not yet compacted files smaller than max_size, oldest first"""
+    init_catalog()
+    rows = get_connection().execute(
+        "SELECT * FROM raw_files WHERE compacted_into IS NULL AND retired_at IS NULL AND size < ?"
+        " AND (source IS NULL OR source NOT LIKE 'compaction:%') ORDER BY ingested_at, id",
+        (max_size,)).fetchall()
+    return [_row(r) for r in rows]
+
+
+def record_compaction(output_id: int, member_ids: List[int]):
+    now = _iso(datetime.utcnow())
+    with transaction() as conn:
+        conn.executemany("UPDATE raw_files SET compacted_into = ?, compacted_at = ? WHERE id = ?",
+                         [(output_id, now, m) for m in member_ids])
+
+
+def members_past_retention(retention_seconds: float) -> List[dict]:
+    init_catalog()
+    cutoff = _iso(datetime.utcnow() - timedelta(seconds=retention_seconds))
+    rows = get_connection().execute(
+        "SELECT * FROM raw_files WHERE compacted_into IS NOT NULL AND retired_at IS NULL"
+        " AND compacted_at < ?", (cutoff,)).fetchall()
+    return [_row(r) for r in rows]
+
+
+def mark_retired(entry_id: int):
+    with transaction() as conn:
+        conn.execute("UPDATE raw_files SET retired_at = ? WHERE id = ?", (_iso(datetime.utcnow()), entry_id))
+
+
+def lineage(entry_id: int) -> List[dict]:
+    """Files that were merged into entry_id"""
+    init_catalog()
+    rows = get_connection().execute(
+        "SELECT * FROM raw_files WHERE compacted_into = ? ORDER BY ingested_at, id", (entry_id,)).fetchall()
+    return [_row(r) for r in rows]
@@ -0,0 +1,214 @@
+# common/dataset.py
+# Processed features are stored as a hive-partitioned parquet dataset
+# (crop_code=<int>/region_code=<int>/part-*.parquet) so readers that only need
+# one crop or region prune partitions and row groups instead of reading it all.
+#
+# Every preprocessing run writes into its own directory
+#   data/processed[/datasets/<name>]/runs/<run_id>/{features,artifacts,quarantine,manifest.json}
+# and is published by atomically replacing the CURRENT pointer file, so readers
+# never see a half-written run and independent pipelines don't collide.
+import os
+import re
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import joblib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+PROCESSED_DIR = Path("data/processed")
+CURRENT_POINTER = "CURRENT"
+# layouts written by older preprocessor versions (read-only fallbacks)
+FEATURES_DIR = PROCESSED_DIR / "features"
+LEGACY_FEATURES = PROCESSED_DIR / "features.parquet"
+LEGACY_ARTIFACTS = Path("common/models")
+
+# published runs kept per dataset (the current one included)
+KEEP_RUNS = int(os.environ.get("CROPSENSE_KEEP_RUNS", "3"))
+# unpublished runs older than this are treated as abandoned
+STALE_RUN_SECONDS = 24 * 3600
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+# partition keys hold the integer category codes
+PARTITION_COLS = {"Crop": "crop_code", "Region": "region_code"}
+ROW_GROUP_SIZE = 64_000
+
+
+def processed_root(dataset: Optional[str] = None) -> Path:
+    """Root directory of a pipeline namespace (the default one is data/processed)"""
+    if not dataset:
+        return PROCESSED_DIR
+    if not _NAME_RE.match(dataset):
+        raise ValueError(f"Invalid dataset name: {dataset!r}")
+    return PROCESSED_DIR / "datasets" / dataset
+
+
+def new_run_dir(dataset: Optional[str] = None) -> Path:
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + "-" + uuid.uuid4().hex[:6]
+    run_dir = processed_root(dataset) / "runs" / run_id
+    run_dir.mkdir(parents=True)
+    return run_dir
+
+
+def current_run_dir(dataset: Optional[str] = None) -> Optional[Path]:
+    root = processed_root(dataset)
+    try:
+        run_id = (root / CURRENT_POINTER).read_text().strip()
+    except FileNotFoundError:
+        return None
+    run_dir = root / "runs" / run_id
+    return run_dir if run_dir.exists() else None
+
+
+def publish_run(run_dir: Path, dataset: Optional[str] = None):
+    """Point CURRENT at run_dir (atomic rename) and prune old runs"""
+    root = processed_root(dataset)
+    tmp = root / f".{CURRENT_POINTER}.{uuid.uuid4().hex}"
+    tmp.write_text(run_dir.name)
+    os.replace(tmp, root / CURRENT_POINTER)
+    _prune_runs(root, run_dir.name)
+
+
+def _prune_runs(root: Path, current: str):
+    runs = sorted(p for p in (root / "runs").iterdir() if p.is_dir())
+    finished = [p for p in runs if (p / "manifest.json").exists() and p.name <= current]
+    for p in finished[:max(0, len(finished) - KEEP_RUNS)]:
+        shutil.rmtree(p, ignore_errors=True)
+    # runs of other pipelines may still be in progress; only drop long-abandoned ones
+    for p in runs:
+        if p.exists() and not (p / "manifest.json").exists() and time.time() - p.stat().st_mtime > STALE_RUN_SECONDS:
+            shutil.rmtree(p, ignore_errors=True)
+
+
+def features_source(dataset: Optional[str] = None) -> Path:
+    """Path of the dataset consumers should read (published run, or a legacy layout)"""
+    run_dir = current_run_dir(dataset)
+    if run_dir is not None and (run_dir / "features").exists():
+        return run_dir / "features"
+    if not dataset:
+        if FEATURES_DIR.exists() and any(FEATURES_DIR.rglob("*.parquet")):
+            return FEATURES_DIR
+        if LEGACY_FEATURES.exists():
+            return LEGACY_FEATURES
+    raise FileNotFoundError("Processed data not found, run preprocessor first.")
+
+
+def features_exist(dataset: Optional[str] = None) -> bool:
+    try:
+        features_source(dataset)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def load_artifacts(run_dir: Optional[Path] = None) -> Dict[str, object]:
+    """Preprocessing artifacts (encoders, imputer, scaler, num_cols) of a run"""
+    base = run_dir / "artifacts" if run_dir is not None else LEGACY_ARTIFACTS
+    out = {}
+    for name in ["imputer", "scaler", "encoders", "num_cols"]:
+        try:
+            out[name] = joblib.load(base / f"{name}.joblib")
+        except Exception:
+            out[name] = None
+    return out
+
+
+def write_features(df: pd.DataFrame, out_dir: Path) -> Path:
+    """Write df as a hive-partitioned dataset with row-group statistics"""
+    part_cols = [p for c, p in PARTITION_COLS.items() if p in df.columns]
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    fmt = ds.ParquetFileFormat()
+    ds.write_dataset(
+        table,
+        out_dir,
+        format=fmt,
+        file_options=fmt.make_write_options(write_statistics=True, compression="snappy"),
+        partitioning=ds.partitioning(table.select(part_cols).schema, flavor="hive") if part_cols else None,
+        basename_template="part-{i}.parquet",
+        max_rows_per_group=ROW_GROUP_SIZE,
+        max_rows_per_file=ROW_GROUP_SIZE * 8,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return out_dir
+
+
+def _codes_for(column: str, values, encoders: Dict[str, Dict[str, int]]) -> List[int]:
+    """Translate category labels (or codes) into partition codes"""
+    if isinstance(values, (str, int)):
+        values = [values]
+    mapping = encoders.get(column, {})
+    lowered = {str(k).lower(): v for k, v in mapping.items()}
+    codes = []
+    for v in values:
+        if isinstance(v, int):
+            codes.append(v)
+        elif str(v).strip().lower() in lowered:
+            codes.append(lowered[str(v).strip().lower()])
+        else:
+            codes.append(-1)  # unknown label -> the "unseen" partition
+    return codes
+
+
+def _resolve(dataset: Optional[str], run_dir: Optional[Path]):
+    """(features path, run dir) for a reader; pass run_dir to pin one run"""
+    if run_dir is not None:
+        return run_dir / "features", run_dir
+    src = features_source(dataset)
+    is_run = src.name == "features" and src.parent.parent.name == "runs"
+    return src, (src.parent if is_run else None)
+
+
+def _partition_filter(data, run_dir, crop=None, region=None, filters=None):
+    names = set(data.schema.names)
+    expr = filters
+    encoders = {}
+    if crop is not None or region is not None:
+        encoders = load_artifacts(run_dir).get("encoders") or {}
+    for column, value in (("Crop", crop), ("Region", region)):
+        part = PARTITION_COLS[column]
+        if value is None or part not in names:
+            continue  # legacy single-file dataset: nothing to prune on
+        e = ds.field(part).isin(_codes_for(column, value, encoders))
+        expr = e if expr is None else expr & e
+    return expr
+
+
+def read_features(columns: Optional[Iterable[str]] = None,
+                  crop=None, region=None,
+                  filters=None,
+                  include_partition_cols: bool = False,
+                  dataset: Optional[str] = None,
+                  run_dir: Optional[Path] = None) -> pd.DataFrame:
+    """Read the processed dataset, pruning partitions and row groups.
+
+    ``crop`` / ``region`` accept a label ("Wheat"), a code, or a list of
+    either. ``filters`` is a pyarrow expression on regular columns.
+    """
+    src, run_dir = _resolve(dataset, run_dir)
+    data = ds.dataset(src, format="parquet", partitioning="hive")
+    names = set(data.schema.names)
+    expr = _partition_filter(data, run_dir, crop, region, filters)
+
+    part_names = set(PARTITION_COLS.values())
+    if columns is None:
+        cols = [c for c in data.schema.names if include_partition_cols or c not in part_names]
+    else:
+        cols = [c for c in columns if c in names]
+    return data.to_table(columns=cols, filter=expr).to_pandas()
+
+
+def count_rows(crop=None, region=None, dataset: Optional[str] = None) -> int:
+    """Row count from partition pruning and parquet metadata only"""
+    src, run_dir = _resolve(dataset, None)
+    data = ds.dataset(src, format="parquet", partitioning="hive")
+    return data.count_rows(filter=_partition_filter(data, run_dir, crop, region))
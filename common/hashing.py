@@ -0,0 +1,25 @@
+# common/hashing.py
+import hashlib
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+
+def sha256_file(path, chunk_size: int = CHUNK_SIZE) -> str:
+    """Hex sha256 of a file, read in fixed-size chunks"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def copy_and_hash(src, dst, chunk_size: int = CHUNK_SIZE) -> str:
+    """Stream src to dst and return the sha256 of the bytes copied"""
+    h = hashlib.sha256()
+    Path(dst).parent.mkdir(parents=True, exist_ok=True)
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        for block in iter(lambda: fin.read(chunk_size), b""):
+            h.update(block)
+            fout.write(block)
+    return h.hexdigest()
@@ -0,0 +1,320 @@
+# common/history.py
+# SQLite history of pipeline work, shared by the services through data/:
+#   stage_runs     one row per collect/preprocess/train execution, written by the
+#                  service doing the work (timings, rows, throughput, peak memory,
+#                  outcome) and by the orchestrator for its cache hits
+#   pipeline_runs  one row per orchestrated DAG run (orchestrator/dag.py)
+#   stage_cache    content-addressed stage outputs: cache key -> output
+# started_at is indexed (alone and per stage), so time-range queries only touch
+# the rows in range.
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = Path(os.environ.get("CROPSENSE_PIPELINE_DB", "data/pipeline/history.db"))
+STAGES = ["collect", "preprocess", "train"]
+MAX_PAGE = 500
+# ISO prefix lengths used to bucket trends
+BUCKETS = {"minute": 16, "hour": 13, "day": 10}
+# orchestrator -> service header naming the pipeline run a call belongs to
+RUN_HEADER = "X-Pipeline-Run"
+
+_thread_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+# fields a service measures and an orchestrator record must not overwrite
+_METRICS = ("started_at", "seconds", "rows", "rows_per_sec", "peak_rss_mb", "trigger")
+
+
+def get_connection() -> sqlite3.Connection:
+    """Connection for the current thread (stages and request handlers run in pools)"""
+    if getattr(_thread_local, "conn", None) is None:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        _thread_local.conn = conn
+    return _thread_local.conn
+
+
+@contextmanager
+def transaction():
+    conn = get_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def init_db():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        with transaction() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS pipeline_runs (
+                    id TEXT PRIMARY KEY,
+                    pipeline TEXT NOT NULL,
+                    params TEXT,
+                    status TEXT NOT NULL,
+                    started_at TEXT NOT NULL,
+                    finished_at TEXT,
+                    seconds REAL
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS stage_runs (
+                    id INTEGER PRIMARY KEY,
+                    run_id TEXT REFERENCES pipeline_runs(id),
+                    stage TEXT NOT NULL,
+                    trigger TEXT,
+                    status TEXT NOT NULL,
+                    started_at TEXT NOT NULL,
+                    finished_at TEXT,
+                    seconds REAL,
+                    rows INTEGER,
+                    rows_per_sec REAL,
+                    peak_rss_mb REAL,
+                    cache_key TEXT,
+                    cache_hit INTEGER NOT NULL DEFAULT 0,
+                    output TEXT,
+                    error TEXT,
+                    UNIQUE (run_id, stage)
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS stage_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    output TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pipeline_runs_started ON pipeline_runs (started_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS stage_runs_started ON stage_runs (started_at, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS stage_runs_stage ON stage_runs (stage, started_at)")
+        _initialized = True
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="microseconds") + "Z"
+
+
+# ---------- stage executions ----------
+
+@contextmanager
+def track(stage: str, run_id: Optional[str] = None, trigger: Optional[str] = None) -> Iterator[dict]:
+    """Record one execution of stage around the with-block.
+
+    The block fills the yielded dict with what it measured (rows, peak_rss_mb,
+    output, ...). A failing block is recorded as failed and re-raised; failing
+    to write the history never fails the work itself.
+    """
+    rec: dict = {}
+    started_at, t0 = _now(), time.perf_counter()
+    row_id = None
+    try:
+        init_db()
+        with transaction() as conn:
+            row_id = conn.execute(
+                "INSERT INTO stage_runs (run_id, stage, trigger, status, started_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (run_id, stage) DO UPDATE SET status = excluded.status,"
+                " started_at = excluded.started_at RETURNING id",
+                (run_id, stage, trigger, "running", started_at)).fetchone()[0]
+    except Exception as e:  # bookkeeping: never fail the work over it
+        logger.warning("Could not record %s start: %r", stage, e)
+    status, error = "succeeded", None
+    try:
+        yield rec
+    except BaseException as e:
+        status, error = "failed", str(e) or type(e).__name__
+        raise
+    finally:
+        seconds = round(time.perf_counter() - t0, 3)
+        if row_id is not None:
+            try:
+                rows = rec.get("rows")
+                rate = rec.get("rows_per_sec") or (round(rows / seconds, 1) if rows and seconds else None)
+                with transaction() as conn:
+                    conn.execute(
+                        "UPDATE stage_runs SET status = ?, finished_at = ?, seconds = ?, rows = ?,"
+                        " rows_per_sec = ?, peak_rss_mb = ?, output = ?, error = ? WHERE id = ?",
+                        (status, _now(), seconds, rows, rate, rec.get("peak_rss_mb"),
+                         json.dumps(rec["output"], default=str) if rec.get("output") is not None else None,
+                         error, row_id))
+            except Exception as e:
+                logger.warning("Could not record %s result: %r", stage, e)
+
+
+def record_stage(run_id: str, stage: str, status: str, cache_key: Optional[str] = None,
+                 cache_hit: bool = False, started_at: Optional[str] = None, seconds: Optional[float] = None,
+                 output: Optional[dict] = None, error: Optional[str] = None):
+    """Orchestrator's view of a stage; merges into the row the service wrote for the same run"""
+    keep = ", ".join(f"{c} = COALESCE(stage_runs.{c}, excluded.{c})" for c in _METRICS)
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO stage_runs (run_id, stage, trigger, status, started_at, finished_at, seconds,"
+            " cache_key, cache_hit, output, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (run_id, stage) DO UPDATE SET status = excluded.status,"
+            " finished_at = excluded.finished_at, cache_key = excluded.cache_key,"
+            " cache_hit = excluded.cache_hit, output = COALESCE(excluded.output, stage_runs.output),"
+            f" error = excluded.error, {keep}",
+            (run_id, stage, "orchestrator", status, started_at or _now(), _now(), seconds, cache_key,
+             int(cache_hit), json.dumps(output, default=str) if output is not None else None, error))
+
+
+def _stage_row(r: sqlite3.Row) -> dict:
+    s = dict(r)
+    s["cache_hit"] = bool(s["cache_hit"])
+    s["output"] = json.loads(s["output"]) if s["output"] else None
+    return s
+
+
+def list_stage_runs(since: Optional[str] = None, until: Optional[str] = None, stage: Optional[str] = None,
+                    status: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None) -> dict:
+    """Newest first; ``cursor`` is the next_cursor of the previous page"""
+    init_db()
+    where, args = [], []
+    if stage:
+        where.append("stage = ?")
+        args.append(stage)
+    if since:
+        where.append("started_at >= ?")
+        args.append(since)
+    if until:
+        where.append("started_at < ?")
+        args.append(until)
+    if status:
+        where.append("status = ?")
+        args.append(status)
+    if cursor:
+        at, row_id = cursor.rsplit("|", 1)
+        where.append("(started_at < ? OR (started_at = ? AND id < ?))")
+        args += [at, at, int(row_id)]
+    limit = max(1, min(limit, MAX_PAGE))
+    sql = "SELECT * FROM stage_runs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY started_at DESC, id DESC LIMIT ?"
+    rows = [_stage_row(r) for r in get_connection().execute(sql, args + [limit + 1]).fetchall()]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {"stages": rows, "next_cursor": f"{rows[-1]['started_at']}|{rows[-1]['id']}" if more else None}
+
+
+def stage_status() -> dict:
+    """Latest execution and latest success of each stage"""
+    init_db()
+    conn = get_connection()
+    out = {}
+    for stage in STAGES:
+        last = conn.execute("SELECT * FROM stage_runs WHERE stage = ? ORDER BY started_at DESC LIMIT 1",
+                            (stage,)).fetchone()
+        ok = conn.execute("SELECT started_at FROM stage_runs WHERE stage = ? AND status = 'succeeded'"
+                          " ORDER BY started_at DESC LIMIT 1", (stage,)).fetchone()
+        out[stage] = {"last": _stage_row(last) if last else None,
+                      "last_success_at": ok["started_at"] if ok else None}
+    return out
+
+
+def trends(since: Optional[str] = None, until: Optional[str] = None, bucket: str = "hour",
+           stage: Optional[str] = None) -> List[dict]:
+    """Per stage and time bucket: runs, failures, cache hits, mean duration/throughput, peak memory"""
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {sorted(BUCKETS)}")
+    init_db()
+    where, args = [], []
+    if since:
+        where.append("started_at >= ?")
+        args.append(since)
+    if until:
+        where.append("started_at < ?")
+        args.append(until)
+    if stage:
+        where.append("stage = ?")
+        args.append(stage)
+    n = BUCKETS[bucket]
+    sql = (f"SELECT stage, substr(started_at, 1, {n}) AS bucket, COUNT(*) AS runs,"
+           " SUM(status = 'failed') AS failed, SUM(cache_hit) AS cache_hits,"
+           " AVG(CASE WHEN NOT cache_hit THEN seconds END) AS avg_seconds, SUM(rows) AS rows,"
+           " AVG(rows_per_sec) AS avg_rows_per_sec, MAX(peak_rss_mb) AS peak_rss_mb FROM stage_runs")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " GROUP BY stage, bucket ORDER BY bucket, stage"
+    return [dict(r) for r in get_connection().execute(sql, args).fetchall()]
+
+
+# ---------- orchestrated runs and the stage cache ----------
+
+def start_run(run_id: str, pipeline: str, params: dict):
+    init_db()
+    with transaction() as conn:
+        conn.execute("INSERT INTO pipeline_runs (id, pipeline, params, status, started_at) VALUES (?, ?, ?, ?, ?)",
+                     (run_id, pipeline, json.dumps(params), "running", _now()))
+
+
+def finish_run(run_id: str, status: str, seconds: float):
+    with transaction() as conn:
+        conn.execute("UPDATE pipeline_runs SET status = ?, finished_at = ?, seconds = ? WHERE id = ?",
+                     (status, _now(), seconds, run_id))
+
+
+def cache_get(cache_key: str) -> Optional[dict]:
+    init_db()
+    r = get_connection().execute("SELECT output FROM stage_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+    return json.loads(r["output"]) if r is not None else None
+
+
+def cache_put(cache_key: str, stage: str, output: dict):
+    with transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO stage_cache (cache_key, stage, output, created_at) VALUES (?, ?, ?, ?)",
+                     (cache_key, stage, json.dumps(output, default=str), _now()))
+
+
+def cache_drop(cache_key: str):
+    with transaction() as conn:
+        conn.execute("DELETE FROM stage_cache WHERE cache_key = ?", (cache_key,))
+
+
+def get_run(run_id: str) -> Optional[dict]:
+    init_db()
+    conn = get_connection()
+    r = conn.execute("SELECT * FROM pipeline_runs WHERE id = ?", (run_id,)).fetchone()
+    if r is None:
+        return None
+    run = dict(r)
+    run["params"] = json.loads(run["params"]) if run["params"] else {}
+    rows = conn.execute("SELECT * FROM stage_runs WHERE run_id = ? ORDER BY started_at, id", (run_id,))
+    run["stages"] = [_stage_row(s) for s in rows]
+    return run
+
+
+def list_runs(limit: int = 20, since: Optional[str] = None, until: Optional[str] = None) -> list:
+    init_db()
+    where, args = [], []
+    if since:
+        where.append("started_at >= ?")
+        args.append(since)
+    if until:
+        where.append("started_at < ?")
+        args.append(until)
+    sql = "SELECT id FROM pipeline_runs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY started_at DESC LIMIT ?"
+    rows = get_connection().execute(sql, args + [max(1, min(limit, MAX_PAGE))]).fetchall()
+    return [get_run(r["id"]) for r in rows]
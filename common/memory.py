@@ -0,0 +1,84 @@
+# common/memory.py
+import resource
+import sys
+import threading
+
+_STATUS = "/proc/self/status"
+# how often RssSampler reads the RSS; spikes shorter than this can be missed
+SAMPLE_SECONDS = 0.05
+
+
+def _status_mb(field: str) -> float | None:
+    try:
+        with open(_STATUS) as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _maxrss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS (lifetime peak, not resettable)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB (the lifetime peak off Linux)"""
+    rss = _status_mb("VmRSS:")
+    return rss if rss is not None else _maxrss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB, over its whole life"""
+    peak = _status_mb("VmHWM:")
+    return peak if peak is not None else _maxrss_mb()
+
+
+class RssSampler:
+    """Peak RSS while a job runs, sampled on a background thread:
+
+        with RssSampler() as rss:
+            ...
+        rss.peak_mb
+
+    The kernel's high-water mark is per process and resetting it would wipe the
+    readings of other jobs running in the same server, so each job samples instead.
+    """
+
+    def __init__(self, interval: float = SAMPLE_SECONDS):
+        self.interval = interval
+        self._peak = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def peak_mb(self) -> float:
+        if self._thread is not None and self._thread.is_alive():
+            return round(max(self._peak, rss_mb()), 1)
+        return round(self._peak, 1)
+
+    def start(self) -> "RssSampler":
+        self._peak = rss_mb()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> float:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._peak = max(self._peak, rss_mb())
+        return self.peak_mb
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, rss_mb())
+
+    def __enter__(self) -> "RssSampler":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,80 @@
+# common/readiness.py
+# Probe several services' health endpoints at once. Each service is retried
+# with exponential backoff plus jitter until it answers 2xx or its own deadline
+# passes, so waiting for N services takes about as long as the slowest one.
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Union
+
+import requests
+
+BASE_DELAY = 0.25
+MAX_DELAY = 5.0
+
+# a service is a URL, or {"url": ..., "deadline": seconds, "timeout": seconds}
+ServiceSpec = Union[str, dict]
+
+
+def probe(url: str, timeout: float) -> dict:
+    """One GET; ready on any 2xx"""
+    started = time.perf_counter()
+    try:
+        r = requests.get(url, timeout=timeout)
+        return {"ready": r.ok, "status_code": r.status_code, "error": None if r.ok else f"HTTP {r.status_code}",
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+    except requests.RequestException as e:
+        return {"ready": False, "status_code": None, "error": type(e).__name__,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+def _wait_one(name: str, spec: ServiceSpec, deadline: float, timeout: float,
+              on_update: Optional[Callable[[str, dict], None]]) -> dict:
+    if isinstance(spec, str):
+        spec = {"url": spec}
+    deadline = spec.get("deadline", deadline)
+    timeout = spec.get("timeout", timeout)
+    started = time.monotonic()
+    end = started + deadline
+    attempt = 0
+    while True:
+        attempt += 1
+        # never let a probe run past the deadline (but give it a chance to connect);
+        # a one-shot check (deadline 0) gets the whole timeout
+        limit = max(0.5, min(timeout, end - time.monotonic())) if deadline > 0 else timeout
+        res = probe(spec["url"], limit)
+        res.update(url=spec["url"], attempts=attempt, waited_seconds=round(time.monotonic() - started, 2))
+        if on_update:
+            on_update(name, res)
+        if res["ready"]:
+            return res
+        # full jitter: a restarting stack isn't hit by every prober in lockstep
+        delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** (attempt - 1)))
+        if time.monotonic() + delay >= end:
+            return res
+        time.sleep(delay)
+
+
+def wait_ready(services: Dict[str, ServiceSpec], deadline: float = 60.0, timeout: float = 5.0,
+               on_update: Optional[Callable[[str, dict], None]] = None) -> dict:
+    """Probe all services concurrently until ready or past their deadline.
+
+    deadline=0 probes each service once. Returns
+    {"ready": all ready, "seconds": wall time, "services": {name: last probe result}}.
+    """
+    started = time.perf_counter()
+    if not services:
+        return {"ready": True, "seconds": 0.0, "services": {}}
+    lock = threading.Lock()
+    update = None
+    if on_update:
+        def update(name, res):
+            with lock:  # callbacks print; keep their lines whole
+                on_update(name, res)
+    with ThreadPoolExecutor(max_workers=len(services), thread_name_prefix="probe") as pool:
+        futures = {name: pool.submit(_wait_one, name, spec, deadline, timeout, update)
+                   for name, spec in services.items()}
+        results = {name: f.result() for name, f in futures.items()}
+    return {"ready": all(r["ready"] for r in results.values()),
+            "seconds": round(time.perf_counter() - started, 2), "services": results}
@@ -0,0 +1,309 @@
+# common/scheduler.py
+# Separates a service's interactive work (a UI quick-predict or explain) from
+# its bulk work (training, scripted bulk calls). Each work class runs on its own
+# thread pool, so bulk requests never hold the slots interactive ones need, and
+# keeps its own queue and latency metrics. Bulk work that calls checkpoint()
+# between steps (training does, once per boosting round) is preempted: it pauses
+# while interactive work is running or waiting, for at most MAX_PAUSE_SECONDS
+# at a time so it can't be starved.
+#
+# Bulk work in other processes (predictor/batch_worker.py) is paused the same
+# way: while a service has interactive work in flight it keeps a marker file
+# under INTERACTIVE_MARK_DIR (one per process, so services sharing data/ don't
+# clear each other's), and yield_to_interactive() waits while any is fresh.
+#
+# Admission control: a class runs at most its worker count in flight and holds
+# at most MAX_QUEUE waiting requests. A request that would overflow the queue,
+# that would likely wait longer than MAX_WAIT (queue length x recent run time),
+# or that is still waiting after MAX_WAIT gets a fast 503 with Retry-After
+# instead of piling up behind the clients' own timeouts.
+import asyncio
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+WORK_CLASSES = (INTERACTIVE, BULK)
+# lets a client say its calls are bulk (a script scoring many rows one by one)
+WORK_CLASS_HEADER = "X-Work-Class"
+# max in flight per class
+CONCURRENCY = {
+    INTERACTIVE: int(os.environ.get("CROPSENSE_INTERACTIVE_WORKERS", "4")),
+    BULK: int(os.environ.get("CROPSENSE_BULK_WORKERS", "1")),
+}
+MAX_QUEUE = {
+    INTERACTIVE: int(os.environ.get("CROPSENSE_INTERACTIVE_MAX_QUEUE", "32")),
+    BULK: int(os.environ.get("CROPSENSE_BULK_MAX_QUEUE", "16")),
+}
+# interactive callers (the UI) give up after 30-45s; a queued retrain may wait for the running one
+MAX_WAIT_SECONDS = {
+    INTERACTIVE: float(os.environ.get("CROPSENSE_INTERACTIVE_MAX_WAIT_SECONDS", "5")),
+    BULK: float(os.environ.get("CROPSENSE_BULK_MAX_WAIT_SECONDS", "600")),
+}
+MAX_RETRY_AFTER = 60
+MAX_PAUSE_SECONDS = float(os.environ.get("CROPSENSE_BULK_MAX_PAUSE_SECONDS", "30"))
+# latency percentiles are over the most recent requests of each class
+WINDOW = 1000
+INTERACTIVE_MARK_DIR = os.environ.get("CROPSENSE_INTERACTIVE_MARK_DIR", "data/.interactive")
+# a marker this old was left behind by a process that died mid-request
+MARK_STALE_SECONDS = 60.0
+
+
+def work_class(value: Optional[str], default: str = INTERACTIVE) -> str:
+    """Validate a requested work class (e.g. from the X-Work-Class header)"""
+    if not value:
+        return default
+    value = value.strip().lower()
+    if value not in WORK_CLASSES:
+        raise ValueError(f"Unknown work class {value!r}, expected one of {list(WORK_CLASSES)}")
+    return value
+
+
+def _summary(samples) -> dict:
+    if not samples:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    s = sorted(samples)
+    n = len(s)
+    return {"count": n, "mean": round(sum(s) / n, 2), "p50": round(s[int(0.50 * (n - 1))], 2),
+            "p95": round(s[int(0.95 * (n - 1))], 2), "p99": round(s[int(0.99 * (n - 1))], 2),
+            "max": round(s[-1], 2)}
+
+
+class WorkClass:
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"{name}-work")
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        # load shed: queue full / predicted wait over max_wait / waited max_wait without starting
+        self.rejected = {"queue_full": 0, "expected_wait": 0, "wait_timeout": 0}
+        self.waiting: Dict[int, float] = {}  # ticket -> submit time, oldest first
+        self.wait_ms = deque(maxlen=WINDOW)
+        self.run_ms = deque(maxlen=WINDOW)
+        self.latency_ms = deque(maxlen=WINDOW)
+        self.lock = threading.Lock()
+
+    def full(self) -> bool:
+        """No room for another request (call with the lock held)"""
+        # counted over everything admitted: a call just submitted may not have taken its free thread yet
+        return self.running + self.queued >= self.concurrency + self.max_queue
+
+    def expected_wait(self) -> float:
+        """Seconds a request submitted now would wait to start (call with the lock held)"""
+        ahead = self.running + self.queued + 1 - self.concurrency
+        if ahead <= 0 or not self.run_ms:
+            return 0.0
+        return ahead / self.concurrency * sum(self.run_ms) / len(self.run_ms) / 1000
+
+    def retry_after(self) -> int:
+        with self.lock:
+            return max(1, min(MAX_RETRY_AFTER, math.ceil(self.expected_wait())))
+
+    def stats(self) -> dict:
+        with self.lock:
+            oldest = next(iter(self.waiting.values()), None)
+            return {"concurrency": self.concurrency, "max_queue": self.max_queue,
+                    "max_wait_seconds": self.max_wait, "queued": self.queued, "running": self.running,
+                    "oldest_wait_ms": round((time.perf_counter() - oldest) * 1000, 1) if oldest else None,
+                    "expected_wait_seconds": round(self.expected_wait(), 3),
+                    "completed": self.completed, "failed": self.failed, "rejected": dict(self.rejected),
+                    "wait_ms": _summary(self.wait_ms), "run_ms": _summary(self.run_ms),
+                    "latency_ms": _summary(self.latency_ms)}
+
+
+class InteractiveMark:
+    """This process's "interactive work in flight" marker file (no directory: disabled)"""
+
+    def __init__(self, directory: Optional[str] = INTERACTIVE_MARK_DIR):
+        self.dir = Path(directory) if directory else None
+        self.path = self.dir / str(os.getpid()) if self.dir else None
+        self._lock = threading.Lock()
+        self._touched = 0.0
+
+    def set(self):
+        if self.path is None:
+            return
+        with self._lock:
+            # refreshed at most once a second while requests keep coming
+            if time.monotonic() - self._touched < 1.0:
+                return
+            self._touched = time.monotonic()
+            try:
+                self.dir.mkdir(parents=True, exist_ok=True)
+                self.path.touch()
+            except OSError:
+                pass
+
+    def clear_if(self, idle: Callable[[], bool]):
+        if self.path is None:
+            return
+        # checked under the lock so a request admitted meanwhile re-creates the marker
+        with self._lock:
+            if not idle():
+                return
+            self._touched = 0.0
+            try:
+                self.path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+
+def interactive_elsewhere(directory: str = INTERACTIVE_MARK_DIR) -> bool:
+    """Whether any process has interactive work in flight"""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return False
+    now = time.time()
+    for entry in entries:
+        try:
+            if now - entry.stat().st_mtime < MARK_STALE_SECONDS:
+                return True
+        except OSError:
+            continue  # removed meanwhile
+    return False
+
+
+def yield_to_interactive(max_pause: Optional[float] = None, poll: float = 0.05,
+                         directory: Optional[str] = None) -> float:
+    """Called by bulk work in another process between steps: waits while interactive
+    work is in flight anywhere, for at most max_pause. Returns the seconds paused."""
+    directory = directory or INTERACTIVE_MARK_DIR
+    if not interactive_elsewhere(directory):
+        return 0.0
+    max_pause = MAX_PAUSE_SECONDS if max_pause is None else max_pause
+    started = time.monotonic()
+    while time.monotonic() - started < max_pause and interactive_elsewhere(directory):
+        time.sleep(poll)
+    return time.monotonic() - started
+
+
+class Scheduler:
+    def __init__(self, concurrency: Optional[Dict[str, int]] = None, max_queue: Optional[Dict[str, int]] = None,
+                 max_wait: Optional[Dict[str, float]] = None, max_pause: float = MAX_PAUSE_SECONDS,
+                 mark_dir: Optional[str] = INTERACTIVE_MARK_DIR):
+        limits = {**CONCURRENCY, **(concurrency or {})}
+        queues = {**MAX_QUEUE, **(max_queue or {})}
+        waits = {**MAX_WAIT_SECONDS, **(max_wait or {})}
+        self.classes = {name: WorkClass(name, limits[name], queues[name], waits[name]) for name in WORK_CLASSES}
+        self._tickets = itertools.count()
+        self.max_pause = max_pause
+        self.preemptions = 0
+        self.paused_seconds = 0.0
+        self._interactive_idle = threading.Condition()
+        self.mark = InteractiveMark(mark_dir)
+
+    def _reject(self, wc: WorkClass, reason: str, detail: str):
+        with wc.lock:
+            wc.rejected[reason] += 1
+        raise HTTPException(status_code=503, detail=f"{wc.name.capitalize()} queue {detail}, retry later",
+                            headers={"Retry-After": str(wc.retry_after())})
+
+    async def run(self, work_class: str, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the work class's pool and await its result.
+
+        Raises HTTPException 503 (with Retry-After) when the class is overloaded.
+        """
+        wc = self.classes[work_class]
+        ticket = next(self._tickets)
+        with wc.lock:
+            full = wc.full()
+            too_slow = not full and wc.expected_wait() > wc.max_wait
+            if not (full or too_slow):
+                wc.queued += 1
+                submitted = wc.waiting[ticket] = time.perf_counter()
+        if full:
+            self._reject(wc, "queue_full", f"is full ({wc.max_queue} waiting)")
+        if too_slow:
+            self._reject(wc, "expected_wait", f"wait would exceed {wc.max_wait:g}s")
+        if work_class == INTERACTIVE:
+            self.mark.set()
+
+        def call():
+            started = time.perf_counter()
+            with wc.lock:
+                wc.queued -= 1
+                wc.running += 1
+                wc.waiting.pop(ticket, None)
+                wc.wait_ms.append((started - submitted) * 1000)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                now = time.perf_counter()
+                with wc.lock:
+                    wc.running -= 1
+                    wc.completed += ok
+                    wc.failed += not ok
+                    wc.run_ms.append((now - started) * 1000)
+                    wc.latency_ms.append((now - submitted) * 1000)
+                if work_class == INTERACTIVE:
+                    self._interactive_done()
+
+        fut = wc.pool.submit(call)
+
+        def dropped(f):
+            # timed out in the queue, or the client went away before the call started
+            if f.cancelled():
+                with wc.lock:
+                    wc.queued -= 1
+                    wc.waiting.pop(ticket, None)
+                if work_class == INTERACTIVE:
+                    self._interactive_done()
+        fut.add_done_callback(dropped)
+
+        expired = False
+
+        def expire():
+            nonlocal expired
+            expired = fut.cancel()  # only succeeds while it is still queued
+        timer = asyncio.get_running_loop().call_later(wc.max_wait, expire)
+        try:
+            return await asyncio.wrap_future(fut)
+        except asyncio.CancelledError:
+            if not expired:
+                raise
+        finally:
+            timer.cancel()
+        self._reject(wc, "wait_timeout", f"wait exceeded {wc.max_wait:g}s")
+
+    def _interactive_done(self):
+        with self._interactive_idle:
+            self._interactive_idle.notify_all()
+        self.mark.clear_if(lambda: not self.interactive_busy())
+
+    def interactive_busy(self) -> bool:
+        ic = self.classes[INTERACTIVE]
+        with ic.lock:
+            return ic.queued + ic.running > 0
+
+    def checkpoint(self):
+        """Called by bulk work between steps: waits while interactive work is running or queued"""
+        if not self.interactive_busy():
+            return
+        started = time.perf_counter()
+        with self._interactive_idle:
+            self._interactive_idle.wait_for(lambda: not self.interactive_busy(), timeout=self.max_pause)
+        with self.classes[BULK].lock:
+            self.preemptions += 1
+            self.paused_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        return {"classes": {name: wc.stats() for name, wc in self.classes.items()},
+                "preemptions": self.preemptions, "paused_seconds": round(self.paused_seconds, 3)}
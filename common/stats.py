@@ -0,0 +1,193 @@
+# common/stats.py
+# Dataset summaries that never scan the data: a small stats.json sidecar written
+# by the preprocessor (ranges, nulls, category frequencies, histograms) plus the
+# row counts / min / max / null counts parquet already keeps in each file footer.
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .dataset import PARTITION_COLS, _codes_for, _resolve, load_artifacts
+
+STATS_NAME = "stats.json"
+HIST_BINS = 30
+BOOL_COLUMNS = ["Fertilizer_Used", "Irrigation_Used"]
+
+_cache: Dict[str, dict] = {}
+_cache_lock = threading.Lock()
+
+
+def _numeric_stats(v: np.ndarray) -> dict:
+    ok = v[~np.isnan(v)]
+    out = {"kind": "numeric", "nulls": int(len(v) - len(ok))}
+    if len(ok):
+        counts, edges = np.histogram(ok, bins=HIST_BINS)
+        out.update(min=float(ok.min()), max=float(ok.max()), mean=float(ok.mean()),
+                   std=float(ok.std()), histogram={"edges": edges.tolist(), "counts": counts.tolist()})
+    return out
+
+
+def compute_stats(df: pd.DataFrame, target: Optional[str] = None) -> dict:
+    """Column stats of the cleaned (not yet encoded/scaled) frame, in original units.
+
+    When the frame has Crop/Region categories and a target, the target histogram
+    is also kept per (crop, region) partition so filtered views can be summed
+    from it.
+    """
+    columns = {}
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            freqs = s.value_counts(dropna=True)
+            columns[c] = {"kind": "category", "nulls": int((s.cat.codes < 0).sum()),
+                          "distinct": int((freqs > 0).sum()),
+                          "frequencies": {str(k): int(n) for k, n in freqs.items() if n}}
+        elif c in BOOL_COLUMNS:
+            b = s.map({True: 1, False: 0, "True": 1, "False": 0})
+            columns[c] = {"kind": "bool", "nulls": int(b.isna().sum()), "true": int((b == 1).sum())}
+        elif pd.api.types.is_numeric_dtype(s):
+            columns[c] = _numeric_stats(s.to_numpy(dtype=np.float64, na_value=np.nan))
+    stats = {"rows": len(df), "columns": columns, "target": target, "partitions": []}
+
+    hist = columns.get(target, {}).get("histogram")
+    keys = [c for c in PARTITION_COLS if c in df.columns and isinstance(df[c].dtype, pd.CategoricalDtype)]
+    if hist is None or len(keys) != len(PARTITION_COLS):
+        return stats
+    # one bincount over (crop, region, target bin) instead of a groupby per partition
+    crop, region = (df[k].cat for k in keys)
+    n_crop, n_region = len(crop.categories) + 1, len(region.categories) + 1
+    y = df[target].to_numpy(dtype=np.float64, na_value=np.nan)
+    edges = np.asarray(hist["edges"])
+    ybin = np.clip(np.searchsorted(edges, y, side="right") - 1, 0, HIST_BINS - 1)
+    ybin = np.where(np.isnan(y), HIST_BINS, ybin)  # last slot: missing target
+    ci = crop.codes.to_numpy().astype(np.int64) + 1  # -1 (missing) -> slot 0
+    ri = region.codes.to_numpy().astype(np.int64) + 1
+    flat = (ci * n_region + ri) * (HIST_BINS + 1) + ybin
+    counts = np.bincount(flat, minlength=n_crop * n_region * (HIST_BINS + 1))
+    counts = counts.reshape(n_crop, n_region, HIST_BINS + 1)
+    labels = ([None] + [str(v) for v in crop.categories], [None] + [str(v) for v in region.categories])
+    for i, j in zip(*np.nonzero(counts.sum(axis=2))):
+        stats["partitions"].append({"crop": labels[0][i], "region": labels[1][j],
+                                    "rows": int(counts[i, j].sum()),
+                                    "target_counts": counts[i, j, :HIST_BINS].tolist()})
+    return stats
+
+
+def write_stats(stats: dict, run_dir: Path) -> Path:
+    path = run_dir / STATS_NAME
+    path.write_text(json.dumps(stats))
+    return path
+
+
+def _footer_scan(src: Path) -> List[dict]:
+    """Per-file row counts and column statistics, from parquet footers only"""
+    files = [src] if src.is_file() else sorted(src.rglob("*.parquet"))
+    out = []
+    for f in files:
+        md = pq.read_metadata(f)
+        parts = dict(p.split("=", 1) for p in f.relative_to(src).parts[:-1] if "=" in p) if src.is_dir() else {}
+        cols = {}
+        for rg in range(md.num_row_groups):
+            group = md.row_group(rg)
+            for k in range(group.num_columns):
+                col = group.column(k)
+                name = col.path_in_schema
+                st = col.statistics
+                acc = cols.setdefault(name, {"min": None, "max": None, "nulls": 0})
+                if st is None:
+                    continue
+                acc["nulls"] += st.null_count or 0
+                if st.has_min_max:
+                    acc["min"] = st.min if acc["min"] is None else min(acc["min"], st.min)
+                    acc["max"] = st.max if acc["max"] is None else max(acc["max"], st.max)
+        out.append({"partition": {k: int(v) for k, v in parts.items()}, "rows": md.num_rows,
+                    "bytes": f.stat().st_size, "columns": cols})
+    return out
+
+
+def _load(src: Path, run_dir: Optional[Path]) -> dict:
+    # published runs are immutable, so their scan is cached for the process lifetime
+    key = str(src)
+    with _cache_lock:
+        if run_dir is not None and key in _cache:
+            return _cache[key]
+    stats_path = run_dir / STATS_NAME if run_dir is not None else None
+    entry = {
+        "files": _footer_scan(src),
+        "stats": json.loads(stats_path.read_text()) if stats_path and stats_path.exists() else None,
+        "encoders": load_artifacts(run_dir).get("encoders") or {},
+    }
+    if run_dir is not None:
+        with _cache_lock:
+            _cache[key] = entry
+    return entry
+
+
+def dataset_summary(dataset: Optional[str] = None, crop=None, region=None,
+                    columns: Optional[List[str]] = None) -> dict:
+    """Size, ranges, nulls, category frequencies and histograms without reading data.
+
+    ``crop`` / ``region`` narrow the footer numbers and the target histogram to
+    the matching partitions; the other sidecar stats describe the whole dataset.
+    """
+    src, run_dir = _resolve(dataset, None)
+    entry = _load(src, run_dir)
+    enc = entry["encoders"]
+    wanted = {}
+    for column, value in (("Crop", crop), ("Region", region)):
+        if value is not None:
+            wanted[PARTITION_COLS[column]] = set(_codes_for(column, value, enc))
+    files = [f for f in entry["files"]
+             if all(f["partition"].get(k) in codes for k, codes in wanted.items())]
+
+    stored: Dict[str, dict] = {}
+    for f in files:
+        for name, st in f["columns"].items():
+            acc = stored.setdefault(name, {"min": None, "max": None, "nulls": 0})
+            acc["nulls"] += st["nulls"]
+            for bound, pick in (("min", min), ("max", max)):
+                if st[bound] is not None:
+                    acc[bound] = st[bound] if acc[bound] is None else pick(acc[bound], st[bound])
+    if columns:
+        stored = {c: v for c, v in stored.items() if c in columns}
+
+    summary = {
+        "run_id": run_dir.name if run_dir is not None else None,
+        "source": str(src),
+        "rows": sum(f["rows"] for f in files),
+        "files": len(files),
+        "bytes": sum(f["bytes"] for f in files),
+        # as stored: categories are codes and continuous features are scaled
+        "stored": stored,
+        "stats": None,
+    }
+    stats = entry["stats"]
+    if stats is None:
+        return summary
+
+    cols = stats["columns"] if not columns else {c: v for c, v in stats["columns"].items() if c in columns}
+    labels = {"crop": crop, "region": region}
+    parts = stats["partitions"]
+    for key, value in labels.items():
+        if value is not None:
+            allowed = {str(v).lower() for v in ([value] if isinstance(value, (str, int)) else value)}
+            parts = [p for p in parts if str(p[key]).lower() in allowed]
+    target = stats.get("target")
+    target_hist = None
+    if target and target in stats["columns"] and "histogram" in stats["columns"][target]:
+        counts = np.zeros(HIST_BINS, dtype=np.int64)
+        for p in parts:
+            counts += np.asarray(p["target_counts"], dtype=np.int64)
+        target_hist = {"column": target, "edges": stats["columns"][target]["histogram"]["edges"],
+                       "counts": counts.tolist()}
+    summary["stats"] = {
+        "rows": stats["rows"],
+        "columns": cols,
+        "target_histogram": target_hist,
+        "partitions": [{"crop": p["crop"], "region": p["region"], "rows": p["rows"]} for p in parts],
+    }
+    return summary
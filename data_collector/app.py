@@ -1,8 +1,11 @@
 # data_collector/app.py
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request
 from pydantic import BaseModel
-from .collector import save_raw_from_path, save_raw_from_upload
+from .collector import (InvalidUpload, MAX_UPLOAD_BYTES, UploadTooLarge,
+                        save_raw_from_path, save_raw_from_stream, save_raw_from_upload)
 from pathlib import Path
+from common import catalog, history
+from . import compaction, resumable
 
 app = FastAPI(title="DataCollectorAgent", version="0.1")
 RAW_DIR = Path("data/raw")
@@ -17,23 +20,147 @@ def health():
     return {"status": "ok", "service": "collector"}
 
 @app.post("/collect")
-def collect(req: CollectRequest):
+def collect(req: CollectRequest, x_pipeline_run: str | None = Header(None)):
     if req.source == "local":
         src = req.path or "data/crop_yield.csv"
-        # Let save_raw_from_path handle missing files by creating synthetic data
-        dst = save_raw_from_path(src)
-        return {"status": "collected", "path": dst}
+        trigger = "orchestrator" if x_pipeline_run else "api"
+        with history.track("collect", x_pipeline_run, trigger) as rec:
+            # Let save_raw_from_path handle missing files by creating synthetic data
+            res = save_raw_from_path(src)
+            entry = catalog.lookup(res["sha256"])
+            rec.update(rows=entry["rows"] if entry else None,
+                       output={"path": res["path"], "sha256": res["sha256"],
+                               "deduplicated": res["deduplicated"], "source": src})
+        return {"status": "collected", **res}
     else:
         raise HTTPException(400, "Unsupported source")
 
 @app.post("/upload")
-async def upload(file: UploadFile = File(...)):
+async def upload(request: Request, file: UploadFile = File(...)):
     if not file.filename.endswith(".csv"):
         raise HTTPException(400, "Only CSV allowed")
-    dst = await save_raw_from_upload(file)
-    return {"status": "uploaded", "path": dst}
+    # the declared size covers the whole multipart body, so it is only an upper bound
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_UPLOAD_BYTES + 64 * 1024:
+        raise HTTPException(413, f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    try:
+        res = await save_raw_from_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except InvalidUpload as e:
+        raise HTTPException(400, str(e))
+    return {"status": "uploaded", **res}
+
+@app.put("/upload/stream")
+async def upload_stream(request: Request):
+    """Raw CSV request body (no multipart), written to disk as it arrives.
+
+    Unlike /upload the body isn't spooled before we see it, so oversized or
+    non-CSV uploads are refused after the first chunks.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    try:
+        res = await save_raw_from_stream(request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except InvalidUpload as e:
+        raise HTTPException(400, str(e))
+    return {"status": "uploaded", **res}
+
+# ---------- resumable uploads ----------
+
+class InitiateUpload(BaseModel):
+    filename: str
+    size: int
+    # sha256 of the whole file; can also be given on completion
+    sha256: str | None = None
+    chunk_size: int | None = None
+
+class CompleteUpload(BaseModel):
+    sha256: str | None = None
+
+def _upload_errors(fn, *args):
+    try:
+        return fn(*args)
+    except resumable.UploadNotFound:
+        raise HTTPException(404, "Upload not found")
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except InvalidUpload as e:
+        raise HTTPException(400, str(e))
+
+@app.post("/uploads", status_code=201)
+def initiate_upload(req: InitiateUpload):
+    if not req.filename.endswith(".csv"):
+        raise HTTPException(400, "Only CSV allowed")
+    return _upload_errors(resumable.initiate, req.filename, req.size, req.sha256, req.chunk_size)
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """Raw bytes of one chunk, written at offset. Chunks may arrive in any order and in parallel."""
+    try:
+        return await resumable.write_chunk(upload_id, offset, request.stream())
+    except resumable.UploadNotFound:
+        raise HTTPException(404, "Upload not found")
+    except InvalidUpload as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/uploads/{upload_id}")
+def upload_status(upload_id: str):
+    return _upload_errors(resumable.status, upload_id)
+
+@app.post("/uploads/{upload_id}/complete")
+def complete_upload(upload_id: str, req: CompleteUpload):
+    res = _upload_errors(resumable.complete, upload_id, req.sha256)
+    return {"status": "uploaded", **res}
+
+@app.delete("/uploads/{upload_id}")
+def abort_upload(upload_id: str):
+    _upload_errors(resumable.abort, upload_id)
+    return {"status": "aborted", "upload_id": upload_id}
 
 @app.get("/list")
-def list_raws():
-    files = sorted([str(p) for p in RAW_DIR.glob("*.csv")])
-    return {"files": files}
+def list_raws(limit: int = 50, cursor: str | None = None, source: str | None = None,
+              format: str | None = None, since: str | None = None, until: str | None = None,
+              name: str | None = None, include_compacted: bool = False):
+    """Catalogued raw files, newest first; pass next_cursor back to get the following page"""
+    try:
+        page = catalog.list_files(limit=limit, cursor=cursor, source=source, fmt=format,
+                                  since=since, until=until, name=name,
+                                  include_compacted=include_compacted)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    return page
+
+@app.get("/latest")
+def latest_raw():
+    entry = catalog.latest()
+    if entry is None:
+        raise HTTPException(404, "No raw files")
+    return entry
+
+
+# ---------- compaction ----------
+
+class CompactRequest(BaseModel):
+    window: str = "day"
+    # only merge files that came from the same kind of source (local/upload/...)
+    by_source: bool = False
+    dry_run: bool = False
+
+@app.post("/compact")
+def compact_raws(req: CompactRequest):
+    try:
+        res = compaction.compact(req.window, req.by_source, req.dry_run)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"status": "ok", **res}
+
+@app.get("/files/{file_id}/lineage")
+def file_lineage(file_id: int):
+    entry = catalog.get(file_id)
+    if entry is None:
+        raise HTTPException(404, "File not found")
+    return {**entry, "merged_from": catalog.lineage(file_id)}
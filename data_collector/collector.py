@@ -1,20 +1,110 @@
 # data_collector/collector.py
 import os
-import shutil
+import io
+import hashlib
+import threading
+import uuid
+from typing import AsyncIterator
 from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 import pandas as pd
+from common import catalog, events
+from common.hashing import CHUNK_SIZE, copy_and_hash, sha256_file
+from .transcode import RAW_FORMAT, transcode_csv
 
 RAW_DIR = "data/raw"
+# uploads are streamed to disk; anything larger is rejected mid-stream
+MAX_UPLOAD_BYTES = int(float(os.environ.get("CROPSENSE_MAX_UPLOAD_MB", "2048")) * 1024 * 1024)
+# bytes looked at before deciding whether the body is a CSV at all
+SNIFF_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidUpload(ValueError):
+    pass
+
+# stored files are catalogued by sha256 (common/catalog.py), so identical
+# payloads are stored once; the lock keeps rename + register atomic in-process
+_index_lock = threading.Lock()
 
 def _dest_filename():
     ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
     return f"raw_crop_{ts}.csv"
 
-def save_raw_from_path(src_path: str) -> str:
+def _tmp_path() -> str:
+    return os.path.join(RAW_DIR, f".incoming_{uuid.uuid4().hex}.part")
+
+def _lookup(digest: str) -> str | None:
+    entry = catalog.lookup(digest)
+    return entry["path"] if entry else None
+
+def _format(path: str) -> str:
+    return "parquet" if path.endswith(".parquet") else "csv"
+
+def _deduplicated(path: str, digest: str) -> dict:
+    return {"path": path, "sha256": digest, "deduplicated": True, "format": _format(path)}
+
+def _store(tmp_path: str, digest: str, source: str | None = None) -> dict:
+    """Promote tmp_path to a new raw file unless the same content is already stored"""
+    with _index_lock:
+        existing = _lookup(digest)
+        if existing:
+            os.remove(tmp_path)
+            return _deduplicated(existing, digest)
+        name = _dest_filename()
+        dest = os.path.join(RAW_DIR, name)
+        # several uploads can land in the same second (a transcoded one keeps only its .parquet)
+        n = 1
+        while os.path.exists(dest) or os.path.exists(dest[:-4] + ".parquet"):
+            dest = os.path.join(RAW_DIR, f"{name[:-4]}_{n}.csv")
+            n += 1
+        os.replace(tmp_path, dest)
+        if not catalog.register(dest, digest, source=source):
+            existing = _lookup(digest)
+            # (a retired entry can carry the same generated name as dest)
+            if existing and existing != dest:
+                # another collector process stored the same payload meanwhile
+                os.remove(dest)
+                return _deduplicated(existing, digest)
+            # only a retired entry holds the payload: this upload becomes its file again
+            catalog.reinstate(dest, digest, source=source)
+    res = {"path": dest, "sha256": digest, "deduplicated": False, "format": "csv"}
+    if RAW_FORMAT == "parquet":
+        res.update(_to_parquet(dest, digest))
+    # new content only: a duplicate changes nothing downstream
+    events.publish(events.RAW_READY, {"path": res["path"], "sha256": digest,
+                                      "format": res["format"], "source": source})
+    return res
+
+def _to_parquet(csv_path: str, digest: str) -> dict:
+    """Replace a stored CSV with its Parquet transcode (the CSV stays if that fails)"""
+    try:
+        info = transcode_csv(csv_path)
+    except Exception as e:
+        print(f"Parquet transcode of {csv_path} failed, keeping CSV: {e}")
+        return {"transcode_error": str(e)}
+    with _index_lock:
+        # the catalog keeps the sha256 of the uploaded bytes, now pointing at the parquet copy
+        catalog.replace_path(digest, info["path"])
+        os.remove(csv_path)
+    return {"path": info["path"], "format": "parquet", "transcode": info}
+
+def _validate_csv(path: str):
+    # quick sanity check: try reading head
+    try:
+        _ = pd.read_csv(path, nrows=5)
+    except Exception:
+        os.remove(path)
+        raise
+
+def save_raw_from_path(src_path: str) -> dict:
     os.makedirs(RAW_DIR, exist_ok=True)
-    dest = os.path.join(RAW_DIR, _dest_filename())
-    
+    tmp = _tmp_path()
+
     # Check if source exists, if not create synthetic data
     if not os.path.exists(src_path):
         print(f"Source file {src_path} not found, creating synthetic dataset...")
@@ -31,28 +121,68 @@ def save_raw_from_path(src_path: str) -> str:
             "Days_to_Harvest": [120, 140, 110, 130] * 25,
             "Yield_tons_per_hectare": [3.2, 4.1, 2.8, 3.6] * 25
         })
-        demo.to_csv(dest, index=False)
-        print(f"Created synthetic dataset at {dest}")
+        demo.to_csv(tmp, index=False)
+        digest = sha256_file(tmp)
     else:
-        shutil.copyfile(src_path, dest)
-    # quick sanity check: try reading head
+        # hash while copying so the source is only read once
+        digest = copy_and_hash(src_path, tmp)
+    _validate_csv(tmp)
+    res = _store(tmp, digest, source=f"local:{src_path}")
+    if not res["deduplicated"]:
+        print(f"Stored raw dataset at {res['path']}")
+    return res
+
+def _sniff_csv(head: bytes, complete: bool):
+    """Reject obviously non-CSV bodies from their first bytes"""
+    if b"\x00" in head:
+        raise InvalidUpload("Upload is not a CSV (binary content)")
+    # only parse whole lines unless this is the entire file
+    text = head if complete else head[:head.rfind(b"\n") + 1]
+    if not text.strip():
+        raise InvalidUpload("Upload is not a CSV (no complete header line)")
     try:
-        _ = pd.read_csv(dest, nrows=5)
-    except Exception:
-        os.remove(dest)
-        raise
-    return dest
+        df = pd.read_csv(io.BytesIO(text), nrows=5)
+    except Exception as e:
+        raise InvalidUpload(f"Upload is not a valid CSV: {e}")
+    if len(df.columns) < 2:
+        raise InvalidUpload("Upload is not a CSV (expected a comma-separated header)")
 
-async def save_raw_from_upload(file: UploadFile) -> str:
+async def save_raw_from_stream(blocks: AsyncIterator[bytes], max_bytes: int = MAX_UPLOAD_BYTES,
+                              source: str = "stream") -> dict:
+    """Write an async stream of byte blocks to disk, hashing and size-checking as it goes.
+
+    Memory use is one block regardless of the upload size; bodies that aren't
+    CSV are rejected once the first SNIFF_BYTES have arrived.
+    """
     os.makedirs(RAW_DIR, exist_ok=True)
-    dest = os.path.join(RAW_DIR, _dest_filename())
-    with open(dest, "wb") as f:
-        contents = await file.read()
-        f.write(contents)
-    # validate CSV
+    tmp = _tmp_path()
+    h = hashlib.sha256()
+    size = 0
+    head = b""
+    sniffed = False
     try:
-        pd.read_csv(dest, nrows=5)
-    except Exception:
-        os.remove(dest)
+        with open(tmp, "wb") as f:
+            async for block in blocks:
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes // (1024 * 1024)} MB")
+                if not sniffed:
+                    head += block[:SNIFF_BYTES - len(head)]
+                    if len(head) >= SNIFF_BYTES:
+                        _sniff_csv(head, complete=False)
+                        sniffed = True
+                h.update(block)
+                f.write(block)
+        if not sniffed:
+            _sniff_csv(head, complete=True)  # small file: the head is all of it
+    except BaseException:
+        os.remove(tmp)
         raise
-    return dest
+    # the transcode and the broker publish block: keep them off the event loop
+    return await run_in_threadpool(_store, tmp, h.hexdigest(), source=source)
+
+async def save_raw_from_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> dict:
+    async def blocks():
+        while block := await file.read(CHUNK_SIZE):
+            yield block
+    return await save_raw_from_stream(blocks(), max_bytes, source=f"upload:{file.filename}")
@@ -0,0 +1,147 @@
+# data_collector/compaction.py
+# Merge many small raw files (every /collect call makes one) into larger zstd
+# Parquet files, grouped by ingest window, column set and optionally by source
+# (files with different columns are never merged, whatever their window). Originals
+# stay readable for a retention period, are recorded as compacted_into the new
+# file in the catalog, and are deleted afterwards (the catalog rows remain as lineage).
+import hashlib
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+
+from common import catalog
+from common.hashing import sha256_file
+from .collector import RAW_DIR, _index_lock
+
+# files below this size are compaction candidates
+SMALL_FILE_BYTES = int(float(os.environ.get("CROPSENSE_COMPACT_SMALL_MB", "16")) * 1024 * 1024)
+# a group is split so no compacted file gets (much) larger than this
+TARGET_BYTES = int(float(os.environ.get("CROPSENSE_COMPACT_TARGET_MB", "256")) * 1024 * 1024)
+MIN_FILES = 2
+RETENTION_SECONDS = float(os.environ.get("CROPSENSE_COMPACT_RETENTION_HOURS", "72")) * 3600
+# ingested_at prefix lengths: "2025-10-02" / "2025-10-02T20"
+WINDOWS = {"day": 10, "hour": 13}
+
+
+def _read(path: str) -> pa.Table:
+    if path.endswith(".parquet"):
+        return pq.read_table(path)
+    table = pcsv.read_csv(path)
+    return table.rename_columns([c.strip() for c in table.column_names])
+
+
+def _unify(tables: List[pa.Table]) -> pa.Schema:
+    """One schema for all members (same columns): same type kept, mixed numbers -> float64, anything else -> string"""
+    types: Dict[str, set] = {}
+    for t in tables:
+        for f in t.schema:
+            types.setdefault(f.name, set()).add(f.type)
+    fields = []
+    for name, ts in types.items():
+        ts.discard(pa.null())
+        if len(ts) == 1:
+            typ = ts.pop()
+        elif ts and all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in ts):
+            typ = pa.float64()
+        else:
+            typ = pa.string()
+        fields.append(pa.field(name, typ))
+    return pa.schema(fields)
+
+
+def _conform(t: pa.Table, schema: pa.Schema) -> pa.Table:
+    return pa.Table.from_arrays([t[f.name].cast(f.type) for f in schema], schema=schema)
+
+
+def plan(window: str = "day", by_source: bool = False, small_bytes: int = SMALL_FILE_BYTES) -> List[List[dict]]:
+    """Groups of catalogued small files that would be merged together"""
+    if window not in WINDOWS:
+        raise ValueError(f"window must be one of {sorted(WINDOWS)}")
+    groups: Dict[tuple, List[dict]] = defaultdict(list)
+    for entry in catalog.compaction_candidates(small_bytes):
+        if not os.path.exists(entry["path"]):
+            continue
+        source = (entry["source"] or "").split(":", 1)[0] if by_source else ""
+        # only files with the same columns (in any order) go together
+        columns = tuple(sorted(entry["columns"]))
+        groups[(entry["ingested_at"][:WINDOWS[window]], columns, source)].append(entry)
+    out = []
+    for members in groups.values():
+        batch, size = [], 0
+        for e in members:
+            if batch and size + e["size"] > TARGET_BYTES:
+                out.append(batch)
+                batch, size = [], 0
+            batch.append(e)
+            size += e["size"]
+        out.append(batch)
+    return [g for g in out if len(g) >= MIN_FILES]
+
+
+def _compact_group(members: List[dict], window: str) -> dict:
+    tables = [_read(m["path"]) for m in members]
+    columns = {frozenset(t.column_names) for t in tables}
+    if len(columns) > 1:
+        # the catalog's column lists are out of date with the files
+        raise ValueError(f"Refusing to merge files with different columns: {[m['path'] for m in members]}")
+    schema = _unify(tables)
+    merged = pa.concat_tables([_conform(t, schema) for t in tables])
+    stamp = members[0]["ingested_at"][:WINDOWS[window]].replace("-", "").replace(":", "")
+    dest = Path(RAW_DIR) / f"raw_compact_{stamp}_{uuid.uuid4().hex[:6]}.parquet"
+    tmp = dest.with_name(f".{dest.name}.tmp")
+    pq.write_table(merged, tmp, compression="zstd", row_group_size=256_000)
+    os.replace(tmp, dest)
+    digest = sha256_file(dest)
+    source = "compaction:" + hashlib.sha256("".join(m["sha256"] for m in members).encode()).hexdigest()[:12]
+    with _index_lock:
+        # keep the members' place in ingest order so "latest raw file" doesn't jump
+        output_id = catalog.register(dest, digest, source=source, ingested_at=members[-1]["ingested_at"])
+        if output_id is None:
+            os.remove(dest)
+            raise RuntimeError(f"Compacted file {dest} collides with an existing payload")
+        catalog.record_compaction(output_id, [m["id"] for m in members])
+    return {"path": str(dest), "id": output_id, "files": len(members), "rows": merged.num_rows,
+            "input_bytes": sum(m["size"] for m in members), "output_bytes": dest.stat().st_size}
+
+
+def retire_expired(retention_seconds: float = RETENTION_SECONDS) -> List[str]:
+    """Delete compacted originals whose retention has passed (catalog rows are kept)"""
+    retired = []
+    for entry in catalog.members_past_retention(retention_seconds):
+        try:
+            os.remove(entry["path"])
+        except FileNotFoundError:
+            pass
+        catalog.mark_retired(entry["id"])
+        retired.append(entry["path"])
+    return retired
+
+
+def compact(window: str = "day", by_source: bool = False, dry_run: bool = False,
+            small_bytes: int = SMALL_FILE_BYTES) -> dict:
+    groups = plan(window, by_source, small_bytes)
+    if dry_run:
+        return {"dry_run": True,
+                "groups": [{"files": [m["path"] for m in g], "input_bytes": sum(m["size"] for m in g)}
+                           for g in groups]}
+    started = datetime.utcnow()
+    compacted = [_compact_group(g, window) for g in groups]
+    return {"dry_run": False, "compacted": compacted, "retired": retire_expired(),
+            "seconds": round((datetime.utcnow() - started).total_seconds(), 2)}
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Merge small raw files into compacted parquet files")
+    ap.add_argument("--window", choices=sorted(WINDOWS), default="day")
+    ap.add_argument("--by-source", action="store_true")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+    print(compact(args.window, args.by_source, args.dry_run))
@@ -0,0 +1,171 @@
+# data_collector/resumable.py
+# Resumable uploads: initiate -> PUT byte ranges (any order, in parallel) ->
+# complete with the sha256 of the whole file -> promoted into data/raw.
+#
+#   data/raw/.uploads/<upload_id>/meta.json        filename, size, expected sha256
+#   data/raw/.uploads/<upload_id>/data.part        preallocated to the full size
+#   data/raw/.uploads/<upload_id>/ranges/<s>-<e>   one empty marker per received range
+#
+# Received ranges are marker files rather than a shared state file, so parallel
+# chunk requests (even across worker processes) never read-modify-write anything.
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, List, Tuple
+
+from common.hashing import sha256_file
+from .collector import (MAX_UPLOAD_BYTES, RAW_DIR, SNIFF_BYTES, InvalidUpload, UploadTooLarge,
+                        _sniff_csv, _store)
+
+UPLOADS_DIR = Path(RAW_DIR) / ".uploads"
+# suggested chunk size handed to clients
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# unfinished uploads older than this are deleted
+UPLOAD_TTL_SECONDS = float(os.environ.get("CROPSENSE_UPLOAD_TTL_HOURS", "24")) * 3600
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+def _dir(upload_id: str) -> Path:
+    # ids are uuid hex; anything else can't name an upload
+    if not upload_id.isalnum():
+        raise UploadNotFound(upload_id)
+    d = UPLOADS_DIR / upload_id
+    if not (d / "meta.json").exists():
+        raise UploadNotFound(upload_id)
+    return d
+
+
+def _meta(d: Path) -> dict:
+    return json.loads((d / "meta.json").read_text())
+
+
+def _received(d: Path) -> List[Tuple[int, int]]:
+    """Merged [start, end) byte ranges received so far"""
+    ranges = sorted(tuple(map(int, p.name.split("-"))) for p in (d / "ranges").iterdir())
+    merged: List[List[int]] = []
+    for s, e in ranges:
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    return [(s, e) for s, e in merged]
+
+
+def _missing(received: List[Tuple[int, int]], size: int) -> List[Tuple[int, int]]:
+    gaps, pos = [], 0
+    for s, e in received:
+        if s > pos:
+            gaps.append((pos, s))
+        pos = max(pos, e)
+    if pos < size:
+        gaps.append((pos, size))
+    return gaps
+
+
+def prune_stale():
+    if not UPLOADS_DIR.exists():
+        return
+    for d in UPLOADS_DIR.iterdir():
+        if time.time() - d.stat().st_mtime > UPLOAD_TTL_SECONDS:
+            shutil.rmtree(d, ignore_errors=True)
+
+
+def initiate(filename: str, size: int, sha256: str | None = None,
+             chunk_size: int | None = None) -> dict:
+    if size <= 0:
+        raise InvalidUpload("Upload size must be positive")
+    if size > MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    prune_stale()
+    upload_id = uuid.uuid4().hex
+    d = UPLOADS_DIR / upload_id
+    (d / "ranges").mkdir(parents=True)
+    # sparse preallocation: chunks are written in place at their offsets
+    with open(d / "data.part", "wb") as f:
+        f.truncate(size)
+    meta = {"upload_id": upload_id, "filename": filename, "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "chunk_size": chunk_size or DEFAULT_CHUNK_SIZE,
+            "created_at": datetime.utcnow().isoformat() + "Z"}
+    (d / "meta.json").write_text(json.dumps(meta))
+    return meta
+
+
+def _check_header(d: Path, head: bytes, complete: bool):
+    # the first chunk carries the header: a non-CSV upload is dropped right away
+    try:
+        _sniff_csv(head, complete)
+    except InvalidUpload:
+        shutil.rmtree(d, ignore_errors=True)
+        raise
+
+
+async def write_chunk(upload_id: str, offset: int, blocks: AsyncIterator[bytes]) -> dict:
+    """Write a request body at offset. Bytes that arrived before a disconnect
+    are kept, so a retry can start from the first missing byte."""
+    d = _dir(upload_id)
+    size = _meta(d)["size"]
+    if offset < 0 or offset >= size:
+        raise InvalidUpload(f"Offset {offset} outside 0..{size - 1}")
+    pos = offset
+    head = b""
+    try:
+        with open(d / "data.part", "r+b") as f:
+            f.seek(offset)
+            async for block in blocks:
+                if pos + len(block) > size:
+                    raise InvalidUpload(f"Chunk runs past the declared size {size}")
+                if offset == 0 and len(head) < SNIFF_BYTES:
+                    head += block[:SNIFF_BYTES - len(head)]
+                    if len(head) == SNIFF_BYTES:
+                        _check_header(d, head, complete=False)
+                f.write(block)
+                pos += len(block)
+        if offset == 0 and 0 < len(head) < SNIFF_BYTES:
+            # first chunk shorter than the sniff window
+            _check_header(d, head, complete=pos == size)
+    finally:
+        if pos > offset and d.exists():
+            (d / "ranges" / f"{offset}-{pos}").touch()
+    return status(upload_id)
+
+
+def status(upload_id: str) -> dict:
+    d = _dir(upload_id)
+    meta = _meta(d)
+    received = _received(d)
+    missing = _missing(received, meta["size"])
+    return {**meta,
+            "received_bytes": sum(e - s for s, e in received),
+            "received": [list(r) for r in received],
+            "missing": [list(r) for r in missing],
+            "complete": not missing}
+
+
+def complete(upload_id: str, sha256: str | None = None) -> dict:
+    """Verify coverage and checksum, then promote the file into data/raw"""
+    d = _dir(upload_id)
+    st = status(upload_id)
+    if not st["complete"]:
+        raise InvalidUpload(f"Upload incomplete, missing byte ranges: {st['missing'][:10]}")
+    expected = (sha256 or st["sha256"] or "").lower()
+    if not expected:
+        raise InvalidUpload("sha256 of the complete file is required")
+    digest = sha256_file(d / "data.part")
+    if digest != expected:
+        raise InvalidUpload(f"Checksum mismatch: expected {expected}, got {digest}")
+    # _store renames within data/raw (same filesystem) or drops it as a duplicate
+    res = _store(str(d / "data.part"), digest, source=f"resumable:{st['filename']}")
+    shutil.rmtree(d, ignore_errors=True)
+    return res
+
+
+def abort(upload_id: str):
+    shutil.rmtree(_dir(upload_id), ignore_errors=True)
@@ -0,0 +1,83 @@
+# data_collector/transcode.py
+# Optional ingest-time conversion of raw CSVs to zstd Parquet (CROPSENSE_RAW_FORMAT=parquet).
+# The CSV is parsed once here; preprocessing runs then read typed columns instead
+# of re-parsing text every time.
+import os
+import re
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+
+# "csv" keeps uploads as they are; "parquet" replaces them with a transcoded copy
+RAW_FORMAT = os.environ.get("CROPSENSE_RAW_FORMAT", "csv").lower()
+BLOCK_SIZE = 16 * 1024 * 1024
+ROW_GROUP_ROWS = 256_000
+# columns that must come out numeric in a clean file (anything else is left to validation)
+EXPECTED_NUMERIC = ["Rainfall_mm", "Temperature_Celsius", "Days_to_Harvest", "Yield_tons_per_hectare"]
+
+_COLUMN_ERR = re.compile(r"CSV column #(\d+)")
+
+
+def _infer_schema(csv_path: Path) -> pa.Schema:
+    reader = pcsv.open_csv(csv_path, read_options=pcsv.ReadOptions(block_size=BLOCK_SIZE))
+    schema = reader.schema
+    reader.close()
+    names = [n.strip() for n in schema.names]
+    if len(names) < 2 or any(not n for n in names) or len(set(names)) != len(names):
+        raise ValueError(f"Unusable CSV header: {schema.names}")
+    return schema
+
+
+def _widen(t: pa.DataType) -> pa.DataType:
+    # a later block didn't fit the type inferred from the first one
+    if pa.types.is_integer(t):
+        return pa.float64()
+    return pa.string()
+
+
+def transcode_csv(csv_path, out_path=None) -> dict:
+    """Stream csv_path into a zstd Parquet file with an explicit, validated schema"""
+    csv_path = Path(csv_path)
+    out_path = Path(out_path) if out_path else csv_path.with_suffix(".parquet")
+    tmp = out_path.with_name(f".{out_path.name}.tmp")
+    schema = _infer_schema(csv_path)
+    try:
+        rows, schema = _write(csv_path, tmp, schema)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, out_path)
+
+    text_numeric = [c for c in EXPECTED_NUMERIC
+                    if c in schema.names and not pa.types.is_floating(schema.field(c).type)
+                    and not pa.types.is_integer(schema.field(c).type)]
+    return {"path": str(out_path), "rows": rows,
+            "csv_bytes": csv_path.stat().st_size, "parquet_bytes": out_path.stat().st_size,
+            "schema": {f.name: str(f.type) for f in schema},
+            # numeric columns with unparseable values; the preprocessor quarantines those rows
+            "text_numeric_columns": text_numeric}
+
+
+def _write(csv_path: Path, tmp: Path, schema: pa.Schema):
+    # types come from the first block; a column that later fails to convert is
+    # widened and the file re-read (int -> float -> string), at most once per column
+    for _ in range(2 * len(schema) + 1):
+        types = {f.name: f.type for f in schema}
+        try:
+            reader = pcsv.open_csv(csv_path, read_options=pcsv.ReadOptions(block_size=BLOCK_SIZE),
+                                   convert_options=pcsv.ConvertOptions(column_types=types))
+            rows = 0
+            with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+                for batch in reader:
+                    writer.write_batch(batch, row_group_size=ROW_GROUP_ROWS)
+                    rows += batch.num_rows
+            return rows, schema
+        except pa.ArrowInvalid as e:
+            m = _COLUMN_ERR.search(str(e))
+            if not m:
+                raise
+            i = int(m.group(1))
+            schema = schema.set(i, pa.field(schema.field(i).name, _widen(schema.field(i).type)))
+    raise ValueError(f"Could not settle a schema for {csv_path}")
@@ -0,0 +1,84 @@
+# data_collector/upload_client.py
+# Resumable upload of a large CSV to the collector:
+#   python -m data_collector.upload_client data/big.csv [--url http://collector:8001] [--parallel 4]
+# Re-running the same command after an interruption resumes the same upload
+# (its id is kept in <file>.upload next to the source) and only sends missing ranges.
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import requests
+
+from common.hashing import sha256_file
+
+COLLECTOR_URL = os.environ.get("COLLECTOR_URL", "http://localhost:8001")
+RETRIES = 5
+
+
+def _put_range(url: str, upload_id: str, path: Path, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for attempt in range(RETRIES):
+        try:
+            r = requests.put(f"{url}/uploads/{upload_id}", params={"offset": start}, data=data, timeout=300)
+            if r.status_code < 500:
+                r.raise_for_status()
+                return end - start
+        except requests.ConnectionError:
+            pass
+        time.sleep(min(30, 2 ** attempt))
+    raise RuntimeError(f"Chunk {start}-{end} failed after {RETRIES} attempts")
+
+
+def upload(path: str, url: str = COLLECTOR_URL, parallel: int = 4, chunk_size: int | None = None) -> dict:
+    path = Path(path)
+    size = path.stat().st_size
+    digest = sha256_file(path)
+    state = path.with_name(path.name + ".upload")
+
+    status = None
+    if state.exists():
+        upload_id = state.read_text().strip()
+        r = requests.get(f"{url}/uploads/{upload_id}", timeout=30)
+        if r.status_code == 200 and r.json()["size"] == size and r.json()["sha256"] == digest:
+            status = r.json()
+    if status is None:
+        r = requests.post(f"{url}/uploads", json={"filename": path.name, "size": size,
+                                                  "sha256": digest, "chunk_size": chunk_size}, timeout=30)
+        r.raise_for_status()
+        status = r.json()
+        status["missing"] = [[0, size]]
+        state.write_text(status["upload_id"])
+    upload_id, step = status["upload_id"], status["chunk_size"]
+
+    ranges = [(o, min(o + step, end)) for start, end in status["missing"] for o in range(start, end, step)]
+    # the header chunk goes first so a bad file is refused before the rest is sent
+    sent = size - sum(e - s for s, e in status["missing"])
+    if ranges and ranges[0][0] == 0:
+        sent += _put_range(url, upload_id, path, *ranges.pop(0))
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures = [pool.submit(_put_range, url, upload_id, path, s, e) for s, e in ranges]
+        for fut in as_completed(futures):
+            sent += fut.result()
+            print(f"\r{sent / size:6.1%} of {size:,} bytes", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    r = requests.post(f"{url}/uploads/{upload_id}/complete", json={"sha256": digest}, timeout=600)
+    r.raise_for_status()
+    state.unlink(missing_ok=True)
+    return r.json()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Resumable CSV upload to the CropSense collector")
+    ap.add_argument("path")
+    ap.add_argument("--url", default=COLLECTOR_URL)
+    ap.add_argument("--parallel", type=int, default=4)
+    ap.add_argument("--chunk-mb", type=float, default=None)
+    args = ap.parse_args()
+    chunk = int(args.chunk_mb * 1024 * 1024) if args.chunk_mb else None
+    print(upload(args.path, args.url, args.parallel, chunk))
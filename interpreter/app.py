@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, Header, HTTPException, Depends
 from pydantic import BaseModel
 from pathlib import Path
 from common.auth import get_current_user_optional
+from common.scheduler import Scheduler, work_class
 
 app = FastAPI(title="InterpreterAgent", version="0.2")
 MODEL_PATH = Path("predictor/models/model.joblib")
+# UI explain calls are interactive; bulk callers (X-Work-Class: bulk) get their own pool
+scheduler = Scheduler()
 
 class ExplainRequest(BaseModel):
     Region: str | None = None
@@ -21,10 +24,20 @@ class ExplainRequest(BaseModel):
 def health():
     return {"status": "ok", "service": "interpreter", "model_exists": MODEL_PATH.exists()}
 
+@app.get("/scheduler")
+def scheduler_stats():
+    """Queue depth, concurrency and latency percentiles per work class"""
+    return scheduler.stats()
+
 @app.post("/explain")
-def explain(req: ExplainRequest, user: str | None = Depends(get_current_user_optional)):
+async def explain(req: ExplainRequest, user: str | None = Depends(get_current_user_optional),
+                  x_work_class: str | None = Header(None)):
     from .explain import explain_sample
-    res = explain_sample(req.dict())
+    try:
+        cls = work_class(x_work_class)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    res = await scheduler.run(cls, explain_sample, req.dict())
     if res.get("status") != "ok":
         raise HTTPException(status_code=503, detail=res.get("detail"))
     return res
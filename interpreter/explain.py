@@ -3,6 +3,8 @@ import joblib, numpy as np, pandas as pd
 from pathlib import Path
 from typing import Dict, Any
 from common.llm_adapter import summarize_top_features
+from common.binned import apply_bins
+from common.dataset import read_features
 
 MODEL_PATH = Path("predictor/models/model.joblib")
 
@@ -88,7 +90,10 @@ def explain_sample(sample: Dict[str, float]) -> Dict[str, Any]:
     try:
         import shap
         explainer = shap.TreeExplainer(model)
-        shap_vals = explainer.shap_values(row[feature_columns])
+        X = row[feature_columns]
+        if artifact.get("binning"):
+            X = apply_bins(X, artifact["binning"])
+        shap_vals = explainer.shap_values(X)
         arr = shap_vals[0] if isinstance(shap_vals, (list, tuple)) else shap_vals
         contributions = dict(zip(feature_columns, arr.tolist()[0]))
         ranked = sorted(contributions.items(), key=lambda kv: abs(kv[1]), reverse=True)
@@ -101,7 +106,10 @@ def explain_sample(sample: Dict[str, float]) -> Dict[str, Any]:
             top_features = [(k, float(v)) for k, v in ranked[:5]]
         else:
             try:
-                df = pd.read_parquet("data/processed/features.parquet")
+                # only the sample's crop/region partitions and the model's columns
+                df = read_features(columns=feature_columns, crop=sample.get("Crop"), region=sample.get("Region"))
+                if df.empty:
+                    df = read_features(columns=feature_columns)
                 means = df[feature_columns].mean()
                 diffs = {c: float(abs(row.iloc[0][c] - means[c])) for c in feature_columns}
                 ranked = sorted(diffs.items(), key=lambda kv: kv[1], reverse=True)
@@ -0,0 +1,50 @@
+# orchestrator/app.py
+# Read API over the pipeline history (common/history.py): every collect /
+# preprocess / train execution with its metrics, orchestrated runs and trends.
+from fastapi import FastAPI, HTTPException
+
+from common import history
+
+app = FastAPI(title="PipelineHistory", version="0.1")
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "service": "pipeline"}
+
+
+@app.get("/history/stages")
+def stage_runs(since: str | None = None, until: str | None = None, stage: str | None = None,
+               status: str | None = None, limit: int = 50, cursor: str | None = None):
+    """Stage executions newest first; ``since``/``until`` are ISO timestamps (UTC) or prefixes"""
+    try:
+        return history.list_stage_runs(since, until, stage, status, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Bad cursor: {e}")
+
+
+@app.get("/history/status")
+def pipeline_status():
+    return history.stage_status()
+
+
+@app.get("/history/trends")
+def trends(since: str | None = None, until: str | None = None, bucket: str = "hour",
+           stage: str | None = None):
+    try:
+        return {"bucket": bucket, "trends": history.trends(since, until, bucket, stage)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/history/runs")
+def pipeline_runs(limit: int = 20, since: str | None = None, until: str | None = None):
+    return {"runs": history.list_runs(limit, since, until)}
+
+
+@app.get("/history/runs/{run_id}")
+def pipeline_run(run_id: str):
+    run = history.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
@@ -0,0 +1,160 @@
+# orchestrator/dag.py
+# Small DAG runner with content-addressed stage caching.
+#
+# A stage's cache key hashes what determines its output: the outputs of the
+# stages it depends on (raw file hash, features run_id, ...), the source of the
+# code that implements it and its parameters. A stage whose key has a cached
+# output that still checks out is not run. Stages whose dependencies are done
+# run concurrently.
+import hashlib
+import json
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from common import history
+
+Inputs = Dict[str, dict]
+
+# code paths are relative to the repo root, wherever the pipeline is run from
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+
+
+def code_version(*paths: str) -> str:
+    """sha256 over the source files (or globs) a stage runs"""
+    h = hashlib.sha256()
+    for pattern in paths:
+        files = sorted(PACKAGE_ROOT.glob(pattern))
+        if not files:
+            # hashing nothing would give every version of the stage the same key
+            raise FileNotFoundError(f"No source files match {pattern!r} under {PACKAGE_ROOT}")
+        for p in files:
+            h.update(str(p.relative_to(PACKAGE_ROOT)).encode())
+            h.update(p.read_bytes())
+    return h.hexdigest()
+
+
+class Stage:
+    """``fn(inputs, run_id)`` does the work and returns a JSON-able dict; ``inputs``
+    maps each dependency's name to its output and ``run_id`` is the pipeline run
+    (services record their side of the stage under it). ``key(inputs)`` returns
+    the material the output depends on (None: not cacheable, always run) and
+    ``valid(output)`` says whether a cached output is still usable."""
+
+    def __init__(self, name: str, fn: Callable[[Inputs, str], dict], deps: Iterable[str] = (),
+                 key: Optional[Callable[[Inputs], Optional[dict]]] = None,
+                 valid: Optional[Callable[[dict], bool]] = None, code: Iterable[str] = (),
+                 params: Optional[dict] = None):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.key = key
+        self.valid = valid
+        self.code = list(code)
+        self.params = params or {}
+
+    def cache_key(self, inputs: Inputs) -> Optional[str]:
+        if self.key is None:
+            return None
+        material = self.key(inputs)
+        if material is None:
+            return None
+        blob = json.dumps({"stage": self.name, "inputs": material, "params": self.params,
+                           "code": code_version(*self.code)}, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class DAG:
+    def __init__(self, name: str, stages: List[Stage]):
+        self.name = name
+        self.stages = {s.name: s for s in stages}
+        for s in stages:
+            for d in s.deps:
+                if d not in self.stages:
+                    raise ValueError(f"Stage {s.name} depends on unknown stage {d}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        """Stage names with every stage after its dependencies (raises on a cycle)"""
+        state: Dict[str, int] = {}
+        order: List[str] = []
+
+        def visit(n: str):
+            if state.get(n) == 1:
+                raise ValueError(f"Cycle through stage {n}")
+            if state.get(n) == 2:
+                return
+            state[n] = 1
+            for d in self.stages[n].deps:
+                visit(d)
+            state[n] = 2
+            order.append(n)
+
+        for n in self.stages:
+            visit(n)
+        return order
+
+    def run(self, params: Optional[dict] = None, force: Iterable[str] = (), max_workers: int = 4) -> dict:
+        """Run every stage once its dependencies succeeded; returns the run record"""
+        run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + "-" + uuid.uuid4().hex[:6]
+        force = set(force)
+        history.start_run(run_id, self.name, params or {})
+        started = time.perf_counter()
+        outputs: Dict[str, dict] = {}
+        status: Dict[str, str] = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as pool:
+            running = {}
+            while True:
+                # dependencies first, so a skip reaches every descendant in one pass
+                for s in (self.stages[n] for n in self.order):
+                    if s.name in status or s.name in running.values():
+                        continue
+                    dep_states = [status.get(d) for d in s.deps]
+                    if any(st in ("failed", "skipped") for st in dep_states):
+                        status[s.name] = "skipped"
+                        history.record_stage(run_id, s.name, "skipped", error="upstream stage failed")
+                    elif all(st == "succeeded" for st in dep_states):
+                        inputs = {d: outputs[d] for d in s.deps}
+                        running[pool.submit(self._run_stage, run_id, s, inputs, s.name in force)] = s.name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    ok, out = fut.result()
+                    status[name] = "succeeded" if ok else "failed"
+                    if ok:
+                        outputs[name] = out
+                    print(f"  {name}: {status[name]}")
+        overall = "succeeded" if all(st == "succeeded" for st in status.values()) else "failed"
+        history.finish_run(run_id, overall, round(time.perf_counter() - started, 3))
+        return history.get_run(run_id)
+
+    def _run_stage(self, run_id: str, stage: Stage, inputs: Inputs, force: bool):
+        started_at = datetime.utcnow().isoformat(timespec="microseconds") + "Z"
+        t0 = time.perf_counter()
+        key = None
+        try:
+            key = stage.cache_key(inputs)
+            if key and not force:
+                cached = history.cache_get(key)
+                if cached is not None and (stage.valid is None or stage.valid(cached)):
+                    history.record_stage(run_id, stage.name, "succeeded", key, cache_hit=True,
+                                         started_at=started_at, seconds=round(time.perf_counter() - t0, 3),
+                                         output=cached)
+                    return True, cached
+                if cached is not None:
+                    history.cache_drop(key)  # output is gone or superseded
+            out = stage.fn(inputs, run_id)
+            if key:
+                history.cache_put(key, stage.name, out)
+            history.record_stage(run_id, stage.name, "succeeded", key, started_at=started_at,
+                                 seconds=round(time.perf_counter() - t0, 3), output=out)
+            return True, out
+        except Exception as e:
+            history.record_stage(run_id, stage.name, "failed", key, started_at=started_at,
+                                 seconds=round(time.perf_counter() - t0, 3), error=str(e))
+            return False, None
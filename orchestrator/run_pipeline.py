@@ -1,40 +1,142 @@
 # orchestrator/run_pipeline.py
-import os, time, requests, sys
+# collect -> preprocess -> {train, summary} as a DAG (orchestrator/dag.py):
+# a stage is skipped when its inputs, code and parameters hash to a cached
+# output that still exists, and train/summary run side by side.
+#   python -m orchestrator.run_pipeline [--dataset NAME] [--binned] [--force preprocess train]
+import argparse
+import json
+import os
+import sys
+import time
+
+import requests
+
+from common.hashing import sha256_file
+from common.history import RUN_HEADER
+from common.readiness import wait_ready
+from .dag import DAG, Stage, code_version
 
 COLLECTOR = os.environ.get("COLLECTOR_URL", "http://collector:8001")
 PREPROCESSOR = os.environ.get("PREPROCESSOR_URL", "http://preprocessor:8002")
 PREDICTOR = os.environ.get("PREDICTOR_URL", "http://predictor:8003")
+SOURCE = os.environ.get("CROPSENSE_SOURCE_PATH", "data/crop_yield.csv")
+TRAIN_TIMEOUT = float(os.environ.get("CROPSENSE_TRAIN_TIMEOUT", "3600"))
 
-def wait_for(url, timeout=60):
-    end = time.time() + timeout
-    while time.time() < end:
-        try:
-            r = requests.get(url + "/health", timeout=5)
-            if r.ok:
-                print(f"{url} is up")
-                return True
-        except Exception:
-            pass
-        time.sleep(1)
-    print(f"Timeout waiting for {url}")
-    return False
+PREPROCESS_CODE = ["preprocessor/preprocess.py", "preprocessor/validation.py",
+                   "common/dataset.py", "common/binned.py", "common/stats.py"]
+TRAIN_CODE = ["predictor/train.py", "common/binned.py", "common/dataset.py"]
 
-def main():
-    if not wait_for(COLLECTOR): sys.exit(1)
-    if not wait_for(PREPROCESSOR): sys.exit(1)
-    if not wait_for(PREDICTOR): sys.exit(1)
+def wait_for_services(timeout=60):
+    def report(name, res):
+        if res["ready"]:
+            print(f"{name} is up ({res['waited_seconds']}s, {res['attempts']} probes)")
+    status = wait_ready({name: url + "/health" for name, url in
+                         (("collector", COLLECTOR), ("preprocessor", PREPROCESSOR), ("predictor", PREDICTOR))},
+                        deadline=timeout, on_update=report)
+    for name, res in status["services"].items():
+        if not res["ready"]:
+            print(f"Timeout waiting for {name} at {res['url']}: {res['error']}")
+    return status["ready"]
+
+def poll_job(url, interval=2):
+    # background jobs report progress instead of holding a request open
+    while True:
+        status = requests.get(url, timeout=10).json()
+        print(f"  {status['state']} {status.get('stage')} rows={status.get('rows_processed')} eta={status.get('eta_seconds')}")
+        if status["state"] in ("succeeded", "failed", "cancelled"):
+            return status
+        time.sleep(interval)
+
+def _get(url, **params):
+    r = requests.get(url, params={k: v for k, v in params.items() if v is not None}, timeout=30)
+    return r.json() if r.ok else None
+
+# ---------- stages ----------
+
+def collect(inputs, run_id):
+    r = requests.post(COLLECTOR + "/collect", json={"source": "local", "path": SOURCE},
+                      headers={RUN_HEADER: run_id}, timeout=300)
+    r.raise_for_status()
+    res = r.json()
+    return {"path": res["path"], "sha256": res["sha256"]}
+
+def collect_key(inputs):
+    # the source file's content decides what gets collected; without a source file
+    # the collector stores its built-in demo dataset, which only changes with its code
+    if os.path.exists(SOURCE):
+        return {"source_sha256": sha256_file(SOURCE)}
+    return {"source": SOURCE, "demo_dataset": code_version("data_collector/collector.py")}
 
-    print("Triggering collector.collect (local source)")
-    r = requests.post(COLLECTOR + "/collect", json={"source":"local"}, timeout=30)
-    print("collector:", r.status_code, r.text)
+def collect_valid(out):
+    # the stored raw file is still there (data/ is shared with the collector)
+    return os.path.exists(out["path"])
+
+def make_stages(dataset=None, binned=None):
+    def preprocess(inputs, run_id):
+        r = requests.post(PREPROCESSOR + "/preprocess/jobs",
+                          json={"raw_path": inputs["collect"]["path"], "dataset": dataset},
+                          headers={RUN_HEADER: run_id}, timeout=30)
+        r.raise_for_status()
+        status = poll_job(PREPROCESSOR + r.json()["status_url"])
+        if status["state"] != "succeeded":
+            raise RuntimeError(f"preprocess job {status['state']}: {status.get('error')}")
+        res = status["result"]
+        return {"run_id": res["run_id"], "features_path": res["features_path"],
+                "source_sha256": res["source_sha256"], "skipped": res.get("skipped", False)}
+
+    def preprocess_valid(out):
+        # cached features must still be the dataset's published run
+        summary = _get(PREPROCESSOR + "/summary", dataset=dataset)
+        return summary is not None and summary.get("run_id") == out["run_id"]
+
+    def train(inputs, run_id):
+        params = {"dataset": dataset, "binned": binned}
+        r = requests.post(PREDICTOR + "/train", params={k: v for k, v in params.items() if v is not None},
+                          headers={RUN_HEADER: run_id}, timeout=TRAIN_TIMEOUT)
+        r.raise_for_status()
+        res = r.json()
+        return {k: res.get(k) for k in ("run_id", "mae", "rmse", "r2", "binned")}
+
+    def train_valid(out):
+        model = _get(PREDICTOR + "/model", dataset=dataset)
+        return model is not None and model.get("run_id") == out["run_id"]
+
+    def summary(inputs, run_id):
+        # warms the per-run stats the UI's analysis page reads
+        res = _get(PREPROCESSOR + "/summary", dataset=dataset)
+        if res is None:
+            raise RuntimeError("summary unavailable")
+        return {"run_id": res.get("run_id"), "rows": res.get("rows"), "files": res.get("files"),
+                "bytes": res.get("bytes")}
+
+    run_key = lambda inputs: {"run_id": inputs["preprocess"]["run_id"]}
+    return [
+        Stage("collect", collect, key=collect_key, valid=collect_valid),
+        Stage("preprocess", preprocess, deps=["collect"], valid=preprocess_valid, code=PREPROCESS_CODE,
+              key=lambda inputs: {"raw_sha256": inputs["collect"]["sha256"]}, params={"dataset": dataset}),
+        Stage("train", train, deps=["preprocess"], key=run_key, valid=train_valid, code=TRAIN_CODE,
+              params={"dataset": dataset, "binned": binned}),
+        Stage("summary", summary, deps=["preprocess"], key=run_key, valid=preprocess_valid,
+              params={"dataset": dataset}),
+    ]
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the CropSense pipeline, skipping stages whose inputs are unchanged")
+    ap.add_argument("--dataset", default=None)
+    ap.add_argument("--binned", action="store_true", default=None)
+    ap.add_argument("--force", nargs="*", default=[], help="stages to run even on a cache hit")
+    args = ap.parse_args()
 
-    print("Triggering preprocessor")
-    r2 = requests.post(PREPROCESSOR + "/preprocess", json={}, timeout=300)
-    print("preprocess:", r2.status_code, r2.text)
+    if not wait_for_services(): sys.exit(1)
 
-    print("Triggering predictor train")
-    r3 = requests.post(PREDICTOR + "/train", json={}, timeout=600)
-    print("train:", r3.status_code, r3.text)
+    dag = DAG("crop_pipeline", make_stages(args.dataset, args.binned))
+    run = dag.run(params={"dataset": args.dataset, "binned": args.binned, "source": SOURCE}, force=args.force)
+    for s in run["stages"]:
+        hit = " (cached)" if s["cache_hit"] else ""
+        print(f"{s['stage']:<11} {s['status']:<9} {s['seconds'] or 0:8.2f}s{hit} {s['error'] or ''}")
+    print(json.dumps({"run_id": run["id"], "status": run["status"], "seconds": run["seconds"]}))
+    if run["status"] != "succeeded":
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,139 @@
+# orchestrator/supervisor.py
+# Runs a pool of queue worker processes and resizes it from the queue's backlog:
+#   python -m orchestrator.supervisor --worker predictor.worker --queue features_ready --min 1 --max 4
+#
+# Grows as soon as the backlog (depth / --per-worker) or the age of the oldest
+# waiting message (> --max-age) calls for it; shrinks one worker at a time after
+# the queue has needed fewer workers for --cooldown seconds. Shrinking sends
+# SIGTERM, which lets a worker finish and ack its current message first.
+import argparse
+import logging
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from common import events
+
+logger = logging.getLogger("orchestrator.supervisor")
+
+# native thread pools that would otherwise each start one thread per core
+THREAD_ENV = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS",
+              "CROPSENSE_TRAIN_THREADS", "CROPSENSE_PREPROCESS_WORKERS"]
+
+
+class WorkerPool:
+    def __init__(self, module: str, queue: str, min_workers: int = 1, max_workers: int = 4,
+                 threads: Optional[int] = None, per_worker: int = 2, max_age: float = 60.0,
+                 cooldown: float = 120.0, grace: float = 900.0):
+        if not 0 <= min_workers <= max_workers or max_workers < 1:
+            raise ValueError("need 0 <= min <= max and max >= 1")
+        self.module, self.queue = module, queue
+        self.min_workers, self.max_workers = min_workers, max_workers
+        # CPU budget: the cores are split between the largest pool we may run
+        self.threads = threads or max(1, (os.cpu_count() or 1) // max_workers)
+        self.per_worker, self.max_age = per_worker, max_age
+        self.cooldown, self.grace = cooldown, grace
+        self.workers: List[subprocess.Popen] = []
+        self.draining = {}  # Popen -> time SIGTERM was sent
+        self._low_since = None
+
+    def _spawn(self):
+        env = dict(os.environ, **{k: str(self.threads) for k in THREAD_ENV})
+        p = subprocess.Popen([sys.executable, "-m", self.module], env=env)
+        logger.info("Started %s worker pid %d (%d threads)", self.module, p.pid, self.threads)
+        self.workers.append(p)
+
+    def _retire(self):
+        p = self.workers.pop()  # newest first
+        p.terminate()
+        self.draining[p] = time.monotonic()
+        logger.info("Draining worker pid %d", p.pid)
+
+    def _reap(self):
+        for p in [p for p in self.workers if p.poll() is not None]:
+            logger.warning("Worker pid %d exited with %s", p.pid, p.returncode)
+            self.workers.remove(p)
+        for p, since in list(self.draining.items()):
+            if p.poll() is not None:
+                del self.draining[p]
+            elif time.monotonic() - since > self.grace:
+                logger.warning("Worker pid %d did not drain in %.0fs, killing it", p.pid, self.grace)
+                p.kill()
+
+    def desired(self, stats: Optional[dict]) -> int:
+        current = len(self.workers)
+        if stats is None or stats.get("depth") is None:
+            # broker unreachable: hold the pool as it is
+            return max(self.min_workers, current)
+        want = math.ceil(stats["depth"] / self.per_worker)
+        age = stats.get("oldest_age_seconds")
+        if age is not None and age > self.max_age and stats["depth"]:
+            want = max(want, current + 1)  # messages are waiting too long at this size
+        return max(self.min_workers, min(self.max_workers, want))
+
+    def step(self, stats: Optional[dict]) -> int:
+        self._reap()
+        want = self.desired(stats)
+        current = len(self.workers)
+        if want > current:
+            self._low_since = None
+            for _ in range(want - current):
+                self._spawn()
+        elif want < current:
+            now = time.monotonic()
+            if self._low_since is None:
+                self._low_since = now
+            elif now - self._low_since >= self.cooldown:
+                self._retire()
+                self._low_since = now
+        else:
+            self._low_since = None
+        return len(self.workers)
+
+    def shutdown(self):
+        for p in self.workers:
+            p.terminate()
+            self.draining[p] = time.monotonic()
+        self.workers = []
+        while self.draining:
+            self._reap()
+            time.sleep(0.5)
+
+    def run(self, interval: float = 5.0):
+        stop = []
+        signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+        try:
+            while not stop:
+                try:
+                    stats = events.queue_stats(self.queue)
+                except Exception as e:
+                    logger.warning("Could not read %s stats: %r", self.queue, e)
+                    stats = None
+                size = self.step(stats)
+                logger.debug("%s: %s -> %d workers", self.queue, stats, size)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Autoscaling pool of queue workers")
+    ap.add_argument("--worker", default="predictor.worker", help="module run with python -m")
+    ap.add_argument("--queue", default=events.FEATURES_READY)
+    ap.add_argument("--min", type=int, default=1)
+    ap.add_argument("--max", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=None, help="CPU threads per worker (default: cores / max)")
+    ap.add_argument("--per-worker", type=int, default=2, help="waiting messages per worker before growing")
+    ap.add_argument("--max-age", type=float, default=60.0, help="grow when the oldest message waited longer (s)")
+    ap.add_argument("--cooldown", type=float, default=120.0)
+    ap.add_argument("--interval", type=float, default=5.0)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    WorkerPool(args.worker, args.queue, args.min, args.max, args.threads, args.per_worker,
+               args.max_age, args.cooldown).run(args.interval)
@@ -0,0 +1,296 @@
+# predictor/batch_jobs.py
+# Server-side batch predict (+ explain) jobs. The API stores the upload under
+# data/batch/<job_id>/ and queues the job on batch_jobs; predictor/batch_worker.py
+# scores it chunk by chunk into results/part-*.parquet. Job state and per-chunk
+# progress live in SQLite (data/batch/jobs.db), so the API, every worker and a
+# reopened UI tab see the same job.
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pyarrow.parquet as pq
+
+JOBS_DIR = Path(os.environ.get("CROPSENSE_BATCH_DIR", "data/batch"))
+DB_PATH = JOBS_DIR / "jobs.db"
+# finished jobs (and their files) are removed after this many days
+RETENTION_DAYS = float(os.environ.get("CROPSENSE_BATCH_RETENTION_DAYS", "7"))
+FINAL_STATES = ("succeeded", "failed", "cancelled")
+FORMATS = (".csv", ".parquet")
+
+_thread_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def get_connection() -> sqlite3.Connection:
+    if getattr(_thread_local, "conn", None) is None:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        _thread_local.conn = conn
+    return _thread_local.conn
+
+
+@contextmanager
+def transaction():
+    conn = get_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def init_db():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        with transaction() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS batch_jobs (
+                    id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    filename TEXT,
+                    input_path TEXT NOT NULL,
+                    explain INTEGER NOT NULL DEFAULT 0,
+                    dataset TEXT,
+                    priority TEXT,
+                    user TEXT,
+                    model_run_id TEXT,
+                    rows_total INTEGER,
+                    chunks_total INTEGER,
+                    rows_done INTEGER NOT NULL DEFAULT 0,
+                    chunks_done INTEGER NOT NULL DEFAULT 0,
+                    -- the slice (message) currently working on the job; older messages are stale
+                    slice INTEGER NOT NULL DEFAULT 0,
+                    slice_event TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    error TEXT
+                )"""
+            )
+            # one row per scored chunk: progress stays exact when a chunk is redone after a crash
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS batch_chunks (
+                    job_id TEXT NOT NULL REFERENCES batch_jobs(id),
+                    chunk INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    seconds REAL,
+                    PRIMARY KEY (job_id, chunk)
+                )"""
+            )
+            have = {c[1] for c in conn.execute("PRAGMA table_info(batch_jobs)")}
+            if "slice_event" not in have:
+                conn.execute("ALTER TABLE batch_jobs ADD COLUMN slice_event TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS batch_jobs_created ON batch_jobs (created_at)")
+        _initialized = True
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+def _parse(ts: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(ts.rstrip("Z")) if ts else None
+
+
+def job_dir(job_id: str) -> Path:
+    return JOBS_DIR / job_id
+
+
+def results_dir(job_id: str) -> Path:
+    return job_dir(job_id) / "results"
+
+
+def _job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["job_id"] = job.pop("id")
+    job["explain"] = bool(job["explain"])
+    job.pop("input_path")
+    started, finished = _parse(job["started_at"]), _parse(job["finished_at"])
+    elapsed = ((finished or datetime.utcnow()) - started).total_seconds() if started else 0.0
+    rate = job["rows_done"] / elapsed if elapsed > 0 and job["rows_done"] else None
+    job["progress"] = round(job["chunks_done"] / job["chunks_total"], 4) if job["chunks_total"] else 0.0
+    job["elapsed_seconds"] = round(elapsed, 1)
+    job["rows_per_sec"] = round(rate, 1) if rate else None
+    job["eta_seconds"] = None
+    if job["state"] == "running" and rate and job["rows_total"]:
+        job["eta_seconds"] = round(max(0, job["rows_total"] - job["rows_done"]) / rate, 1)
+    return job
+
+
+def create_job(job_id: str, filename: str, input_path: Path, explain: bool, dataset: Optional[str],
+               priority: str, user: Optional[str]) -> dict:
+    init_db()
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO batch_jobs (id, state, filename, input_path, explain, dataset, priority, user, created_at)"
+            " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, filename, str(input_path), int(explain), dataset, priority, user, _now()),
+        )
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    row = get_raw(job_id)
+    return _job(row) if row else None
+
+
+def get_raw(job_id: str) -> Optional[sqlite3.Row]:
+    """The stored row, including the worker-side input path"""
+    init_db()
+    return get_connection().execute("SELECT * FROM batch_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def list_jobs(limit: int = 20, user: Optional[str] = None) -> List[dict]:
+    init_db()
+    sql, args = "SELECT * FROM batch_jobs", []
+    if user:
+        sql += " WHERE user = ?"
+        args.append(user)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    args.append(max(1, min(limit, 200)))
+    return [_job(r) for r in get_connection().execute(sql, args).fetchall()]
+
+
+def unfinished() -> List[sqlite3.Row]:
+    init_db()
+    return get_connection().execute(
+        "SELECT * FROM batch_jobs WHERE state NOT IN (?, ?, ?) ORDER BY created_at", FINAL_STATES).fetchall()
+
+
+def set_state(job_id: str, state: str, error: Optional[str] = None) -> bool:
+    """Move a job that isn't finished yet to ``state``; False if it already finished (e.g. cancelled)"""
+    init_db()
+    with transaction() as conn:
+        cur = conn.execute(
+            "UPDATE batch_jobs SET state = ?, error = COALESCE(?, error),"
+            " started_at = CASE WHEN started_at IS NULL AND ? IN ('staging', 'running') THEN ? ELSE started_at END,"
+            " finished_at = CASE WHEN ? IN (?, ?, ?) THEN ? ELSE finished_at END"
+            " WHERE id = ? AND state NOT IN (?, ?, ?)",
+            (state, error, state, _now(), state, *FINAL_STATES, _now(), job_id, *FINAL_STATES),
+        )
+    return cur.rowcount == 1
+
+
+def set_plan(job_id: str, rows_total: int, chunks_total: int, model_run_id: Optional[str]):
+    with transaction() as conn:
+        conn.execute("UPDATE batch_jobs SET rows_total = ?, chunks_total = ?, model_run_id = ? WHERE id = ?",
+                     (rows_total, chunks_total, model_run_id, job_id))
+
+
+def claim_slice(job_id: str, slice_no: int, event_id: Optional[str]) -> bool:
+    """Let the message (slice_no, event_id) work on the job. A newer slice takes
+    over; the message that claimed the current slice may come back (a redelivery),
+    any other message for it is a duplicate."""
+    with transaction() as conn:
+        cur = conn.execute(
+            "UPDATE batch_jobs SET slice = ?, slice_event = ? WHERE id = ?"
+            " AND (slice < ? OR (slice = ? AND (slice_event IS NULL OR slice_event = ?)))",
+            (slice_no, event_id, job_id, slice_no, slice_no, event_id))
+    return cur.rowcount == 1
+
+
+def done_chunks(job_id: str) -> set:
+    rows = get_connection().execute("SELECT chunk FROM batch_chunks WHERE job_id = ?", (job_id,)).fetchall()
+    return {r["chunk"] for r in rows}
+
+
+def chunk_done(job_id: str, chunk: int, rows: int, seconds: float):
+    with transaction() as conn:
+        cur = conn.execute("INSERT OR IGNORE INTO batch_chunks (job_id, chunk, rows, seconds) VALUES (?, ?, ?, ?)",
+                           (job_id, chunk, rows, seconds))
+        if cur.rowcount:
+            conn.execute("UPDATE batch_jobs SET rows_done = rows_done + ?, chunks_done = chunks_done + 1"
+                         " WHERE id = ?", (rows, job_id))
+
+
+def cancel(job_id: str) -> Optional[dict]:
+    """Stop a job; a worker finishes the chunk in hand and stops"""
+    if get_raw(job_id) is None:
+        return None
+    set_state(job_id, "cancelled")
+    return get_job(job_id)
+
+
+def result_parts(job_id: str) -> List[Path]:
+    return sorted(results_dir(job_id).glob("part-*.parquet"))
+
+
+def result_parquet(job_id: str) -> Path:
+    """All result parts as one Parquet file, built once on first download"""
+    out = job_dir(job_id) / "result.parquet"
+    if out.exists():
+        return out
+    tmp = out.with_name(f".{out.name}.tmp")
+    writer = None
+    try:
+        for part in result_parts(job_id):
+            table = pq.read_table(part)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema, compression="zstd")
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise FileNotFoundError("Job has no results")
+    os.replace(tmp, out)
+    return out
+
+
+def result_summary(job_id: str, value_col: str, preview_rows: int = 200) -> dict:
+    """Row count, value_col stats, top_feature counts and the first rows of the results,
+    read a part (and only the columns needed) at a time"""
+    rows, total, peak = 0, 0.0, float("-inf")
+    top: Dict[str, int] = {}
+    preview: List[dict] = []
+    for part in result_parts(job_id):
+        f = pq.ParquetFile(part)
+        cols = [c for c in (value_col, "top_feature") if c in f.schema_arrow.names]
+        df = f.read(columns=cols).to_pandas()
+        rows += len(df)
+        total += float(df[value_col].sum())
+        if len(df):
+            peak = max(peak, float(df[value_col].max()))
+        if "top_feature" in df:
+            for name, n in df["top_feature"].value_counts().items():
+                top[name] = top.get(name, 0) + int(n)
+        if len(preview) < preview_rows:
+            head = f.read().to_pandas().head(preview_rows - len(preview))
+            # to_json turns numpy scalars and NaN into plain JSON
+            preview.extend(json.loads(head.to_json(orient="records")))
+    return {"rows": rows, "mean": total / rows if rows else None, "max": peak if rows else None,
+            "top_feature": top or None, "preview": preview}
+
+
+def iter_result_csv(job_id: str) -> Iterator[bytes]:
+    """Stream the results as CSV, one part at a time"""
+    for i, part in enumerate(result_parts(job_id)):
+        yield pq.read_table(part).to_pandas().to_csv(index=False, header=(i == 0)).encode()
+
+
+def prune(retention_days: float = RETENTION_DAYS) -> int:
+    """Delete finished jobs older than the retention period with their files"""
+    init_db()
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).isoformat(timespec="seconds") + "Z"
+    with transaction() as conn:
+        old = [r["id"] for r in conn.execute(
+            "SELECT id FROM batch_jobs WHERE state IN (?, ?, ?) AND finished_at < ?", (*FINAL_STATES, cutoff))]
+        for job_id in old:
+            conn.execute("DELETE FROM batch_chunks WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM batch_jobs WHERE id = ?", (job_id,))
+    for job_id in old:
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    return len(old)
@@ -0,0 +1,215 @@
+# predictor/batch_score.py
+# Offline bulk scoring, without going through the API:
+#   python -m predictor.batch_score inventory.csv scores/ [--dataset D] [--workers 4] [--partition-by Crop]
+# The input (CSV or Parquet) is streamed in chunks that are fanned out to worker
+# processes; each worker loads the model bundle once and writes its chunks'
+# predictions as Parquet parts under the output directory. A chunk is marked
+# done only once its parts are written, so rerunning the same command after a
+# crash scores just the chunks that are missing.
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.api.types import is_numeric_dtype
+
+from common.hashing import sha256_file
+from .bundle import load_bundle, predict
+from .train import model_path
+
+CHUNK_ROWS = int(os.environ.get("CROPSENSE_SCORE_CHUNK_ROWS", "100000"))
+WORKERS = int(os.environ.get("CROPSENSE_SCORE_WORKERS", min(4, os.cpu_count() or 1)))
+PREDICTION_COL = "predicted_yield"
+ROW_COL = "source_row"
+# written next to the parts; the leading underscore keeps parquet readers from picking them up
+MANIFEST_NAME = "_manifest.json"
+DONE_DIR = "_done"
+
+_bundle = None  # loaded once per worker process
+
+
+def _init_worker(path: str, threads: int):
+    global _bundle
+    # the workers share the cores (set before the model's native libraries load)
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    _bundle = load_bundle(Path(path))
+    model = _bundle["model"]
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=threads)
+
+
+def read_chunks(path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Stream a CSV or Parquet file as DataFrames of up to chunk_rows rows"""
+    if path.suffix == ".parquet":
+        f = pq.ParquetFile(path)
+        try:
+            for batch in f.iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+        finally:
+            f.close()
+        return
+    with pd.read_csv(path, chunksize=chunk_rows, low_memory=False) as reader:
+        for chunk in reader:
+            # CSV types are inferred per chunk (an int column with a gap becomes
+            # float, ...); give every part the same schema: numbers as float64, the rest as text
+            for c in chunk.columns:
+                if is_numeric_dtype(chunk[c]) and chunk[c].dtype != bool:
+                    chunk[c] = chunk[c].astype("float64")
+                else:
+                    chunk[c] = chunk[c].astype("string")
+            yield chunk
+
+
+def _partition_dir(column: str, value) -> str:
+    if pd.isna(value):
+        value = "__HIVE_DEFAULT_PARTITION__"
+    return f"{column}={str(value).replace('/', '_')}"
+
+
+def write_part(df: pd.DataFrame, path: Path):
+    # write then rename: a crash never leaves a truncated part behind
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _score_chunk(i: int, df: pd.DataFrame, offset: int, out_dir: str, partition_by: str | None) -> int:
+    """Predict one chunk and write its part(s) (runs in a worker process)"""
+    df.columns = [str(c).strip() for c in df.columns]
+    df[PREDICTION_COL] = predict(_bundle, df)
+    df.insert(0, ROW_COL, pd.RangeIndex(offset, offset + len(df)))
+    name = f"part-{i:06d}.parquet"
+    if partition_by:
+        # hive layout (Crop=Wheat/part-000000.parquet), readable as one dataset
+        for value, part in df.groupby(partition_by, dropna=False, sort=False):
+            write_part(part.drop(columns=[partition_by]), Path(out_dir) / _partition_dir(partition_by, value) / name)
+    else:
+        write_part(df, Path(out_dir) / name)
+    return len(df)
+
+
+def _read_manifest(out_dir: Path) -> dict | None:
+    try:
+        return json.loads((out_dir / MANIFEST_NAME).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(out_dir: Path, manifest: dict):
+    tmp = out_dir / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1))
+    os.replace(tmp, out_dir / MANIFEST_NAME)
+
+
+def score_file(input_path: str, out_dir: str, dataset: str | None = None, model: str | None = None,
+               workers: int | None = None, chunk_rows: int | None = None,
+               partition_by: str | None = None, restart: bool = False, progress: bool = True) -> dict:
+    """Score every row of ``input_path`` into partitioned Parquet under ``out_dir``.
+
+    An output directory left by an interrupted run of the same input, model and
+    settings is resumed; anything else there is an error unless ``restart``.
+    """
+    src = Path(input_path)
+    if not src.exists():
+        raise FileNotFoundError(f"Input not found: {src}")
+    if src.suffix not in (".csv", ".parquet"):
+        raise ValueError(f"Unsupported input format {src.suffix!r} (expected .csv or .parquet)")
+    model_file = Path(model) if model else model_path(dataset)
+    if not model_file.exists():
+        raise FileNotFoundError(f"No trained model at {model_file}")
+    workers = max(1, workers or WORKERS)
+    out = Path(out_dir)
+
+    settings = {"input": str(src), "input_sha256": sha256_file(src), "model": str(model_file),
+                "model_sha256": sha256_file(model_file), "chunk_rows": chunk_rows or CHUNK_ROWS,
+                "partition_by": partition_by}
+    previous = _read_manifest(out)
+    if previous is not None and restart:
+        shutil.rmtree(out)
+        previous = None
+    if previous is not None:
+        # resume with the settings the parts were written with
+        settings["chunk_rows"] = chunk_rows or previous["chunk_rows"]
+        changed = [k for k in settings if settings[k] != previous.get(k)]
+        if changed:
+            raise ValueError(f"{out} holds scores from a different run (changed: {', '.join(changed)}); "
+                             "use --restart or another output directory")
+        if previous.get("complete"):
+            return previous["metrics"] | {"output": str(out), "resumed": True}
+    elif out.exists() and any(out.iterdir()):
+        raise ValueError(f"{out} is not empty and is not a batch score output")
+    (out / DONE_DIR).mkdir(parents=True, exist_ok=True)
+    _write_manifest(out, settings | {"complete": False})
+
+    done = {int(p.name) for p in (out / DONE_DIR).iterdir()}
+    started = time.perf_counter()
+    scored = skipped = chunks = 0
+
+    def finish(fut):
+        nonlocal scored
+        rows = fut.result()
+        (out / DONE_DIR / str(pending.pop(fut))).touch()
+        scored += rows
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"\r{scored + skipped:,} rows ({scored / elapsed:,.0f} rows/s)", end="", file=sys.stderr)
+
+    # spawn: workers start clean and load the model themselves
+    ctx = multiprocessing.get_context("spawn")
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(str(model_file), threads)) as pool:
+        offset = 0
+        for i, chunk in enumerate(read_chunks(src, settings["chunk_rows"])):
+            chunks += 1
+            if i == 0 and partition_by and partition_by not in [str(c).strip() for c in chunk.columns]:
+                raise ValueError(f"Partition column {partition_by!r} not in the input")
+            if i in done:
+                skipped += len(chunk)
+            else:
+                # a couple of chunks queued per worker keeps them busy without reading the whole input
+                while len(pending) >= 2 * workers:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        finish(fut)
+                pending[pool.submit(_score_chunk, i, chunk, offset, str(out), partition_by)] = i
+            offset += len(chunk)
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                finish(fut)
+    if progress:
+        print(file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    metrics = {"rows": scored + skipped, "rows_scored": scored, "rows_resumed": skipped, "chunks": chunks,
+               "workers": workers, "seconds": round(elapsed, 3),
+               "rows_per_sec": round(scored / elapsed, 1) if elapsed else None}
+    _write_manifest(out, settings | {"complete": True, "metrics": metrics})
+    return metrics | {"output": str(out), "resumed": bool(skipped)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Score a CSV/Parquet file with the trained model into partitioned Parquet")
+    ap.add_argument("input")
+    ap.add_argument("output", help="output directory; rerun the same command to resume")
+    ap.add_argument("--dataset", default=None, help="use this dataset's model")
+    ap.add_argument("--model", default=None, help="path to a model.joblib (overrides --dataset)")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--chunk-rows", type=int, default=None)
+    ap.add_argument("--partition-by", default=None, help="input column to partition the output by, e.g. Crop")
+    ap.add_argument("--restart", action="store_true", help="discard a previous partial output")
+    args = ap.parse_args()
+    res = score_file(args.input, args.output, args.dataset, args.model, args.workers, args.chunk_rows,
+                     args.partition_by, args.restart)
+    print(json.dumps(res, indent=1))
@@ -0,0 +1,207 @@
+# predictor/batch_worker.py
+# Runs the batch predict (+ explain) jobs queued by POST /batch/jobs:
+#   python -m predictor.batch_worker                                   (one process)
+#   python -m orchestrator.supervisor --worker predictor.batch_worker --queue batch_jobs
+# A job is first staged: the upload is rewritten as Parquet with one row group
+# per chunk and the current model is copied next to it, so every chunk is scored
+# by the same model even if a retrain lands mid-job. Chunks are then scored into
+# results/part-NNNNNN.parquet and recorded as done one by one. A message works on
+# its job for at most SLICE_SECONDS and then requeues it (with the next slice
+# number), so long jobs take turns with the others and no delivery stays unacked
+# for long. The slice is only stored once its message is picked up, so a
+# redelivered message (connection lost before the handoff went out) still owns
+# its slice, while older slices and duplicates are dropped. A worker that dies
+# mid-job gets the message redelivered and skips the chunks already done.
+# Between chunks the worker waits while the API serves interactive requests
+# (common/scheduler.py), so batch scoring doesn't take their CPU.
+import fcntl
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common import events
+from common.scheduler import yield_to_interactive
+from . import batch_jobs
+from .batch_score import PREDICTION_COL, ROW_COL, read_chunks, write_part
+from .bundle import contributions, load_bundle, transform
+from .train import model_path
+
+logger = logging.getLogger("predictor.batch_worker")
+
+CHUNK_ROWS = int(os.environ.get("CROPSENSE_BATCH_CHUNK_ROWS", "20000"))
+SLICE_SECONDS = float(os.environ.get("CROPSENSE_BATCH_SLICE_SECONDS", "60"))
+STAGED_NAME = "input.parquet"
+MODEL_NAME = "model.joblib"
+
+_bundle = (None, None)  # (job_id, bundle) of the last job worked on
+
+
+@contextmanager
+def _job_lock(job_id: str):
+    """Yields False when another worker is already on this job"""
+    path = batch_jobs.job_dir(job_id) / ".lock"
+    with open(path, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def _stage(job) -> None:
+    job_id = job["id"]
+    out = batch_jobs.job_dir(job_id)
+    src = Path(job["input_path"])
+    staged = out / STAGED_NAME
+    tmp = out / f".{STAGED_NAME}.tmp"
+    writer = None
+    rows = 0
+    try:
+        for chunk in read_chunks(src, CHUNK_ROWS):
+            chunk.columns = [str(c).strip() for c in chunk.columns]
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp, table.schema)
+            writer.write_table(table.cast(writer.schema), row_group_size=CHUNK_ROWS)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if not rows:
+        raise ValueError("The uploaded file has no rows")
+    os.replace(tmp, staged)
+    model_file = model_path(job["dataset"])
+    if not model_file.exists():
+        raise FileNotFoundError("No trained model")
+    shutil.copyfile(model_file, out / MODEL_NAME)
+    bundle = load_bundle(out / MODEL_NAME)
+    batch_jobs.set_plan(job_id, rows, pq.ParquetFile(staged).num_row_groups, bundle["run_id"])
+    src.unlink(missing_ok=True)  # the staged copy has everything now
+
+
+def _job_bundle(job_id: str) -> dict:
+    global _bundle
+    if _bundle[0] != job_id:
+        _bundle = (job_id, load_bundle(batch_jobs.job_dir(job_id) / MODEL_NAME))
+    return _bundle[1]
+
+
+def score_chunk(bundle: dict, df: pd.DataFrame, offset: int, explain: bool) -> pd.DataFrame:
+    """Input rows + source_row, predicted_yield and, with explain, one shap_<feature>
+    column per model feature and the top_feature that moved the prediction most"""
+    X = transform(bundle, df)
+    out = df.copy()
+    out.insert(0, ROW_COL, np.arange(offset, offset + len(df)))
+    out[PREDICTION_COL] = bundle["model"].predict(X)
+    if explain:
+        names = list(bundle["feature_columns"])
+        contrib = contributions(bundle, X)
+        for j, c in enumerate(names):
+            out[f"shap_{c}"] = contrib[:, j]
+        out["top_feature"] = np.asarray(names)[np.abs(contrib).argmax(axis=1)]
+    return out
+
+
+def _work(job) -> bool:
+    """Score chunks until the job is done (True) or the slice is used up (False)"""
+    job_id = job["id"]
+    deadline = time.monotonic() + SLICE_SECONDS
+    if job["chunks_total"] is None:
+        if not batch_jobs.set_state(job_id, "staging"):
+            return True
+        _stage(job)
+    if not batch_jobs.set_state(job_id, "running"):
+        return True  # cancelled meanwhile
+    bundle = _job_bundle(job_id)
+    staged = pq.ParquetFile(batch_jobs.job_dir(job_id) / STAGED_NAME)
+    sizes = [staged.metadata.row_group(i).num_rows for i in range(staged.num_row_groups)]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    done = batch_jobs.done_chunks(job_id)
+    scored = 0
+    for i in range(staged.num_row_groups):
+        if i in done:
+            continue
+        # at least one chunk per slice, even when staging used up its time
+        if scored and time.monotonic() > deadline:
+            return False
+        if batch_jobs.get_raw(job_id)["state"] == "cancelled":
+            logger.info("Batch job %s cancelled", job_id)
+            return True
+        paused = yield_to_interactive()
+        if paused:
+            logger.info("Batch job %s paused %.1fs for interactive requests", job_id, paused)
+        started = time.perf_counter()
+        df = staged.read_row_group(i).to_pandas()
+        out = score_chunk(bundle, df, int(offsets[i]), bool(job["explain"]))
+        write_part(out, batch_jobs.results_dir(job_id) / f"part-{i:06d}.parquet")
+        batch_jobs.chunk_done(job_id, i, len(df), round(time.perf_counter() - started, 3))
+        scored += 1
+    batch_jobs.set_state(job_id, "succeeded")
+    logger.info("Batch job %s done (%d rows)", job_id, sum(sizes))
+    return True
+
+
+def _current(job_id: str, event: dict):
+    job = batch_jobs.get_raw(job_id)
+    if job is None or job["state"] in batch_jobs.FINAL_STATES:
+        return None
+    if event.get("slice", 0) < job["slice"]:
+        return None  # superseded by the message a later slice queued
+    return job
+
+
+def handle_batch_job(event: dict, redelivered: bool = False):
+    job_id = event.get("job_id")
+    if not job_id or _current(job_id, event) is None:
+        return []
+    with _job_lock(job_id) as locked:
+        if not locked:
+            return []  # a duplicate; the worker holding the job hands it on itself
+        # read again under the lock: another worker may have just finished a slice
+        job = _current(job_id, event)
+        if job is None or not batch_jobs.claim_slice(job_id, event.get("slice", 0), event.get("event_id")):
+            return []
+        try:
+            finished = _work(job)
+        except Exception as e:
+            # bad input or no model: retrying won't help, the job records why
+            logger.exception("Batch job %s failed", job_id)
+            batch_jobs.set_state(job_id, "failed", error=str(e))
+            return []
+    if finished:
+        return []
+    # the next message claims its slice when picked up: if this one is redelivered
+    # instead (the handoff was lost with the connection), it still owns the job
+    return [(events.BATCH_JOBS, {"job_id": job_id, "slice": event.get("slice", 0) + 1})]
+
+
+def catch_up():
+    """Requeue jobs whose message was lost (broker restarted without it, publish failed)"""
+    removed = batch_jobs.prune()
+    if removed:
+        logger.info("Removed %d expired batch jobs", removed)
+    for job in batch_jobs.unfinished():
+        # a newer slice: a message for the job that is still queued becomes stale
+        events.publish(events.BATCH_JOBS, {"job_id": job["id"], "slice": job["slice"] + 1}, job["priority"])
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    try:
+        catch_up()
+    except Exception:
+        logger.exception("Batch job catch-up failed")
+    events.consume(events.BATCH_JOBS, handle_batch_job)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# predictor/bundle.py
+# The trained model bundle (model + the preprocessing artifacts of the run it
+# was trained on) and the input transform, shared by the API (serve.py) and
+# the offline batch scorer (batch_score.py) so both score rows the same way.
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from common.binned import apply_bins
+
+COMMON_MODELS = Path("common/models")
+TARGET_COLS = ["Yield_tons_per_hectare", "yield"]
+
+
+def _fallback(name: str):
+    path = COMMON_MODELS / f"{name}.joblib"
+    return joblib.load(path) if path.exists() else None
+
+
+def load_bundle(path: Path) -> dict:
+    """Load a model.joblib; preprocessing artifacts missing from it come from common/models"""
+    artifact = joblib.load(path)
+    pre = artifact.get("preprocessor", {})
+    return {
+        "model": artifact["model"],
+        "feature_columns": artifact.get("feature_columns"),
+        "encoders": pre.get("encoders") or _fallback("encoders") or {},
+        "imputer": pre.get("imputer") or _fallback("imputer"),
+        "scaler": pre.get("scaler") or _fallback("scaler"),
+        "num_cols": pre.get("num_cols") or _fallback("num_cols") or [],
+        "binning": artifact.get("binning"),
+        "run_id": artifact.get("run_id"),
+    }
+
+
+def apply_preprocessor(row: pd.DataFrame, encoders, imputer, scaler, num_cols, feature_columns):
+    # map encoders
+    if encoders:
+        for c, mapping in encoders.items():
+            if c in row.columns:
+                # convert to str and map unknown -> -1
+                row[c] = row[c].astype(str).map(mapping).fillna(-1).astype(float)
+    # booleans -> numeric
+    for col in ["Fertilizer_Used", "Irrigation_Used"]:
+        if col in row.columns:
+            row[col] = row[col].map({True:1, False:0, "True":1, "False":0}).fillna(0).astype(float)
+
+    # Remove target column if present (should not be in feature_columns but just in case)
+    for target in TARGET_COLS:
+        if target in row.columns:
+            row = row.drop(columns=[target])
+
+    # ensure all model feature columns present
+    for c in feature_columns:
+        if c not in row.columns:
+            row[c] = 0.0
+    row = row[feature_columns].astype(float)
+
+    # impute + scale only numeric columns if artifacts present
+    if imputer is not None and num_cols:
+        # Filter num_cols to only include columns that exist in the row
+        available_num_cols = [c for c in num_cols if c in row.columns]
+        if available_num_cols:
+            row[available_num_cols] = imputer.transform(row[available_num_cols])
+    if scaler is not None and num_cols:
+        # Filter num_cols to only include columns that exist in the row
+        available_num_cols = [c for c in num_cols if c in row.columns]
+        if available_num_cols:
+            # the scaler is fitted on the imputer's output array (no column names)
+            row[available_num_cols] = scaler.transform(row[available_num_cols].to_numpy())
+    return row
+
+
+def transform(bundle: dict, df: pd.DataFrame):
+    """Raw input rows -> the model's feature matrix"""
+    X = apply_preprocessor(df.copy(), bundle["encoders"], bundle["imputer"], bundle["scaler"],
+                           bundle["num_cols"], bundle["feature_columns"])
+    if bundle["binning"]:
+        X = apply_bins(X, bundle["binning"])
+    return X
+
+
+def predict(bundle: dict, df: pd.DataFrame) -> np.ndarray:
+    return bundle["model"].predict(transform(bundle, df))
+
+
+def contributions(bundle: dict, X) -> np.ndarray:
+    """Per-row SHAP values (rows x features) for the model's predictions on X"""
+    model = bundle["model"]
+    if hasattr(model, "booster_"):
+        # LightGBM computes exact TreeSHAP itself; the last column is the expected value
+        return model.predict(X, pred_contrib=True)[:, :-1]
+    try:
+        import shap
+    except ImportError:
+        raise ValueError(f"Explaining a {type(model).__name__} model needs the shap package")
+    values = shap.TreeExplainer(model).shap_values(X)
+    return np.asarray(values[0] if isinstance(values, list) else values)
@@ -1,35 +1,36 @@
 # predictor/serve.py
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, File, Header, HTTPException, Depends, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-import joblib, pandas as pd, numpy as np
+import pandas as pd, shutil, uuid
 from common.auth import get_current_user_optional
 from pathlib import Path
-from .train import train_and_save
+from common import events
+from common.scheduler import BULK, INTERACTIVE, Scheduler, work_class
+from . import batch_jobs
+from .batch_score import PREDICTION_COL
+from .bundle import load_bundle, predict
+from .train import model_path, train_and_save, trained_run_id
 
 app = FastAPI(title="PredictorAgent", version="0.2")
 MODEL_PATH = Path("predictor/models/model.joblib")
-COMMON_MODELS = Path("common/models")
-
-# Lazy loaders
-_model_artifact = None
-_encoders = None
-_imputer = None
-_scaler = None
-_feature_columns = None
-_num_cols = None
-
-def _load_artifact():
-    global _model_artifact, _encoders, _imputer, _scaler, _feature_columns, _num_cols
-    if _model_artifact is None and MODEL_PATH.exists():
-        _model_artifact = joblib.load(MODEL_PATH)
-        _feature_columns = _model_artifact.get("feature_columns")
-        # artifact may contain preprocessor or we fallback to common/models
-        pre = _model_artifact.get("preprocessor", {})
-        _encoders = pre.get("encoders") or (joblib.load(COMMON_MODELS / "encoders.joblib") if (COMMON_MODELS / "encoders.joblib").exists() else {})
-        _imputer = pre.get("imputer") or (joblib.load(COMMON_MODELS / "imputer.joblib") if (COMMON_MODELS / "imputer.joblib").exists() else None)
-        _scaler = pre.get("scaler") or (joblib.load(COMMON_MODELS / "scaler.joblib") if (COMMON_MODELS / "scaler.joblib").exists() else None)
-        _num_cols = pre.get("num_cols") or (joblib.load(COMMON_MODELS / "num_cols.joblib") if (COMMON_MODELS / "num_cols.joblib").exists() else None)
-    return _model_artifact, _encoders, _imputer, _scaler, _feature_columns, _num_cols
+# interactive (predict) and bulk (train, batch uploads) work run on separate pools
+scheduler = Scheduler()
+
+# Lazy loader
+_bundle = None
+_model_mtime = None
+
+def _load_bundle():
+    global _bundle, _model_mtime
+    # the training worker replaces the file in place; pick up a new model on the next request
+    mtime = MODEL_PATH.stat().st_mtime_ns if MODEL_PATH.exists() else None
+    if mtime != _model_mtime:
+        _bundle = None
+    if _bundle is None and MODEL_PATH.exists():
+        _model_mtime = mtime
+        _bundle = load_bundle(MODEL_PATH)
+    return _bundle
 
 class PredictSingle(BaseModel):
     Region: str | None = None
@@ -47,71 +48,149 @@ def health():
     model_loaded = MODEL_PATH.exists()
     return {"status": "ok", "service": "predictor", "model_loaded": model_loaded}
 
-def _apply_preprocessor(row: pd.DataFrame, encoders, imputer, scaler, num_cols, feature_columns):
-    # map encoders
-    if encoders:
-        for c, mapping in encoders.items():
-            if c in row.columns:
-                # convert to str and map unknown -> -1
-                row[c] = row[c].astype(str).map(mapping).fillna(-1).astype(float)
-    # booleans -> numeric
-    for col in ["Fertilizer_Used", "Irrigation_Used"]:
-        if col in row.columns:
-            row[col] = row[col].map({True:1, False:0, "True":1, "False":0}).fillna(0).astype(float)
-    
-    # Remove target column if present (should not be in feature_columns but just in case)
-    target_cols = ["Yield_tons_per_hectare", "yield"]
-    for target in target_cols:
-        if target in row.columns:
-            row = row.drop(columns=[target])
-    
-    # ensure all model feature columns present
-    for c in feature_columns:
-        if c not in row.columns:
-            row[c] = 0.0
-    row = row[feature_columns].astype(float)
-
-    # impute + scale only numeric columns if artifacts present
-    if imputer is not None and num_cols:
-        # Filter num_cols to only include columns that exist in the row
-        available_num_cols = [c for c in num_cols if c in row.columns]
-        if available_num_cols:
-            row[available_num_cols] = imputer.transform(row[available_num_cols])
-    if scaler is not None and num_cols:
-        # Filter num_cols to only include columns that exist in the row
-        available_num_cols = [c for c in num_cols if c in row.columns]
-        if available_num_cols:
-            row[available_num_cols] = scaler.transform(row[available_num_cols])
-    return row
+def _work_class(value: str | None, default: str = INTERACTIVE) -> str:
+    try:
+        return work_class(value, default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/scheduler")
+def scheduler_stats():
+    """Queue depth, concurrency and latency percentiles per work class"""
+    return scheduler.stats()
 
 @app.post("/predict")
-def predict_one(payload: PredictSingle, user: str | None = Depends(get_current_user_optional)):
-    global _model_artifact
-    artifact, encoders, imputer, scaler, feature_columns, num_cols = _load_artifact()
-    if artifact is None:
+async def predict_one(payload: PredictSingle, user: str | None = Depends(get_current_user_optional),
+                      x_work_class: str | None = Header(None)):
+    # interactive unless the caller marks itself as bulk
+    return await scheduler.run(_work_class(x_work_class), _predict, payload)
+
+def _predict(payload: PredictSingle):
+    bundle = _load_bundle()
+    if bundle is None:
         raise HTTPException(500, "Model not trained")
-    model = artifact["model"]
     # convert to dataframe (single-row)
     row = pd.DataFrame([payload.dict()])
-    # Apply preprocessor (safe)
-    row = _apply_preprocessor(row, encoders or {}, imputer, scaler, num_cols or [], feature_columns)
-    preds = model.predict(row)
+    preds = predict(bundle, row)
     return {"predicted_yield": float(preds[0])}
 
+@app.get("/model")
+def model_info(dataset: str | None = None):
+    try:
+        path = model_path(dataset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="No trained model")
+    return {"dataset": dataset, "path": str(path), "run_id": trained_run_id(dataset),
+            "size": path.stat().st_size, "modified": path.stat().st_mtime}
+
 @app.post("/train")
-def train(user: str | None = Depends(get_current_user_optional)):
+async def train(dataset: str | None = None, binned: bool | None = None,
+          user: str | None = Depends(get_current_user_optional),
+          x_pipeline_run: str | None = Header(None)):
     try:
-        metrics = train_and_save()
+        # bulk work; pauses between boosting rounds while predictions are waiting
+        metrics = await scheduler.run(BULK, train_and_save, dataset=dataset, binned=binned,
+                                      pipeline_run=x_pipeline_run,
+                                      trigger="orchestrator" if x_pipeline_run else "api",
+                                      checkpoint=scheduler.checkpoint)
         # clear lazy cache so subsequent predictions load fresh artifact
-        global _model_artifact, _encoders, _imputer, _scaler, _feature_columns, _num_cols
-        _model_artifact = None
-        _encoders = None
-        _imputer = None
-        _scaler = None
-        _feature_columns = None
-        _num_cols = None
+        global _bundle
+        _bundle = None
         return {"status": "ok", **metrics}
+    except HTTPException:
+        raise  # shed by the scheduler (503)
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/train/request", status_code=202)
+def request_training(dataset: str | None = None, priority: str = "interactive",
+                     user: str | None = Depends(get_current_user_optional)):
+    """Queue a retrain for the training workers; interactive requests run ahead of bulk backfills"""
+    try:
+        model_path(dataset)  # validates the name
+        events.priority_value(priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not events.publish(events.FEATURES_READY, {"dataset": dataset, "force": True, "requested_by": user}, priority):
+        raise HTTPException(status_code=503, detail="Event broker unavailable")
+    return {"status": "queued", "dataset": dataset, "priority": priority}
+
+# storing an upload and building a result file are I/O, done in the request's own
+# thread: on the BULK pool they would wait behind a retrain and skew its run times
+@app.post("/batch/jobs", status_code=202)
+def submit_batch_job(file: UploadFile = File(...), explain: bool = False, dataset: str | None = None,
+                     priority: str = "bulk", user: str | None = Depends(get_current_user_optional)):
+    """Queue a CSV/Parquet file for batch prediction (and SHAP explanations with explain=true)"""
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in batch_jobs.FORMATS:
+        raise HTTPException(status_code=400, detail="Only CSV or Parquet files allowed")
+    try:
+        path = model_path(dataset)
+        events.priority_value(priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="No trained model")
+    job_id = uuid.uuid4().hex[:12]
+    job_dir = batch_jobs.job_dir(job_id)
+    job_dir.mkdir(parents=True)
+    upload = job_dir / f"upload{suffix}"
+    with open(upload, "wb") as f:
+        shutil.copyfileobj(file.file, f, 1024 * 1024)
+    job = batch_jobs.create_job(job_id, file.filename, upload, explain, dataset, priority, user)
+    if not events.publish(events.BATCH_JOBS, {"job_id": job_id, "slice": 0}, priority):
+        batch_jobs.set_state(job_id, "failed", error="Event broker unavailable")
+        shutil.rmtree(job_dir, ignore_errors=True)
+        raise HTTPException(status_code=503, detail="Event broker unavailable")
+    return job
+
+@app.get("/batch/jobs")
+def list_batch_jobs(limit: int = 20, user: str | None = Depends(get_current_user_optional)):
+    return {"jobs": batch_jobs.list_jobs(limit, user)}
+
+@app.get("/batch/jobs/{job_id}")
+def batch_job_status(job_id: str):
+    job = batch_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/batch/jobs/{job_id}")
+def cancel_batch_job(job_id: str):
+    job = batch_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/batch/jobs/{job_id}/summary")
+def batch_job_summary(job_id: str, rows: int = 200):
+    """Prediction count, mean, max and the first rows of a finished job, without downloading it"""
+    job = batch_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["state"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['state']}")
+    return batch_jobs.result_summary(job_id, PREDICTION_COL, max(0, min(rows, 1000)))
+
+@app.get("/batch/jobs/{job_id}/result")
+def batch_job_result(job_id: str, format: str = "parquet"):
+    job = batch_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["state"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['state']}")
+    name = Path(job["filename"] or job_id).stem + "_predictions"
+    if format == "csv":
+        return StreamingResponse(batch_jobs.iter_result_csv(job_id), media_type="text/csv",
+                                 headers={"Content-Disposition": f'attachment; filename="{name}.csv"'})
+    if format != "parquet":
+        raise HTTPException(status_code=400, detail="format must be parquet or csv")
+    path = batch_jobs.result_parquet(job_id)
+    return FileResponse(path, media_type="application/octet-stream",
+                        filename=f"{name}.parquet")
@@ -1,53 +1,110 @@
 # predictor/train.py
-import os, joblib, math
+import os, joblib, math, uuid
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from typing import Callable
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from common import history
+from common.binned import binned_exists, load_binned
+from common.dataset import current_run_dir, features_exist, load_artifacts, processed_root, read_features
+from common.memory import RssSampler
 
-PROCESSED = Path("data/processed/features.parquet")
 MODEL_DIR = Path("predictor/models")
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 MODEL_PATH = MODEL_DIR / "model.joblib"
+# train on the run's memory-mapped bin-code matrix instead of the parquet features
+TRAIN_BINNED = os.environ.get("CROPSENSE_TRAIN_BINNED", "0") == "1"
+# threads per fit; a worker pool gives each process its share of the cores
+TRAIN_THREADS = int(os.environ.get("CROPSENSE_TRAIN_THREADS", "-1"))
 
-COMMON_MODELS = Path("common/models")
-COMMON_MODELS.mkdir(parents=True, exist_ok=True)
+def model_path(dataset: str | None = None) -> Path:
+    if not dataset:
+        return MODEL_PATH
+    processed_root(dataset)  # validates the name
+    return MODEL_DIR / "datasets" / dataset / "model.joblib"
 
-def train_and_save(use_lightgbm=True):
-    if not PROCESSED.exists():
+def trained_run_id(dataset: str | None = None) -> str | None:
+    """run_id of the features the saved model was trained on, without loading the model"""
+    marker = model_path(dataset).with_suffix(".run_id")
+    if not marker.exists():
+        return None
+    return marker.read_text().strip() or None
+
+def _split_binned(run_dir: Path):
+    X, y, binning = load_binned(run_dir)
+    if y is None:
+        raise ValueError("Target column not found in the binned matrix.")
+    idx_train, idx_valid = train_test_split(np.arange(len(y)), test_size=0.2, random_state=42)
+    # sorted indices read the memmap front to back
+    idx_train.sort()
+    idx_valid.sort()
+    return X[idx_train], X[idx_valid], y[idx_train], y[idx_valid], binning
+
+def train_and_save(use_lightgbm=True, dataset: str | None = None, binned: bool | None = None,
+                   pipeline_run: str | None = None, trigger: str | None = None,
+                   checkpoint: Callable[[], None] | None = None):
+    # recorded in the pipeline history (rows trained on, peak memory, metrics);
+    # checkpoint() is called between boosting rounds and may block to yield the CPU
+    with history.track("train", pipeline_run, trigger) as rec, RssSampler() as rss:
+        res = _train_and_save(use_lightgbm, dataset, binned, checkpoint)
+        rec.update(rows=res["rows"], peak_rss_mb=rss.peak_mb,
+                   output={k: res[k] for k in ("run_id", "mae", "rmse", "r2", "binned")} | {"dataset": dataset})
+    return res
+
+def _train_and_save(use_lightgbm=True, dataset: str | None = None, binned: bool | None = None,
+                    checkpoint: Callable[[], None] | None = None):
+    if not features_exist(dataset):
         raise FileNotFoundError("Processed data not found, run preprocessor first.")
-    df = pd.read_parquet(PROCESSED)
+    # pin the published run once so features and artifacts match even if a
+    # newer run is published while we train (None -> legacy layout)
+    run_dir = current_run_dir(dataset)
+    binned = TRAIN_BINNED if binned is None else binned
+    if binned and not binned_exists(run_dir):
+        print("No binned matrix for this run — training on the parquet features")
+        binned = False
 
-    # target detection
-    if "Yield_tons_per_hectare" in df.columns:
-        target = "Yield_tons_per_hectare"
-    elif "yield" in df.columns:
-        target = "yield"
+    binning = None
+    if binned:
+        X_train, X_valid, y_train, y_valid, binning = _split_binned(run_dir)
+        feature_columns = binning["columns"]
     else:
-        raise ValueError("Target column not found. Expected 'Yield_tons_per_hectare' or 'yield'.")
+        # partition key columns are not features and are left out by read_features
+        df = read_features(dataset=dataset, run_dir=run_dir)
 
-    X = df.drop(columns=[target])
-    y = df[target]
+        # target detection
+        if "Yield_tons_per_hectare" in df.columns:
+            target = "Yield_tons_per_hectare"
+        elif "yield" in df.columns:
+            target = "yield"
+        else:
+            raise ValueError("Target column not found. Expected 'Yield_tons_per_hectare' or 'yield'.")
+
+        X = df.drop(columns=[target])
+        y = df[target]
+        feature_columns = X.columns.tolist()
 
-    X_train, X_valid, y_train, y_valid = train_test_split(X, y, test_size=0.2, random_state=42)
+        X_train, X_valid, y_train, y_valid = train_test_split(X, y, test_size=0.2, random_state=42)
 
     model = None
     try:
         if use_lightgbm:
             import lightgbm as lgb
-            model = lgb.LGBMRegressor(n_estimators=1000, learning_rate=0.05, n_jobs=-1, verbose=-1)
+            model = lgb.LGBMRegressor(n_estimators=1000, learning_rate=0.05, n_jobs=TRAIN_THREADS, verbose=-1)
             # ✅ new LightGBM syntax for early stopping
             model.fit(
                 X_train, y_train,
                 eval_set=[(X_valid, y_valid)],
                 callbacks=[lgb.early_stopping(stopping_rounds=50)]
+                + ([lambda env: checkpoint()] if checkpoint else [])
             )
         else:
             raise ImportError("lightgbm disabled")
     except Exception as e:
         print("LightGBM not available or failed — falling back to RandomForest:", e)
-        model = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=-1)
+        model = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=TRAIN_THREADS)
         model.fit(X_train, y_train)
 
     preds = model.predict(X_valid)
@@ -55,28 +112,26 @@ def train_and_save(use_lightgbm=True):
     rmse = math.sqrt(mean_squared_error(y_valid, preds))
     r2 = r2_score(y_valid, preds)
 
-    # Load preprocessor artifacts (encoders etc.)
-    imputer = scaler = encoders = num_cols = None
-    for name in ["imputer", "scaler", "encoders", "num_cols"]:
-        try:
-            locals()[name] = joblib.load(COMMON_MODELS / f"{name}.joblib")
-        except Exception:
-            locals()[name] = None
-
+    # Load preprocessor artifacts (encoders etc.) of the run we trained on
     artifact = {
         "model": model,
-        "feature_columns": X.columns.tolist(),
-        "preprocessor": {
-            "imputer": imputer,
-            "scaler": scaler,
-            "encoders": encoders,
-            "num_cols": num_cols,
-        }
+        "feature_columns": feature_columns,
+        "preprocessor": load_artifacts(run_dir),
+        # set when the model was trained on bin codes; inputs must go through apply_bins
+        "binning": binning,
+        "run_id": run_dir.name if run_dir is not None else None,
     }
-    joblib.dump(artifact, MODEL_PATH)
-    print(f"✅ Model saved to {MODEL_PATH}")
+    out = model_path(dataset)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    # write then rename so the predictor never loads a half-written model
+    tmp = out.with_name(f".{out.name}.{uuid.uuid4().hex}")
+    joblib.dump(artifact, tmp)
+    os.replace(tmp, out)
+    out.with_suffix(".run_id").write_text(artifact["run_id"] or "")
+    print(f"✅ Model saved to {out}")
     print(f"MAE: {mae:.4f}, RMSE: {rmse:.4f}, R2: {r2:.4f}")
-    return {"mae": mae, "rmse": rmse, "r2": r2}
+    return {"mae": mae, "rmse": rmse, "r2": r2, "run_id": artifact["run_id"], "binned": binned,
+            "rows": len(y_train) + len(y_valid)}
 
 if __name__ == "__main__":
-    train_and_save()
+    train_and_save(trigger="cli")
@@ -1,8 +1,10 @@
 # preprocessor/app.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from pydantic import BaseModel
 import os
+from common.stats import dataset_summary
 from .preprocess import run_preprocessing
+from .jobs import jobs
 
 app = FastAPI(title="PreprocessorAgent", version="0.1")
 
@@ -14,14 +16,77 @@ def health():
 
 class PreprocessRequest(BaseModel):
     raw_path: str | None = None
+    # multi-file mode: explicit list and/or a glob such as "data/raw/raw_crop_2025*.csv"
+    raw_paths: list[str] | None = None
+    raw_glob: str | None = None
+    workers: int | None = None
+    # overrides CROPSENSE_PREPROCESS_MEM_MB for this run
+    mem_budget_mb: float | None = None
+    force: bool = False
+    # independent output namespace (data/processed/datasets/<name>); default pipeline if unset
+    dataset: str | None = None
+
+def _history(pipeline_run: str | None) -> dict:
+    # an orchestrated call names its pipeline run in the X-Pipeline-Run header
+    return {"pipeline_run": pipeline_run, "trigger": "orchestrator" if pipeline_run else "api"}
 
 @app.post("/preprocess")
-def preprocess(req: PreprocessRequest):
+def preprocess(req: PreprocessRequest, x_pipeline_run: str | None = Header(None)):
     raw = req.raw_path or None
     try:
-        out = run_preprocessing(raw_path=raw)
+        res = run_preprocessing(raw_path=raw, force=req.force, raw_paths=req.raw_paths,
+                                raw_glob=req.raw_glob, workers=req.workers,
+                                mem_budget_mb=req.mem_budget_mb, dataset=req.dataset,
+                                **_history(x_pipeline_run))
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return {"status": "ok", "features_path": out}
+    return {"status": "ok", **res}
+
+
+@app.get("/summary")
+def summary(dataset: str | None = None, crop: str | None = None, region: str | None = None,
+            columns: str | None = None):
+    """Dataset size, ranges, nulls, category frequencies and histograms (no data scan)"""
+    try:
+        res = dataset_summary(dataset, crop=crop, region=region,
+                              columns=columns.split(",") if columns else None)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "ok", **res}
+
+
+# ---------- background jobs ----------
+
+@app.post("/preprocess/jobs", status_code=202)
+def submit_preprocess_job(req: PreprocessRequest, x_pipeline_run: str | None = Header(None)):
+    try:
+        job = jobs.submit({**req.dict(), **_history(x_pipeline_run)})
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "accepted", "job_id": job.id, "status_url": f"/preprocess/jobs/{job.id}"}
+
+@app.get("/preprocess/jobs")
+def list_preprocess_jobs():
+    return {"jobs": jobs.list_jobs()}
+
+@app.get("/preprocess/jobs/{job_id}")
+def preprocess_job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/preprocess/jobs/{job_id}")
+def cancel_preprocess_job(job_id: str):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -0,0 +1,131 @@
+# preprocessor/jobs.py
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from common.dataset import processed_root
+from .preprocess import PreprocessCancelled, estimate_rows, run_preprocessing, resolve_inputs
+
+# jobs run one at a time by default; extra submissions wait as "queued"
+JOB_WORKERS = int(os.environ.get("CROPSENSE_PREPROCESS_JOB_WORKERS", "1"))
+# finished jobs kept in memory for status queries
+MAX_FINISHED = 50
+
+FINAL_STATES = ("succeeded", "failed", "cancelled")
+
+
+class PreprocessJob:
+    def __init__(self, params: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.params = params
+        self.state = "queued"
+        self.stage = None
+        self.rows_processed = 0
+        self.rows_total = None
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow().isoformat() + "Z"
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def on_progress(self, stage=None, rows=None):
+        with self._lock:
+            if stage:
+                self.stage = stage
+            if rows is not None:
+                self.rows_processed = rows
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            now = self.finished or time.time()
+            elapsed = (now - self.started) if self.started else 0.0
+            rate = self.rows_processed / elapsed if elapsed > 0 else None
+            eta = None
+            if self.state == "running" and rate and self.rows_total:
+                eta = round(max(0, self.rows_total - self.rows_processed) / rate, 1)
+            return {
+                "job_id": self.id,
+                "state": self.state,
+                "stage": self.stage,
+                "rows_processed": self.rows_processed,
+                "rows_total_estimate": self.rows_total,
+                "rows_per_sec": round(rate, 1) if rate else None,
+                "elapsed_seconds": round(elapsed, 1),
+                "eta_seconds": eta,
+                "created_at": self.created_at,
+                "params": self.params,
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    def __init__(self, workers: int = JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preprocess-job")
+        self._jobs: "OrderedDict[str, PreprocessJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, params: dict) -> PreprocessJob:
+        # fail fast on missing inputs instead of inside the background thread
+        resolve_inputs(params.get("raw_path"), params.get("raw_paths"), params.get("raw_glob"))
+        processed_root(params.get("dataset"))  # rejects bad dataset names
+        job = PreprocessJob(params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> PreprocessJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> list:
+        with self._lock:
+            recent = list(self._jobs.values())
+        return [j.to_dict() for j in reversed(recent)]
+
+    def cancel(self, job_id: str) -> PreprocessJob | None:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        with job._lock:
+            if job.state == "queued":
+                job.state = "cancelled"
+                job.finished = time.time()
+        return job
+
+    def _prune(self):
+        finished = [jid for jid, j in self._jobs.items() if j.state in FINAL_STATES]
+        for jid in finished[:max(0, len(finished) - MAX_FINISHED)]:
+            del self._jobs[jid]
+
+    def _run(self, job: PreprocessJob):
+        with job._lock:
+            if job.state == "cancelled":
+                return
+            job.state = "running"
+            job.started = time.time()
+        try:
+            raws = resolve_inputs(job.params.get("raw_path"), job.params.get("raw_paths"),
+                                  job.params.get("raw_glob"))
+            job.rows_total = sum(estimate_rows(p) for p in raws)
+            result = run_preprocessing(**job.params, progress=job.on_progress, cancel=job.cancel_event)
+            state, job.result = "succeeded", result
+        except PreprocessCancelled:
+            state = "cancelled"
+        except Exception as e:
+            state, job.error = "failed", str(e)
+        with job._lock:
+            job.state = state
+            job.finished = time.time()
+
+
+jobs = JobManager()
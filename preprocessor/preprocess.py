@@ -1,32 +1,235 @@
 # preprocessor/preprocess.py
 import pandas as pd
 import numpy as np
-import os, joblib
+import os, joblib, json, glob, hashlib, shutil, time
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, List, Tuple
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+from common.dataset import (PARTITION_COLS, current_run_dir, features_exist, new_run_dir,
+                            publish_run, write_features)
+from common import catalog, history
+from common.binned import write_binned
+from common.hashing import sha256_file
+from common.stats import compute_stats, write_stats
+from common.memory import RssSampler
+from .validation import merge_reports, null_counts, validate_chunk
 
 RAW_DIR = Path("data/raw")
-PROCESSED_DIR = Path("data/processed")
-MODEL_COMMON_DIR = Path("common/models")
-PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-MODEL_COMMON_DIR.mkdir(parents=True, exist_ok=True)
+# each run writes features/, artifacts/ (encoders, imputer, scaler, num_cols),
+# quarantine/ (rejected rows with reason codes) and manifest.json (source hash,
+# validation, metrics) into its own run dir, see common/dataset.py
+MANIFEST_NAME = "manifest.json"
 
 # candidate categorical features (tweak if you have more/less)
 CATEGORICAL_CANDIDATES = ["Region", "Soil_Type", "Crop", "Weather_Condition"]
+# rows per chunk when no memory budget is set
+CHUNKSIZE = 250_000
+# with CROPSENSE_PREPROCESS_MEM_MB set, chunks are sized from the measured row width
+MEM_BUDGET_MB = float(os.environ.get("CROPSENSE_PREPROCESS_MEM_MB", "0")) or None
+SAMPLE_ROWS = 10_000
+MIN_CHUNKSIZE = 5_000
+MAX_CHUNKSIZE = 2_000_000
+# raw chunk + cleaned copy + parquet/arrow buffers held at once
+CHUNK_MEM_OVERHEAD = 4.0
+# worker processes used when several raw files are preprocessed together
+MAX_WORKERS = int(os.environ.get("CROPSENSE_PREPROCESS_WORKERS", min(4, os.cpu_count() or 1)))
+
+class PreprocessCancelled(Exception):
+    pass
+
+class _CancelFlag:
+    """cancel.is_set() for worker processes, which can't see the job's threading.Event"""
+    def __init__(self, path: Path):
+        self.path = path
+
+    def is_set(self) -> bool:
+        return self.path.exists()
 
 def _find_latest_raw():
-    files = sorted(RAW_DIR.glob("*.csv"))
+    entry = catalog.latest()
+    if entry is not None:
+        return Path(entry["path"])
+    # nothing catalogued (files copied in by hand): fall back to the directory.
+    # raw files are CSV, or Parquet when the collector transcodes at ingest
+    files = sorted([*RAW_DIR.glob("*.csv"), *RAW_DIR.glob("*.parquet")], key=lambda p: p.name)
     if not files:
-        raise FileNotFoundError("No raw CSVs in data/raw")
+        raise FileNotFoundError("No raw files in data/raw")
     return files[-1]
 
-def _clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
+class _ParquetChunks:
+    """get_chunk(n)/close() over a parquet file, like pd.read_csv(iterator=True)"""
+    def __init__(self, path: Path):
+        self._file = pq.ParquetFile(path)
+        self._batches = self._file.iter_batches(batch_size=MIN_CHUNKSIZE)
+        self._pending: List[pa.RecordBatch] = []
+        self._offset = 0
+
+    def get_chunk(self, size: int) -> pd.DataFrame:
+        rows = sum(b.num_rows for b in self._pending)
+        for batch in self._batches:
+            self._pending.append(batch)
+            rows += batch.num_rows
+            if rows >= size:
+                break
+        if not rows:
+            raise StopIteration
+        table = pa.Table.from_batches(self._pending).slice(0, size)
+        rest = pa.Table.from_batches(self._pending).slice(size)
+        self._pending = rest.to_batches()
+        df = table.to_pandas()
+        # row numbers continue across chunks, as with the CSV reader
+        df.index = pd.RangeIndex(self._offset, self._offset + len(df))
+        self._offset += len(df)
+        return df
+
+    def close(self):
+        self._file.close()
+
+def _open_raw(raw: Path):
+    if raw.suffix == ".parquet":
+        return _ParquetChunks(raw)
+    return pd.read_csv(raw, iterator=True, low_memory=False)
+
+# tokens that mean "missing" in categorical columns
+_NULL_TOKENS = {"", "nan", "none", "null"}
+
+def _as_category(s: pd.Series) -> pd.Series:
+    """Categorical dtype with whitespace/null cleanup done once per category, not per row"""
+    s = s.astype("category")
+    cats = s.cat.categories.astype(str).str.strip()
+    uniq = pd.Index(cats[~cats.str.lower().isin(_NULL_TOKENS)].unique())
+    # old code -> new code; null tokens and the trailing slot (code -1, missing) map to -1
+    remap = np.append(uniq.get_indexer(cats), -1)
+    codes = remap[s.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=uniq), index=s.index, name=s.name)
+
+def resolve_inputs(raw_path=None, raw_paths=None, raw_glob=None) -> List[Path]:
+    files: List[Path] = []
+    if raw_path:
+        files.append(Path(raw_path))
+    for p in raw_paths or []:
+        files.append(Path(p))
+    if raw_glob:
+        matched = sorted(glob.glob(raw_glob))
+        if not matched:
+            raise FileNotFoundError(f"No raw files match {raw_glob}")
+        files.extend(Path(p) for p in matched)
+    if not files:
+        files.append(_find_latest_raw())
+    # keep order, drop repeats
+    files = list(dict.fromkeys(files))
+    for f in files:
+        if not f.exists():
+            raise FileNotFoundError(f"Raw file not found: {f}")
+    return files
+
+def _next_chunksize(bytes_per_row: float, mem_budget_mb: float | None) -> int:
+    if not mem_budget_mb:
+        return CHUNKSIZE
+    rows = int(mem_budget_mb * 1024 * 1024 / (bytes_per_row * CHUNK_MEM_OVERHEAD))
+    return max(MIN_CHUNKSIZE, min(MAX_CHUNKSIZE, rows))
+
+def _clean_file(raw: Path, work_dir: Path, mem_budget_mb: float | None = None,
+                on_chunk: Callable[[int], None] | None = None, cancel=None, index: int = 0) -> dict:
+    """Read, clean and validate one raw file into parquet parts (runs in a worker process)"""
+    parts = []
+    reports = []
+    chunk_rows = []
+    writer = None
+    # named by position in the input list: files from different directories can share a stem
+    name = f"{index:04d}_{raw.stem}"
+    quarantine_path = work_dir / "quarantine" / f"{name}.parquet"
+    rss = RssSampler().start()
+    reader = _open_raw(raw)
+    # under a memory budget, sample a small first chunk to learn the row width
+    size = SAMPLE_ROWS if mem_budget_mb else CHUNKSIZE
+    bytes_per_row = 0.0
+    try:
+        i = 0
+        while True:
+            try:
+                chunk = reader.get_chunk(size)
+            except StopIteration:
+                break
+            if chunk.empty:
+                break
+            if cancel is not None and cancel.is_set():
+                raise PreprocessCancelled("Preprocessing cancelled")
+            chunk_rows.append(len(chunk))
+            # widest rows seen so far decide the next chunk size
+            bytes_per_row = max(bytes_per_row, chunk.memory_usage(deep=True).sum() / len(chunk))
+            size = _next_chunksize(bytes_per_row, mem_budget_mb)
+
+            chunk.columns = [str(c).strip() for c in chunk.columns]
+            unparseable: Dict[str, pd.Series] = {}
+            cleaned = _clean_chunk(chunk, unparseable)
+            rejected, reasons, counts = validate_chunk(cleaned, unparseable)
+            reports.append({"rows": len(cleaned), "rejected": int(rejected.sum()),
+                            "rules": counts, "nulls": null_counts(cleaned)})
+
+            if rejected.any():
+                # quarantine the original values (as text) with their reason codes
+                bad = chunk.loc[reasons.index].astype("string")
+                bad["reject_reasons"] = reasons.astype("string")
+                bad["source_file"] = str(raw)
+                bad["source_row"] = reasons.index.astype("int64")
+                table = pa.Table.from_pandas(bad, preserve_index=False)
+                if writer is None:
+                    quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+                    writer = pq.ParquetWriter(quarantine_path, table.schema, compression="zstd")
+                writer.write_table(table.cast(writer.schema))
+                cleaned = cleaned[~rejected]
+
+            part_path = work_dir / f"{name}_{i}.parquet"
+            cleaned.to_parquet(part_path, index=False)
+            parts.append(part_path)
+            i += 1
+            if on_chunk is not None:
+                on_chunk(len(chunk))
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.close()
+        rss.stop()
+    return {
+        "parts": parts,
+        "validation": merge_reports(reports),
+        "chunk_rows": chunk_rows,
+        "bytes_per_row": round(bytes_per_row, 1),
+        "peak_rss_mb": rss.peak_mb,
+    }
+
+def _harmonize(dfs: List[pd.DataFrame]) -> List[pd.DataFrame]:
+    """Give every part the same columns (first-seen spelling/order, missing -> NaN)"""
+    canonical: Dict[str, str] = {}
+    for d in dfs:
+        for c in d.columns:
+            canonical.setdefault(c.lower(), c)
+    columns = list(canonical.values())
+    out = []
+    for d in dfs:
+        d = d.rename(columns={c: canonical[c.lower()] for c in d.columns})
+        out.append(d.reindex(columns=columns))
+    return out
+
+def _clean_chunk(df: pd.DataFrame, unparseable: Dict[str, pd.Series] | None = None) -> pd.DataFrame:
+    # shallow copy: the caller keeps the raw values for quarantine
+    df = df.copy(deep=False)
+    df.columns = [str(c).strip() for c in df.columns]
+    cat_cols = [c for c in CATEGORICAL_CANDIDATES if c in df.columns]
+    for c in cat_cols:
+        df[c] = _as_category(df[c])
+
     # Remove repeated header rows like rows containing "Region" in Region column
     if "Region" in df.columns:
-        df = df[df["Region"].astype(str).str.strip().str.lower() != "region"]
+        df = df[~df["Region"].isin([v for v in df["Region"].cat.categories if v.lower() == "region"])]
 
-    # Strip whitespace for object columns
-    obj_cols = df.select_dtypes(include="object").columns
+    # Strip whitespace for the remaining text columns
+    obj_cols = [c for c in df.select_dtypes(include=["object", "string"]).columns if c not in cat_cols]
     for c in obj_cols:
         df[c] = df[c].astype(str).str.strip()
 
@@ -40,14 +243,13 @@ def _clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
             # keep None for missing
             df[col] = df[col].where(pd.notna(df[col]), None)
 
-    # Numeric coercion (coerce errors -> NaN)
+    # Numeric coercion (coerce errors -> NaN, remembered so validation can reject them)
     for num in ["Rainfall_mm", "Temperature_Celsius", "Days_to_Harvest", "Yield_tons_per_hectare", "area"]:
         if num in df.columns:
-            df[num] = pd.to_numeric(df[num], errors="coerce")
-
-    # invalid rainfall -> NaN
-    if "Rainfall_mm" in df.columns:
-        df.loc[df["Rainfall_mm"] < -50, "Rainfall_mm"] = np.nan
+            coerced = pd.to_numeric(df[num], errors="coerce")
+            if unparseable is not None:
+                unparseable[num] = coerced.isna() & df[num].notna()
+            df[num] = coerced
 
     # feature engineering example (if 'area' exists)
     if "Rainfall_mm" in df.columns and "area" in df.columns:
@@ -55,83 +257,240 @@ def _clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def run_preprocessing(raw_path: str | None = None) -> str:
-    raw = Path(raw_path) if raw_path else _find_latest_raw()
-    CHUNKSIZE = 250_000
-    parts = []
+def _code_dtype(n_categories: int):
+    if n_categories < np.iinfo(np.int8).max:
+        return np.int8
+    if n_categories < np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
 
-    reader = pd.read_csv(raw, chunksize=CHUNKSIZE, low_memory=False)
-    for i, chunk in enumerate(reader):
-        chunk = _clean_chunk(chunk)
-        part_path = PROCESSED_DIR / f"part_{i}.parquet"
-        chunk.to_parquet(part_path, index=False)
-        parts.append(part_path)
+def _read_manifest(run_dir: Path | None) -> dict:
+    try:
+        return json.loads((run_dir / MANIFEST_NAME).read_text())
+    except Exception:
+        return {}
 
-    # combine
-    dfs = [pd.read_parquet(p) for p in parts]
+def _write_manifest(run_dir: Path, manifest: dict):
+    tmp = run_dir / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1))
+    os.replace(tmp, run_dir / MANIFEST_NAME)
+
+def estimate_rows(path: Path, sample_bytes: int = 1 << 16) -> int:
+    """Data row count: exact for parquet, else from file size and the line width of the first 64 KiB"""
+    if path.suffix == ".parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        head = f.read(sample_bytes)
+    lines = head.count(b"\n")
+    if not lines:
+        return 0
+    return max(0, int(size / (len(head) / lines)) - 1)
+
+def run_preprocessing(raw_path: str | None = None, force: bool = False,
+                      raw_paths: List[str] | None = None, raw_glob: str | None = None,
+                      workers: int | None = None, mem_budget_mb: float | None = None,
+                      progress: Callable[..., None] | None = None, cancel=None,
+                      dataset: str | None = None, pipeline_run: str | None = None,
+                      trigger: str | None = None) -> dict:
+    """Clean, validate and encode raw file(s) into the features dataset.
+
+    ``progress(stage=..., rows=...)`` is called as work advances (rows is the
+    count of raw rows read so far); setting the ``cancel`` event stops the run
+    between chunks with PreprocessCancelled. ``dataset`` names an independent
+    output namespace; outputs only become visible once the run is published.
+    The run is recorded in the pipeline history (under ``pipeline_run`` when an
+    orchestrated run asked for it).
+    """
+    with history.track("preprocess", pipeline_run, trigger) as rec, RssSampler() as rss:
+        res = _run_preprocessing(raw_path, force, raw_paths, raw_glob, workers, mem_budget_mb,
+                                 progress, cancel, dataset, rss)
+        metrics = res.get("metrics") or {}
+        rec.update(rows=metrics.get("rows"), rows_per_sec=metrics.get("rows_per_sec"),
+                   peak_rss_mb=metrics.get("peak_rss_mb"),
+                   output={"run_id": res["run_id"], "dataset": dataset, "skipped": res["skipped"],
+                           "source_sha256": res["source_sha256"], "files": res["files"]})
+    return res
+
+def _run_preprocessing(raw_path, force, raw_paths, raw_glob, workers, mem_budget_mb,
+                       progress, cancel, dataset, rss: RssSampler) -> dict:
+    started = time.perf_counter()
+    report = progress or (lambda **kw: None)
+    raws = resolve_inputs(raw_path, raw_paths, raw_glob)
+    workers = max(1, min(workers or MAX_WORKERS, len(raws)))
+    mem_budget_mb = mem_budget_mb or MEM_BUDGET_MB
+
+    # identical payload(s) already processed -> reuse the existing outputs
+    report(stage="hashing", rows=0)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = list(pool.map(sha256_file, raws))
+    digest = digests[0] if len(digests) == 1 else hashlib.sha256("".join(sorted(digests)).encode()).hexdigest()
+    current = current_run_dir(dataset)
+    manifest = _read_manifest(current)
+    if not force and manifest.get("source_sha256") == digest and features_exist(dataset):
+        return {"features_path": manifest["features_path"], "source_sha256": digest,
+                "run_id": current.name, "files": len(raws), "skipped": True,
+                "validation": manifest.get("validation")}
+
+    # nothing outside run_dir is touched until publish_run
+    run_dir = new_run_dir(dataset)
+    work_dir = run_dir / "_work"
+    work_dir.mkdir()
+    rows_read = 0
+    published = False
+    try:
+        report(stage="cleaning", rows=0)
+        if len(raws) == 1:
+            def on_chunk(n):
+                nonlocal rows_read
+                rows_read += n
+                report(stage="cleaning", rows=rows_read)
+            results = [_clean_file(raws[0], work_dir, mem_budget_mb, on_chunk, cancel)]
+        else:
+            # read + clean files concurrently; spawn keeps workers safe to start from a threaded server
+            ctx = multiprocessing.get_context("spawn")
+            # concurrent workers share the budget
+            per_worker = mem_budget_mb / workers if mem_budget_mb else None
+            # workers check the flag between chunks, so a cancel doesn't wait for whole files
+            flag = _CancelFlag(work_dir / ".cancel")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                futures = [pool.submit(_clean_file, raw, work_dir, per_worker, cancel=flag, index=n)
+                           for n, raw in enumerate(raws)]
+                pending = set(futures)
+                while pending:
+                    finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    if cancel is not None and cancel.is_set():
+                        flag.path.touch()
+                        for f in futures:
+                            f.cancel()
+                        raise PreprocessCancelled("Preprocessing cancelled")
+                    # worker processes can't call back, so progress advances per finished file
+                    for fut in finished:
+                        rows_read += sum(fut.result()["chunk_rows"])
+                        report(stage="cleaning", rows=rows_read)
+                results = [f.result() for f in futures]
+        parts = [p for r in results for p in r["parts"]]
+        validation = merge_reports([r["validation"] for r in results])
+        if not parts or validation["accepted"] == 0:
+            raise ValueError(f"Raw input contains no valid rows: {validation['rules']}")
+
+        # combine
+        report(stage="encoding", rows=rows_read)
+        dfs = _harmonize([pd.read_parquet(p) for p in parts])
+        out = _encode_and_write(dfs, run_dir)
+
+        # this run's rejected rows
+        if (work_dir / "quarantine").exists():
+            shutil.move(str(work_dir / "quarantine"), run_dir / "quarantine")
+            validation["quarantine_path"] = str(run_dir / "quarantine")
+        # cleanup part files
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+        elapsed = time.perf_counter() - started
+        chunk_rows = [n for r in results for n in r["chunk_rows"]]
+        metrics = {
+            "rows": validation["rows"],
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(validation["rows"] / elapsed, 1) if elapsed else None,
+            # workers are separate processes when several files run in parallel
+            "peak_rss_mb": max([rss.peak_mb] + [r["peak_rss_mb"] for r in results]),
+            "mem_budget_mb": mem_budget_mb,
+            "chunks": len(chunk_rows),
+            "chunk_rows_max": max(chunk_rows) if chunk_rows else 0,
+        }
+
+        sources = [str(r) for r in raws]
+        _write_manifest(run_dir, {"run_id": run_dir.name, "dataset": dataset,
+                                  "source": sources[0] if len(sources) == 1 else sources,
+                                  "source_sha256": digest, "features_path": str(out),
+                                  "validation": validation, "metrics": metrics})
+        publish_run(run_dir, dataset)
+        published = True
+    finally:
+        if not published:
+            # failed or cancelled: readers still see the previous run
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    report(stage="done", rows=rows_read)
+    return {"features_path": str(out), "source_sha256": digest, "run_id": run_dir.name,
+            "files": len(raws), "skipped": False, "validation": validation, "metrics": metrics}
+
+def _encode_and_write(dfs: List[pd.DataFrame], run_dir: Path) -> Path:
+    """Fit encoders/imputer/scaler over all parts, save artifacts and write the dataset"""
+    # only encode candidates present in the data
+    categorical_cols = [c for c in CATEGORICAL_CANDIDATES if c in dfs[0].columns]
+    # each chunk has its own categories; align them to one sorted vocabulary so
+    # concat keeps the category dtype and codes are stable across runs
+    vocab = {}
+    for c in categorical_cols:
+        for d in dfs:
+            if not isinstance(d[c].dtype, pd.CategoricalDtype):
+                d[c] = _as_category(d[c])  # column missing from this file (all NaN)
+        cats = union_categoricals([d[c] for d in dfs], ignore_order=True).categories
+        vocab[c] = sorted(cats)
+        for d in dfs:
+            d[c] = d[c].cat.set_categories(vocab[c])
     full = pd.concat(dfs, ignore_index=True)
+    target_cols = ["Yield_tons_per_hectare", "yield"]
+
+    # summary sidecar in original units, before encoding/scaling (common/stats.py)
+    write_stats(compute_stats(full, next((c for c in target_cols if c in full.columns), None)), run_dir)
 
-    # ---------- CATEGORICAL ENCODING (robust) ----------
+    # ---------- CATEGORICAL ENCODING (category codes) ----------
     encoders: Dict[str, Dict[str, int]] = {}
-    # only encode candidates present in the data
-    categorical_cols = [c for c in CATEGORICAL_CANDIDATES if c in full.columns]
     for c in categorical_cols:
-        # convert to string for stable mapping (NaN -> "nan" will be handled)
-        s = full[c].astype(str).str.strip()
-        # build mapping from actual non-null values seen
-        vals = list(pd.Series(s).replace({"nan": None, "None": None}).dropna().unique())
-        mapping = {v: i for i, v in enumerate(vals)}
-        encoders[c] = mapping
-        # map to ints, unknown/NaN -> -1
-        full[c] = s.map(mapping).fillna(-1).astype(int)
+        encoders[c] = {v: i for i, v in enumerate(vocab[c])}
+        # codes are already ints, unknown/NaN -> -1
+        full[c] = full[c].cat.codes.astype(_code_dtype(len(vocab[c])))
+
+    # keep the raw codes for partitioning
+    partition_keys = {PARTITION_COLS[c]: full[c].copy() for c in categorical_cols if c in PARTITION_COLS}
 
     # ---------- BOOLEAN -> NUMERIC ----------
-    for col in ["Fertilizer_Used", "Irrigation_Used"]:
-        if col in full.columns:
-            full[col] = full[col].map({True: 1, False: 0, "True": 1, "False": 0}).fillna(0).astype(int)
+    bool_cols = [col for col in ["Fertilizer_Used", "Irrigation_Used"] if col in full.columns]
+    for col in bool_cols:
+        full[col] = full[col].map({True: 1, False: 0, "True": 1, "False": 0}).fillna(0).astype(np.uint8)
 
     # ---------- NUMERIC COLUMNS ----------
-    # after mapping, categories are ints and booleans numeric
-    num_cols = full.select_dtypes(include=[np.number]).columns.tolist()
-    
-    # Remove target columns from numeric features for imputation/scaling
-    target_cols = ["Yield_tons_per_hectare", "yield"]
-    feature_num_cols = [col for col in num_cols if col not in target_cols]
+    # codes and flags stay compact ints; impute/scale only the continuous columns
+    skip = set(categorical_cols) | set(bool_cols) | set(target_cols)
+    feature_num_cols = [col for col in full.select_dtypes(include=[np.number]).columns if col not in skip]
 
     # Impute numeric (median) and scale
     from sklearn.impute import SimpleImputer
     from sklearn.preprocessing import StandardScaler
 
+    art_dir = run_dir / "artifacts"
+    art_dir.mkdir(parents=True, exist_ok=True)
     imputer = SimpleImputer(strategy="median")
     scaler = None
     if feature_num_cols:
-        full[feature_num_cols] = imputer.fit_transform(full[feature_num_cols])
+        X = imputer.fit_transform(full[feature_num_cols].astype(np.float32))
         scaler = StandardScaler()
-        full[feature_num_cols] = scaler.fit_transform(full[feature_num_cols])
-        joblib.dump(imputer, MODEL_COMMON_DIR / "imputer.joblib")
-        joblib.dump(scaler, MODEL_COMMON_DIR / "scaler.joblib")
+        X = scaler.fit_transform(X)
+        full[feature_num_cols] = X.astype(np.float32)
+        joblib.dump(imputer, art_dir / "imputer.joblib")
+        joblib.dump(scaler, art_dir / "scaler.joblib")
     else:
         # save placeholders so later code can load them safely
-        joblib.dump(None, MODEL_COMMON_DIR / "imputer.joblib")
-        joblib.dump(None, MODEL_COMMON_DIR / "scaler.joblib")
+        joblib.dump(None, art_dir / "imputer.joblib")
+        joblib.dump(None, art_dir / "scaler.joblib")
 
     # Save encoders and numeric column list (use feature columns, not all numeric)
-    joblib.dump(encoders, MODEL_COMMON_DIR / "encoders.joblib")
-    joblib.dump(feature_num_cols, MODEL_COMMON_DIR / "num_cols.joblib")
-
-    # Write final features parquet
-    out = PROCESSED_DIR / "features.parquet"
-    full.to_parquet(out, index=False)
+    joblib.dump(encoders, art_dir / "encoders.joblib")
+    joblib.dump(feature_num_cols, art_dir / "num_cols.joblib")
 
-    # cleanup part files
-    for p in parts:
-        try:
-            p.unlink()
-        except Exception:
-            pass
+    # mmap-able bin-code matrix for fast training / analytics (common/binned.py)
+    target = next((c for c in target_cols if c in full.columns), None)
+    write_binned(full, [c for c in full.columns if c not in target_cols], target, run_dir)
 
-    return str(out)
+    # Write final features as a partitioned dataset (by crop/region code)
+    for key, codes in partition_keys.items():
+        full[key] = codes
+    return write_features(full, run_dir / "features")
 
 if __name__ == "__main__":
+    import sys
     print("Running preprocessing...")
-    print(run_preprocessing())
+    # optional raw file paths (already glob-expanded by the shell)
+    print(run_preprocessing(raw_paths=sys.argv[1:] or None, trigger="cli"))
@@ -0,0 +1,103 @@
+# preprocessor/validation.py
+import os
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+# inclusive valid ranges for numeric inputs
+RANGE_RULES = {
+    "Rainfall_mm": (0.0, 5000.0),
+    "Temperature_Celsius": (-30.0, 60.0),
+    "Days_to_Harvest": (1, 365),
+}
+
+# accepted values per categorical column (compared case-insensitively)
+ALLOWED_CATEGORIES = {
+    "Region": {"north", "south", "east", "west"},
+    "Soil_Type": {"sandy", "loam", "clay", "silt", "peaty", "chalky"},
+    "Crop": {"wheat", "rice", "maize", "barley", "soybean", "cotton"},
+    "Weather_Condition": {"sunny", "cloudy", "rainy", "stormy"},
+}
+
+# rows without a target can't be used for training
+REQUIRED_COLUMNS = ["Yield_tons_per_hectare"]
+
+# columns whose overall null ratio exceeds this are reported as violations
+MAX_NULL_RATIO = float(os.environ.get("CROPSENSE_MAX_NULL_RATIO", "0.2"))
+
+
+def validate_chunk(df: pd.DataFrame, unparseable: Dict[str, pd.Series] | None = None
+                   ) -> Tuple[pd.Series, pd.Series, Dict[str, int]]:
+    """Apply row rules to a cleaned chunk.
+
+    Returns (rejected mask, reason codes for the rejected rows, per-rule counts).
+    ``unparseable`` holds masks of values that were present but failed numeric
+    coercion in _clean_chunk.
+    """
+    masks: Dict[str, np.ndarray] = {}
+
+    for col, mask in (unparseable or {}).items():
+        masks[f"unparseable:{col}"] = mask.to_numpy()
+
+    for col, (lo, hi) in RANGE_RULES.items():
+        if col in df.columns:
+            v = df[col].to_numpy(dtype="float64", na_value=np.nan)
+            # NaN compares False on both sides, so missing values pass here
+            masks[f"range:{col}"] = (v < lo) | (v > hi)
+
+    for col, allowed in ALLOWED_CATEGORIES.items():
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            # evaluate once per category, then broadcast through the codes
+            cats = df[col].cat.categories
+            bad_cat = np.append(~cats.str.lower().isin(allowed), False)  # trailing slot: code -1 (missing)
+            masks[f"category:{col}"] = bad_cat[df[col].cat.codes.to_numpy()]
+
+    for col in REQUIRED_COLUMNS:
+        if col in df.columns:
+            masks[f"null:{col}"] = df[col].isna().to_numpy()
+
+    rejected = np.zeros(len(df), dtype=bool)
+    for m in masks.values():
+        rejected |= m
+    counts = {rule: int(m.sum()) for rule, m in masks.items()}
+
+    # reason strings are only built for the (few) rejected rows
+    idx = np.flatnonzero(rejected)
+    reasons = pd.Series([""] * len(idx), index=df.index[idx], dtype=object)
+    for rule, m in masks.items():
+        hit = m[idx]
+        if hit.any():
+            reasons[hit] = reasons[hit] + rule + ";"
+    return pd.Series(rejected, index=df.index), reasons.str.rstrip(";"), counts
+
+
+def null_counts(df: pd.DataFrame) -> Dict[str, int]:
+    counts = {}
+    for c in df.columns:
+        s = df[c]
+        n = int((s.cat.codes < 0).sum()) if isinstance(s.dtype, pd.CategoricalDtype) else int(s.isna().sum())
+        counts[c] = n
+    return counts
+
+
+def merge_reports(reports: List[dict]) -> dict:
+    """Combine per-chunk (or per-file) reports into one summary"""
+    rows = sum(r["rows"] for r in reports)
+    rejected = sum(r["rejected"] for r in reports)
+    rules: Dict[str, int] = {}
+    nulls: Dict[str, int] = {}
+    for r in reports:
+        for k, v in r["rules"].items():
+            rules[k] = rules.get(k, 0) + v
+        for k, v in r["nulls"].items():
+            nulls[k] = nulls.get(k, 0) + v
+    null_ratio = {c: round(n / rows, 4) if rows else 0.0 for c, n in nulls.items()}
+    return {
+        "rows": rows,
+        "accepted": rows - rejected,
+        "rejected": rejected,
+        "rules": rules,
+        "nulls": nulls,
+        "null_ratio": null_ratio,
+        "null_ratio_violations": sorted(c for c, r in null_ratio.items() if r > MAX_NULL_RATIO),
+    }
@@ -0,0 +1,53 @@
+# preprocessor/worker.py
+# Consumes raw_ready events from the collector, rebuilds the features and emits
+# features_ready for the training worker:
+#   python -m preprocessor.worker
+import logging
+
+from common import catalog, events
+from .preprocess import run_preprocessing
+
+logger = logging.getLogger("preprocessor.worker")
+
+
+def _features_ready(res: dict) -> dict:
+    return {"features_path": res["features_path"], "run_id": res["run_id"],
+            "source_sha256": res["source_sha256"], "dataset": None}
+
+
+def handle_raw_ready(event: dict, redelivered: bool = False):
+    # always build from the newest raw file: a burst of uploads collapses into
+    # one run (the others find it already processed), and an event that was
+    # never published (broker down) is picked up by the next one
+    latest = catalog.latest()
+    raw_path = latest["path"] if latest else event.get("path")
+    if not raw_path:
+        return []
+    logger.info("raw_ready %s -> preprocessing %s", event.get("path"), raw_path)
+    res = run_preprocessing(raw_path=raw_path, trigger="event")
+    # a redelivered message may have been processed before its features_ready went out
+    if res["skipped"] and not redelivered:
+        logger.info("%s already processed (run %s)", raw_path, res["run_id"])
+        return []
+    return [(events.FEATURES_READY, _features_ready(res))]
+
+
+def catch_up():
+    """Process raw data that arrived while this worker (or the broker) was down"""
+    if catalog.latest() is None:
+        return
+    for queue, payload in handle_raw_ready({}):
+        events.publish(queue, payload)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    try:
+        catch_up()
+    except Exception:
+        logger.exception("Catch-up preprocessing failed")
+    events.consume(events.RAW_READY, handle_raw_ready)
+
+
+if __name__ == "__main__":
+    main()
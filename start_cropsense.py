@@ -5,7 +5,7 @@ One-command startup for the entire CropSense system
 """
 import subprocess
 import time
-import requests
+from common.readiness import wait_ready
 import sys
 import os
 from datetime import datetime
@@ -84,29 +84,22 @@ def wait_for_services():
     }
     
     max_wait = 120  # 2 minutes
-    start_time = time.time()
-    
-    while time.time() - start_time < max_wait:
-        all_ready = True
-        
-        for service, url in services.items():
-            try:
-                response = requests.get(url, timeout=5)
-                if response.status_code == 200:
-                    print(f"  ✅ {service} is ready")
-                else:
-                    print(f"  ⏳ {service} starting...")
-                    all_ready = False
-            except requests.exceptions.RequestException:
-                print(f"  ⏳ {service} starting...")
-                all_ready = False
-        
-        if all_ready:
-            print("✅ All services are ready!")
-            return True
-        
-        time.sleep(5)
-    
+
+    def report(service, res):
+        if res["ready"]:
+            print(f"  ✅ {service} is ready ({res['waited_seconds']}s)")
+        elif res["attempts"] == 1:
+            print(f"  ⏳ {service} starting...")
+
+    # every service is probed concurrently with backoff, each up to max_wait
+    status = wait_ready(services, deadline=max_wait, on_update=report)
+    if status["ready"]:
+        print(f"✅ All services are ready! ({status['seconds']}s)")
+        return True
+
+    for service, res in status["services"].items():
+        if not res["ready"]:
+            print(f"  ❌ {service} not ready: {res['error']}")
     print("⚠️ Some services may not be ready yet. Check manually.")
     return False
 
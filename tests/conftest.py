@@ -0,0 +1,41 @@
+# tests/conftest.py
+# Run from the repo root: python -m pytest
+# The services keep their state under relative paths (data/...), so every test
+# runs in its own empty directory with fresh SQLite stores.
+import threading
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from common import catalog, events, history
+from predictor import batch_jobs
+from predictor.train import MODEL_PATH
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(events, "EVENTS_ENABLED", False)
+    monkeypatch.setattr(catalog, "CATALOG_PATH", Path("data/raw/_catalog.db"))
+    monkeypatch.setattr(history, "DB_PATH", Path("data/pipeline/history.db"))
+    monkeypatch.setattr(batch_jobs, "JOBS_DIR", Path("data/batch"))
+    monkeypatch.setattr(batch_jobs, "DB_PATH", Path("data/batch/jobs.db"))
+    for store in (catalog, history, batch_jobs):
+        # connections and the schema check are cached per process
+        monkeypatch.setattr(store, "_thread_local", threading.local())
+        monkeypatch.setattr(store, "_initialized", False)
+    return tmp_path
+
+
+@pytest.fixture
+def model_file(workdir):
+    """A trained-model artifact where the predictor looks for it: predicts 2 * f1 + f2"""
+    X = pd.DataFrame({"f1": [0.0, 1.0, 2.0, 3.0], "f2": [1.0, 0.0, 1.0, 0.0]})
+    model = LinearRegression().fit(X, 2 * X["f1"] + X["f2"])
+    MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({"model": model, "feature_columns": ["f1", "f2"], "preprocessor": {}, "run_id": "r1"},
+                MODEL_PATH)
+    return workdir / MODEL_PATH
@@ -0,0 +1,146 @@
+# tests/test_batch_jobs.py
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common import events, scheduler
+from predictor import batch_jobs, batch_worker
+from predictor.batch_score import PREDICTION_COL, ROW_COL
+from predictor.bundle import load_bundle, transform
+
+ROWS = 10
+
+
+@pytest.fixture(autouse=True)
+def one_chunk_per_slice(monkeypatch):
+    monkeypatch.setattr(batch_worker, "CHUNK_ROWS", 3)  # 4 chunks
+    monkeypatch.setattr(batch_worker, "SLICE_SECONDS", 0)
+    monkeypatch.setattr(batch_worker, "_bundle", (None, None))
+
+
+def _job(tmp_path, explain=False) -> str:
+    job_id = uuid.uuid4().hex[:12]
+    batch_jobs.job_dir(job_id).mkdir(parents=True)
+    upload = batch_jobs.job_dir(job_id) / "upload.csv"
+    pd.DataFrame({"f1": np.arange(ROWS, dtype=float), "f2": np.arange(ROWS) % 2}).to_csv(upload, index=False)
+    batch_jobs.create_job(job_id, "in.csv", upload, explain, None, "bulk", None)
+    return job_id
+
+
+def _handle(job_id, slice_no, event_id, redelivered=False):
+    """The follow-up slice the handler hands on (None: nothing published)"""
+    out = batch_worker.handle_batch_job({"job_id": job_id, "slice": slice_no, "event_id": event_id}, redelivered)
+    assert len(out) <= 1
+    return out[0][1]["slice"] if out else None
+
+
+def test_claim_slice():
+    batch_jobs.create_job("j", "in.csv", "in.csv", False, None, "bulk", None)
+    assert batch_jobs.claim_slice("j", 0, "a")      # first message for the job
+    assert batch_jobs.claim_slice("j", 0, "a")      # its redelivery
+    assert not batch_jobs.claim_slice("j", 0, "b")  # a duplicate
+    assert batch_jobs.claim_slice("j", 1, "c")      # the next slice takes over
+    assert not batch_jobs.claim_slice("j", 0, "a")  # stale
+
+
+def test_job_runs_to_completion_in_slices(tmp_path, model_file):
+    job_id = _job(tmp_path)
+    slice_no, n = 0, 0
+    while slice_no is not None:
+        slice_no = _handle(job_id, slice_no, f"m{n}")
+        n += 1
+    job = batch_jobs.get_job(job_id)
+    assert job["state"] == "succeeded" and job["rows_done"] == ROWS and job["chunks_total"] == 4
+    assert job["model_run_id"] == "r1"
+    assert n == 4  # one chunk per slice, the first one also stages
+    df = pd.read_parquet(batch_jobs.result_parquet(job_id)).sort_values(ROW_COL)
+    assert df[ROW_COL].tolist() == list(range(ROWS))
+    np.testing.assert_allclose(df[PREDICTION_COL], 2 * df["f1"] + df["f2"], atol=1e-9)
+    assert b"predicted_yield" in b"".join(batch_jobs.iter_result_csv(job_id)).splitlines()[0]
+
+
+def test_summary_reads_stats_and_preview_across_parts(tmp_path, model_file):
+    job_id = _job(tmp_path)
+    slice_no, n = 0, 0
+    while slice_no is not None:
+        slice_no = _handle(job_id, slice_no, f"m{n}")
+        n += 1
+    expected = 2 * np.arange(ROWS, dtype=float) + np.arange(ROWS) % 2
+    summary = batch_jobs.result_summary(job_id, PREDICTION_COL, preview_rows=5)
+    assert summary["rows"] == ROWS and summary["top_feature"] is None
+    assert summary["mean"] == pytest.approx(expected.mean()) and summary["max"] == pytest.approx(expected.max())
+    # 3-row parts: the preview spans the first two
+    assert [r[ROW_COL] for r in summary["preview"]] == [0, 1, 2, 3, 4]
+    assert not (batch_jobs.job_dir(job_id) / "result.parquet").exists()
+
+
+def test_handoff_survives_redelivery(tmp_path, model_file):
+    job_id = _job(tmp_path)
+    assert _handle(job_id, 0, "m0") == 1
+    # connection lost before the follow-up went out: the same message comes back
+    assert _handle(job_id, 0, "m0", redelivered=True) == 1
+    assert batch_jobs.get_job(job_id)["chunks_done"] == 2
+    # the follow-up published by one of them takes over; the other becomes a duplicate
+    assert _handle(job_id, 1, "f1") == 2
+    assert _handle(job_id, 1, "f1-dup") is None
+    assert _handle(job_id, 0, "m0", redelivered=True) is None
+    assert batch_jobs.get_job(job_id)["chunks_done"] == 3
+
+
+def test_chunks_wait_for_interactive_requests(tmp_path, model_file, monkeypatch):
+    monkeypatch.setattr(scheduler, "MAX_PAUSE_SECONDS", 0.3)
+    job_id = _job(tmp_path)
+    # another process (the API) is serving an interactive request
+    marks = tmp_path / scheduler.INTERACTIVE_MARK_DIR
+    marks.mkdir(parents=True)
+    (marks / "4242").touch()
+    started = time.perf_counter()
+    assert _handle(job_id, 0, "m0") == 1
+    assert time.perf_counter() - started >= 0.3
+    (marks / "4242").unlink()
+    started = time.perf_counter()
+    assert _handle(job_id, 1, "m1") == 2
+    assert time.perf_counter() - started < 0.3
+    assert batch_jobs.get_job(job_id)["chunks_done"] == 2
+
+
+def test_cancelled_job_stops(tmp_path, model_file):
+    job_id = _job(tmp_path)
+    _handle(job_id, 0, "m0")
+    batch_jobs.cancel(job_id)
+    assert _handle(job_id, 1, "f1") is None
+    job = batch_jobs.get_job(job_id)
+    assert job["state"] == "cancelled" and job["chunks_done"] == 1
+
+
+def test_missing_model_fails_the_job(tmp_path):
+    job_id = _job(tmp_path)
+    assert _handle(job_id, 0, "m0") is None
+    job = batch_jobs.get_job(job_id)
+    assert job["state"] == "failed" and "No trained model" in job["error"]
+
+
+def test_catch_up_supersedes_queued_messages(tmp_path, monkeypatch):
+    published = []
+    monkeypatch.setattr(events, "publish", lambda queue, payload, priority=None: published.append(payload))
+    job_id = _job(tmp_path)
+    batch_jobs.claim_slice(job_id, 2, "m2")
+    done = _job(tmp_path)
+    batch_jobs.set_state(done, "succeeded")
+    batch_worker.catch_up()
+    assert published == [{"job_id": job_id, "slice": 3}]
+
+
+def test_explanations_add_up_to_the_prediction(tmp_path, model_file):
+    lightgbm = pytest.importorskip("lightgbm")
+    X = pd.DataFrame({"f1": np.arange(40, dtype=float), "f2": np.arange(40) % 2})
+    model = lightgbm.LGBMRegressor(n_estimators=5, min_child_samples=2, verbose=-1).fit(X, 2 * X["f1"] + X["f2"])
+    bundle = load_bundle(model_file) | {"model": model}
+    out = batch_worker.score_chunk(bundle, X.head(ROWS), 0, explain=True)
+    shap = out[["shap_f1", "shap_f2"]].sum(axis=1)
+    base = model.predict(transform(bundle, X.head(1)), pred_contrib=True)[0, -1]
+    np.testing.assert_allclose(shap + base, out[PREDICTION_COL], atol=1e-6)
+    assert set(out["top_feature"]) <= {"f1", "f2"}
@@ -0,0 +1,85 @@
+# tests/test_batch_score.py
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from predictor.batch_score import DONE_DIR, MANIFEST_NAME, PREDICTION_COL, ROW_COL, score_file
+
+ROWS = 10
+CHUNK_ROWS = 3  # 4 chunks
+
+
+@pytest.fixture
+def input_csv(tmp_path):
+    path = tmp_path / "in.csv"
+    pd.DataFrame({"f1": np.arange(ROWS, dtype=float), "f2": np.arange(ROWS) % 2,
+                  "Crop": ["Rice", "Wheat"] * (ROWS // 2)}).to_csv(path, index=False)
+    return path
+
+
+def _score(input_csv, model_file, out, **kw):
+    return score_file(str(input_csv), str(out), model=str(model_file), workers=1, chunk_rows=CHUNK_ROWS,
+                      progress=False, **kw)
+
+
+def _result(out) -> pd.DataFrame:
+    return pd.read_parquet(out).sort_values(ROW_COL).reset_index(drop=True)
+
+
+def test_scores_every_row(tmp_path, input_csv, model_file):
+    res = _score(input_csv, model_file, tmp_path / "out")
+    assert res["rows"] == res["rows_scored"] == ROWS and res["chunks"] == 4 and not res["resumed"]
+    df = _result(tmp_path / "out")
+    assert df[ROW_COL].tolist() == list(range(ROWS))
+    np.testing.assert_allclose(df[PREDICTION_COL], 2 * df["f1"] + df["f2"], atol=1e-9)
+    assert json.loads((tmp_path / "out" / MANIFEST_NAME).read_text())["complete"]
+
+
+def test_interrupted_run_resumes_missing_chunks(tmp_path, input_csv, model_file):
+    out = tmp_path / "out"
+    _score(input_csv, model_file, out)
+    expected = _result(out)
+    # as if the run died after chunks 0 and 2: their parts and done markers survive
+    for i in (1, 3):
+        (out / f"part-{i:06d}.parquet").unlink()
+        (out / DONE_DIR / str(i)).unlink()
+    manifest = json.loads((out / MANIFEST_NAME).read_text())
+    (out / MANIFEST_NAME).write_text(json.dumps({k: v for k, v in manifest.items() if k != "metrics"}
+                                                | {"complete": False}))
+    res = _score(input_csv, model_file, out)
+    assert res["resumed"] and res["rows_resumed"] == 6 and res["rows_scored"] == 4
+    pd.testing.assert_frame_equal(_result(out), expected)
+
+
+def test_finished_output_is_not_scored_again(tmp_path, input_csv, model_file):
+    _score(input_csv, model_file, tmp_path / "out")
+    res = _score(input_csv, model_file, tmp_path / "out")
+    assert res["resumed"] and res["rows"] == ROWS
+
+
+def test_changed_input_needs_restart(tmp_path, input_csv, model_file):
+    out = tmp_path / "out"
+    _score(input_csv, model_file, out)
+    input_csv.write_text(input_csv.read_text() + "100.0,1,Rice\n")
+    with pytest.raises(ValueError, match="input_sha256"):
+        _score(input_csv, model_file, out)
+    res = _score(input_csv, model_file, out, restart=True)
+    assert res["rows_scored"] == ROWS + 1 and len(_result(out)) == ROWS + 1
+
+
+def test_refuses_a_foreign_output_dir(tmp_path, input_csv, model_file):
+    out = tmp_path / "out"
+    out.mkdir()
+    (out / "notes.txt").write_text("mine")
+    with pytest.raises(ValueError, match="not empty"):
+        _score(input_csv, model_file, out)
+
+
+def test_partitioned_output(tmp_path, input_csv, model_file):
+    out = tmp_path / "out"
+    _score(input_csv, model_file, out, partition_by="Crop")
+    assert sorted(p.name for p in out.glob("Crop=*")) == ["Crop=Rice", "Crop=Wheat"]
+    rice = pd.read_parquet(out / "Crop=Rice")
+    assert len(rice) == ROWS // 2 and (rice[ROW_COL] % 2 == 0).all()
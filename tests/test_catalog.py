@@ -0,0 +1,105 @@
+# tests/test_catalog.py
+import os
+
+import pytest
+
+from common import catalog
+from data_collector import collector
+
+
+@pytest.fixture(autouse=True)
+def csv_format(monkeypatch):
+    monkeypatch.setattr(collector, "RAW_FORMAT", "csv")
+
+
+def _collect(tmp_path, text: str, name: str = "src.csv") -> dict:
+    src = tmp_path / "incoming" / name
+    src.parent.mkdir(exist_ok=True)
+    src.write_text(text)
+    return collector.save_raw_from_path(str(src))
+
+
+def _raw_files():
+    return sorted(p for p in os.listdir(collector.RAW_DIR) if p.endswith(".csv"))
+
+
+def test_same_payload_is_stored_once(tmp_path):
+    first = _collect(tmp_path, "a,b\n1,2\n")
+    again = _collect(tmp_path, "a,b\n1,2\n", name="copy.csv")
+    assert not first["deduplicated"]
+    assert again == {"path": first["path"], "sha256": first["sha256"], "deduplicated": True,
+                     "format": "csv"}
+    assert len(_raw_files()) == 1
+    assert catalog.lookup(first["sha256"])["path"] == first["path"]
+
+
+def test_duplicate_of_a_parquet_file_reports_its_format(tmp_path, monkeypatch):
+    monkeypatch.setattr(collector, "RAW_FORMAT", "parquet")
+    first = _collect(tmp_path, "a,b\n1,2\n")
+    again = _collect(tmp_path, "a,b\n1,2\n", name="copy.csv")
+    assert first["format"] == "parquet" and first["path"].endswith(".parquet")
+    assert again["deduplicated"] and again["format"] == "parquet" and again["path"] == first["path"]
+    assert first.keys() - again.keys() == {"transcode"}
+
+
+def test_new_payload_becomes_latest(tmp_path):
+    _collect(tmp_path, "a,b\n1,2\n")
+    second = _collect(tmp_path, "a,b\n3,4\n")
+    entry = catalog.latest()
+    assert entry["path"] == second["path"]
+    assert entry["rows"] == 1 and entry["columns"] == ["a", "b"]
+
+
+def test_deleted_file_is_stored_again(tmp_path):
+    first = _collect(tmp_path, "a,b\n1,2\n")
+    os.remove(first["path"])
+    again = _collect(tmp_path, "a,b\n1,2\n")
+    assert not again["deduplicated"]
+    assert os.path.exists(again["path"])
+
+
+def test_reupload_after_retirement_is_catalogued(tmp_path):
+    first = _collect(tmp_path, "a,b\n1,2\n")
+    entry = catalog.lookup(first["sha256"])
+    # compacted, then retired with the compacted file gone too
+    catalog.mark_retired(entry["id"])
+    os.remove(first["path"])
+    assert catalog.lookup(first["sha256"]) is None
+
+    again = _collect(tmp_path, "a,b\n1,2\n")
+    assert not again["deduplicated"]
+    assert again["path"] and os.path.exists(again["path"])
+    entry = catalog.lookup(first["sha256"])
+    assert entry["path"] == again["path"] and entry["retired_at"] is None
+    assert catalog.latest()["path"] == again["path"]
+
+
+def _register(tmp_path, n: int, ingested_at: str, source: str = "upload:x.csv") -> int:
+    catalog.init_catalog()  # before the file exists, or the first-run backfill catalogues it
+    path = tmp_path / "data" / "raw" / f"f{n}.csv"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"a\n{n}\n")
+    return catalog.register(path, f"sha{n}", source=source, ingested_at=ingested_at)
+
+
+def test_listing_pages_through_every_file_newest_first(tmp_path):
+    # several files share an ingest time: the id breaks the tie
+    ids = [_register(tmp_path, n, f"2026-01-0{1 + n // 3}T00:00:00.000000Z") for n in range(8)]
+    seen, cursor = [], None
+    while True:
+        page = catalog.list_files(limit=3, cursor=cursor)
+        assert len(page["files"]) <= 3
+        seen += [f["id"] for f in page["files"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+
+
+def test_listing_filters(tmp_path):
+    _register(tmp_path, 1, "2026-01-01T00:00:00.000000Z", source="local:/x.csv")
+    upload = _register(tmp_path, 2, "2026-01-02T00:00:00.000000Z", source="upload:y.csv")
+    _register(tmp_path, 3, "2026-01-03T00:00:00.000000Z", source="upload:z.csv")
+    page = catalog.list_files(source="upload", until="2026-01-03")
+    assert [f["id"] for f in page["files"]] == [upload]
+    assert [f["path"] for f in catalog.list_files(name="f3")["files"]] == [str(tmp_path / "data/raw/f3.csv")]
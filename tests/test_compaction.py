@@ -0,0 +1,90 @@
+# tests/test_compaction.py
+import os
+
+import pandas as pd
+import pytest
+
+from common import catalog
+from common.hashing import sha256_file
+from data_collector import collector, compaction
+
+CROP = "Region,Crop,Rainfall_mm\n"
+
+
+@pytest.fixture(autouse=True)
+def csv_format(monkeypatch):
+    monkeypatch.setattr(collector, "RAW_FORMAT", "csv")
+
+
+def _collect(tmp_path, text: str, source: str = "local:test.csv") -> dict:
+    os.makedirs(collector.RAW_DIR, exist_ok=True)
+    tmp = collector._tmp_path()
+    with open(tmp, "w") as f:
+        f.write(text)
+    return collector._store(tmp, sha256_file(tmp), source=source)
+
+
+def test_files_with_the_same_columns_are_merged(tmp_path):
+    a = _collect(tmp_path, CROP + "East,Rice,800\n")
+    b = _collect(tmp_path, CROP + "West,Wheat,600.5\nNorth,Maize,700\n")
+    # same columns in another order still go together
+    c = _collect(tmp_path, "Crop,Region,Rainfall_mm\nBarley,South,550\n")
+    res = compaction.compact()
+    assert len(res["compacted"]) == 1
+    out = res["compacted"][0]
+    assert out["files"] == 3 and out["rows"] == 4
+    df = pd.read_parquet(out["path"])
+    assert list(df.columns) == ["Region", "Crop", "Rainfall_mm"]
+    assert df["Rainfall_mm"].dtype == "float64"  # int and float members
+    # lineage: each member points at the compacted file, which stands in for it
+    for member in (a, b, c):
+        assert catalog.lookup(member["sha256"])["path"] == out["path"]
+    assert catalog.latest()["path"] == out["path"]
+
+
+def test_files_with_different_columns_are_never_merged(tmp_path):
+    _collect(tmp_path, CROP + "East,Rice,800\n")
+    _collect(tmp_path, "a,b\n1,2\n")
+    assert compaction.plan() == []
+    assert compaction.compact()["compacted"] == []
+
+
+def test_each_column_set_gets_its_own_file(tmp_path):
+    _collect(tmp_path, CROP + "East,Rice,800\n")
+    _collect(tmp_path, CROP + "West,Wheat,600\n")
+    _collect(tmp_path, "a,b\n1,2\n")
+    _collect(tmp_path, "a,b\n3,4\n")
+    groups = compaction.plan()
+    assert sorted(sorted(tuple(m["columns"]) for m in g) for g in groups) == [
+        [("Region", "Crop", "Rainfall_mm")] * 2, [("a", "b")] * 2]
+    merged = [pd.read_parquet(c["path"]) for c in compaction.compact()["compacted"]]
+    assert sorted(len(df) for df in merged) == [2, 2]
+    assert not any(df.isna().any().any() for df in merged)
+
+
+def test_by_source_keeps_sources_apart(tmp_path):
+    _collect(tmp_path, CROP + "East,Rice,800\n")
+    _collect(tmp_path, CROP + "West,Wheat,600\n")
+    _collect(tmp_path, CROP + "North,Maize,700\n", source="upload:a.csv")
+    _collect(tmp_path, CROP + "South,Barley,550\n", source="upload:b.csv")
+    assert len(compaction.plan()) == 1
+    assert sorted(len(g) for g in compaction.plan(by_source=True)) == [2, 2]
+
+
+def test_dry_run_writes_nothing(tmp_path):
+    _collect(tmp_path, CROP + "East,Rice,800\n")
+    _collect(tmp_path, CROP + "West,Wheat,600\n")
+    before = sorted(os.listdir(collector.RAW_DIR))
+    res = compaction.compact(dry_run=True)
+    assert len(res["groups"]) == 1 and len(res["groups"][0]["files"]) == 2
+    assert sorted(os.listdir(collector.RAW_DIR)) == before
+
+
+def test_originals_are_retired_after_retention(tmp_path):
+    a = _collect(tmp_path, CROP + "East,Rice,800\n")
+    b = _collect(tmp_path, CROP + "West,Wheat,600\n")
+    out = compaction.compact()["compacted"][0]
+    assert os.path.exists(a["path"]) and os.path.exists(b["path"])
+    assert sorted(compaction.retire_expired(retention_seconds=0)) == sorted([a["path"], b["path"]])
+    assert not os.path.exists(a["path"]) and not os.path.exists(b["path"])
+    assert catalog.lookup(a["sha256"])["path"] == out["path"]
@@ -0,0 +1,116 @@
+# tests/test_dag.py
+import hashlib
+
+import pytest
+
+from orchestrator.dag import DAG, PACKAGE_ROOT, Stage, code_version
+
+
+class Counter:
+    """Stage fn that counts its calls and echoes a value"""
+    def __init__(self, value=None, fail=False):
+        self.calls = 0
+        self.value = value
+        self.fail = fail
+
+    def __call__(self, inputs, run_id):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("stage broke")
+        return {"value": self.value, "inputs": inputs}
+
+
+def _stages(run) -> dict:
+    return {s["stage"]: s for s in run["stages"]}
+
+
+def test_dependencies_run_first_and_pass_outputs():
+    src = Counter(21)
+    double_fn = lambda inputs, run_id: {"value": inputs["src"]["value"] * 2}
+    run = DAG("t", [Stage("double", double_fn, deps=["src"]), Stage("src", src)]).run()
+    assert run["status"] == "succeeded"
+    assert _stages(run)["double"]["output"] == {"value": 42}
+
+
+@pytest.mark.parametrize("order", [["a", "b", "c", "d"], ["d", "c", "b", "a"], ["c", "a", "d", "b"]])
+def test_failure_skips_every_descendant_in_any_declaration_order(order):
+    fns = {"a": Counter(fail=True), "b": Counter(), "c": Counter(), "d": Counter()}
+    deps = {"a": [], "b": ["a"], "c": ["b"], "d": []}
+    run = DAG("t", [Stage(n, fns[n], deps=deps[n]) for n in order]).run()
+    status = {n: s["status"] for n, s in _stages(run).items()}
+    assert status == {"a": "failed", "b": "skipped", "c": "skipped", "d": "succeeded"}
+    assert run["status"] == "failed"
+    assert fns["b"].calls == fns["c"].calls == 0
+
+
+def test_unchanged_inputs_are_served_from_cache():
+    src, work = Counter(1), Counter()
+    dag = DAG("t", [Stage("src", src),
+                    Stage("work", work, deps=["src"], key=lambda inputs: {"src": inputs["src"]["value"]})])
+    dag.run()
+    run = dag.run()
+    assert work.calls == 1 and src.calls == 2  # src has no key: always runs
+    assert _stages(run)["work"]["cache_hit"]
+    assert not _stages(run)["src"]["cache_hit"]
+
+    src.value = 2  # a new upstream output is a new key
+    dag.run()
+    assert work.calls == 2
+
+
+def test_invalid_cached_output_is_recomputed():
+    work = Counter()
+    valid = {"ok": True}
+    dag = DAG("t", [Stage("work", work, key=lambda inputs: {}, valid=lambda out: valid["ok"])])
+    dag.run()
+    valid["ok"] = False  # e.g. the cached file was deleted
+    run = dag.run()
+    assert work.calls == 2 and not _stages(run)["work"]["cache_hit"]
+
+
+def test_forced_stage_ignores_the_cache():
+    work = Counter()
+    dag = DAG("t", [Stage("work", work, key=lambda inputs: {})])
+    dag.run()
+    dag.run(force=["work"])
+    assert work.calls == 2
+
+
+def test_params_are_part_of_the_key():
+    work = Counter()
+    DAG("t", [Stage("work", work, key=lambda inputs: {}, params={"binned": False})]).run()
+    DAG("t", [Stage("work", work, key=lambda inputs: {}, params={"binned": True})]).run()
+    assert work.calls == 2
+
+
+def test_failed_output_is_not_cached():
+    work = Counter(fail=True)
+    dag = DAG("t", [Stage("work", work, key=lambda inputs: {})])
+    dag.run()
+    dag.run()
+    assert work.calls == 2
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="unknown stage"):
+        DAG("t", [Stage("a", Counter(), deps=["missing"])])
+    with pytest.raises(ValueError, match="Cycle"):
+        DAG("t", [Stage("a", Counter(), deps=["b"]), Stage("b", Counter(), deps=["a"])])
+
+
+def test_code_version_resolves_against_the_package_root(tmp_path):
+    # tests run from an empty directory, not the repo root
+    assert not (tmp_path / "orchestrator").exists()
+    empty = hashlib.sha256().hexdigest()
+    version = code_version("orchestrator/dag.py")
+    assert version != empty
+    assert code_version("orchestrator/*.py") not in (empty, version)
+    expected = hashlib.sha256()
+    expected.update(b"orchestrator/dag.py")
+    expected.update((PACKAGE_ROOT / "orchestrator" / "dag.py").read_bytes())
+    assert version == expected.hexdigest()
+
+
+def test_code_version_refuses_a_pattern_without_files():
+    with pytest.raises(FileNotFoundError, match="nothing_here"):
+        code_version("orchestrator/dag.py", "nothing_here/*.py")
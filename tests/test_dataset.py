@@ -0,0 +1,66 @@
+# tests/test_dataset.py
+import os
+import time
+
+import pytest
+
+from common import dataset
+
+
+def _run(n: int, ds=None, finished: bool = True):
+    # run ids sort by time; new_run_dir() would give several runs the same second
+    run = dataset.processed_root(ds) / "runs" / f"20260101T0000{n:02d}Z-abcdef"
+    run.mkdir(parents=True)
+    if finished:
+        (run / "manifest.json").write_text("{}")
+    return run
+
+
+def test_publish_points_current_at_the_run():
+    assert dataset.current_run_dir() is None
+    run = _run(1)
+    dataset.publish_run(run)
+    assert dataset.current_run_dir() == run
+    assert (dataset.PROCESSED_DIR / dataset.CURRENT_POINTER).read_text() == run.name
+    assert not list(dataset.PROCESSED_DIR.glob(f".{dataset.CURRENT_POINTER}.*"))
+
+
+def test_current_ignores_a_missing_run():
+    dataset.publish_run(_run(1))
+    (dataset.PROCESSED_DIR / dataset.CURRENT_POINTER).write_text("20250101T000000Z-gone00")
+    assert dataset.current_run_dir() is None
+
+
+def test_publish_keeps_the_newest_finished_runs(monkeypatch):
+    monkeypatch.setattr(dataset, "KEEP_RUNS", 2)
+    runs = [_run(n) for n in range(4)]
+    for run in runs:
+        dataset.publish_run(run)
+    left = sorted(p.name for p in (dataset.PROCESSED_DIR / "runs").iterdir())
+    assert left == [r.name for r in runs[2:]]
+
+
+def test_prune_spares_runs_in_progress(monkeypatch):
+    monkeypatch.setattr(dataset, "KEEP_RUNS", 1)
+    newer = _run(9)  # finished after the one being published: not ours to prune
+    in_progress = _run(8, finished=False)
+    abandoned = _run(0, finished=False)
+    old = time.time() - dataset.STALE_RUN_SECONDS - 60
+    os.utime(abandoned, (old, old))
+    current = _run(5)
+    dataset.publish_run(current)
+    assert current.exists() and newer.exists() and in_progress.exists()
+    assert not abandoned.exists()
+
+
+def test_datasets_have_their_own_current_run():
+    run = _run(1, ds="east")
+    dataset.publish_run(run, "east")
+    assert dataset.current_run_dir("east") == run
+    assert dataset.current_run_dir() is None
+
+
+@pytest.mark.parametrize("name", ["../up", "a/b", "-x", "x" * 65])
+def test_invalid_dataset_names(name):
+    with pytest.raises(ValueError):
+        dataset.processed_root(name)
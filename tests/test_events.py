@@ -0,0 +1,138 @@
+# tests/test_events.py
+# consume() against an in-memory stand-in for a pika connection
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+from pika.exceptions import ChannelClosedByBroker
+
+from common import events
+
+
+class FakeChannel:
+    def __init__(self, conn):
+        self.connection = conn
+        self.log = conn.log
+        self.is_open = True
+
+    def confirm_delivery(self):
+        pass
+
+    def basic_qos(self, prefetch_count):
+        pass
+
+    def queue_declare(self, queue, durable, arguments=None):
+        if arguments and queue in self.connection.plain_queues:
+            raise ChannelClosedByBroker(406, "PRECONDITION_FAILED - inequivalent arg 'x-max-priority'")
+        self.log.append(("declare", queue, arguments))
+
+    def basic_consume(self, queue, callback):
+        self.connection.callback = callback
+        return "tag"
+
+    def basic_cancel(self, tag):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties, mandatory):
+        self.log.append(("publish", routing_key, json.loads(body), properties.priority))
+
+    def basic_ack(self, delivery_tag):
+        self.log.append(("ack", delivery_tag))
+
+    def basic_nack(self, delivery_tag, requeue):
+        self.log.append(("nack", delivery_tag, requeue))
+
+    def close(self):
+        self.is_open = False
+
+
+class FakeConnection:
+    """Delivers messages on the first process_data_events, then runs the callbacks
+    handler threads schedule until every message is settled"""
+
+    def __init__(self, messages, plain_queues=()):
+        self.messages = messages
+        self.plain_queues = set(plain_queues)
+        self.log = []
+        self.callback = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._channel = FakeChannel(self)
+
+    def channel(self):
+        if self.callback is None and self._channel.log:
+            return FakeChannel(self)  # a throwaway probe channel
+        return self._channel
+
+    def add_callback_threadsafe(self, fn):
+        with self._lock:
+            self._callbacks.append(fn)
+
+    def process_data_events(self, time_limit=0):
+        while self.messages:
+            tag, redelivered, body, priority = self.messages.pop(0)
+            self.callback(self._channel, SimpleNamespace(delivery_tag=tag, redelivered=redelivered),
+                          SimpleNamespace(priority=priority), json.dumps(body).encode())
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn()
+        settled = [e for e in self.log if e[0] in ("ack", "nack")]
+        if len(settled) == self.expected:
+            raise KeyboardInterrupt  # stops consume()
+
+    def close(self):
+        pass
+
+
+def _consume(monkeypatch, handler, messages, plain_queues=()):
+    conn = FakeConnection(list(messages), plain_queues)
+    conn.expected = len(messages)
+    monkeypatch.setattr(events.pika, "BlockingConnection", lambda params: conn)
+    monkeypatch.setattr(events.signal, "signal", lambda *a: None)
+    monkeypatch.setattr(events, "_queue_args", {})
+    events.consume("jobs", handler)
+    return [e for e in conn.log if e[0] != "declare"], conn.log
+
+
+def test_follow_ups_are_published_before_the_ack(monkeypatch):
+    def handler(event, redelivered):
+        return [("next", {"n": event["n"] + 1})]
+    log, _ = _consume(monkeypatch, handler, [(1, False, {"n": 1}, 9)])
+    assert [e[0] for e in log] == ["publish", "ack"]
+    _, queue, payload, priority = log[0]
+    # with the incoming message's priority
+    assert queue == "next" and payload["n"] == 2 and payload["event"] == "next" and priority == 9
+
+
+def test_failed_message_is_requeued_once_then_parked(monkeypatch):
+    seen = []
+
+    def handler(event, redelivered):
+        seen.append(redelivered)
+        raise RuntimeError("boom")
+    log, _ = _consume(monkeypatch, handler, [(1, False, {"n": 1}, 5), (2, True, {"n": 1}, 5)])
+    assert seen == [False, True]
+    assert ("nack", 1, True) in log
+    parked = [e for e in log if e[0] == "publish"]
+    assert len(parked) == 1 and parked[0][1] == "jobs" + events.FAILED_SUFFIX
+    assert parked[0][2]["original"] == {"n": 1} and "boom" in parked[0][2]["error"]
+    # parked, then acked so it stops coming back
+    assert log.index(parked[0]) < log.index(("ack", 2))
+    assert not any(e[0] == "publish" and e[1] != "jobs" + events.FAILED_SUFFIX for e in log)
+
+
+def test_handler_without_follow_ups_only_acks(monkeypatch):
+    log, declared = _consume(monkeypatch, lambda event, redelivered: None, [(7, False, {}, 1)])
+    assert log == [("ack", 7)]
+    assert ("declare", "jobs", {"x-max-priority": events.MAX_PRIORITY}) in declared
+    assert ("declare", "jobs" + events.FAILED_SUFFIX, None) in declared
+
+
+def test_queue_without_priorities_is_used_as_a_plain_queue(monkeypatch, caplog):
+    log, declared = _consume(monkeypatch, lambda event, redelivered: None, [(1, False, {}, 1)],
+                             plain_queues=["jobs"])
+    assert log == [("ack", 1)]
+    assert ("declare", "jobs", None) in declared
+    assert "without x-max-priority" in caplog.text
@@ -0,0 +1,152 @@
+# tests/test_features.py
+# Encoding, binning and the stats sidecar of a preprocessing run, and the
+# predictor's transform reproducing the features it was trained on
+import numpy as np
+import pandas as pd
+import pytest
+
+from common import stats
+from common.binned import apply_bins, fit_edges, load_binned, write_binned
+from common.dataset import current_run_dir, load_artifacts, read_features
+from predictor.bundle import load_bundle, transform
+from predictor.train import model_path, train_and_save
+from preprocessor.preprocess import _code_dtype, run_preprocessing
+
+ROWS = 200
+TARGET = "Yield_tons_per_hectare"
+
+
+def _frame(n: int = ROWS, crops=("Wheat", "Rice", "Maize"), seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    i = np.arange(n)
+    return pd.DataFrame({
+        "Region": np.array(["North", "South", "East", "West"])[i % 4],
+        "Soil_Type": np.array(["Sandy", "Loam", "Clay"])[i % 3],
+        "Crop": np.array(crops)[i % len(crops)],
+        "Rainfall_mm": rng.uniform(100, 1500, n).round(1),
+        "Temperature_Celsius": rng.uniform(10, 40, n).round(1),
+        "Fertilizer_Used": i % 2 == 0,
+        "Irrigation_Used": i % 3 == 0,
+        "Weather_Condition": np.array(["Sunny", "Rainy", "Cloudy"])[i % 3],
+        "Days_to_Harvest": 60 + i % 100,
+        TARGET: rng.uniform(1, 8, n).round(2),
+    })
+
+
+def _write(tmp_path, df: pd.DataFrame, name: str) -> str:
+    path = tmp_path / name
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats_cache(monkeypatch):
+    monkeypatch.setattr(stats, "_cache", {})
+
+
+def test_vocabulary_is_the_sorted_union_and_stable_across_runs(tmp_path):
+    a = _write(tmp_path, _frame(), "a.csv")
+    # another file: a crop the first one lacks, and no weather column at all
+    b = _write(tmp_path, _frame(60, crops=("Cotton", "Wheat")).drop(columns=["Weather_Condition"]), "b.csv")
+    run_preprocessing(raw_paths=[a, b], workers=2)
+    enc = load_artifacts(current_run_dir())["encoders"]
+    assert enc["Crop"] == {"Cotton": 0, "Maize": 1, "Rice": 2, "Wheat": 3}
+    assert enc["Weather_Condition"] == {"Cloudy": 0, "Rainy": 1, "Sunny": 2}
+
+    df = read_features()
+    assert len(df) == ROWS + 60
+    assert all(df[c].dtype == np.int8 for c in enc)
+    # rows from the file without the column are coded -1 (missing)
+    assert (df["Weather_Condition"] == -1).sum() == 60
+
+    # same inputs in the other order: same codes
+    first = current_run_dir().name
+    run_preprocessing(raw_paths=[b, a], workers=2, force=True)
+    assert current_run_dir().name != first
+    assert load_artifacts(current_run_dir())["encoders"] == enc
+
+
+def test_code_width_follows_the_vocabulary_size():
+    assert _code_dtype(4) == np.int8
+    assert _code_dtype(126) == np.int8
+    assert _code_dtype(127) == np.int16
+    assert _code_dtype(40_000) == np.int32
+
+
+def test_bins():
+    low = np.array([0.0, 1.0, 2.0, np.nan, 1.0])
+    edges = fit_edges(low)
+    # one bin per distinct value, 0 for missing
+    np.testing.assert_array_equal(edges, [0.5, 1.5])
+    codes = apply_bins(pd.DataFrame({"x": low}), {"columns": ["x", "gone"], "edges": {"x": edges.tolist()},
+                                                  "dtype": "uint8"})
+    assert codes.dtype == np.uint8
+    np.testing.assert_array_equal(codes[:, 0], [1, 2, 3, 0, 2])
+    assert not codes[:, 1].any()  # a column the frame doesn't have is all missing
+
+    high = np.random.default_rng(0).normal(size=5000)
+    edges = fit_edges(high, max_bins=16)
+    assert len(edges) <= 14
+    codes = apply_bins(pd.DataFrame({"x": np.sort(high)}), {"columns": ["x"], "edges": {"x": edges.tolist()},
+                                                            "dtype": "uint8"})[:, 0]
+    assert codes.min() == 1 and codes.max() <= 15 and (np.diff(codes.astype(int)) >= 0).all()
+
+
+def test_stored_matrix_matches_apply_bins(tmp_path):
+    df = pd.DataFrame({"a": [0.5, 2.0, np.nan, 7.0], "b": [1, 0, 1, 1], "y": [1.0, 2.0, 3.0, 4.0]})
+    write_binned(df, ["a", "b"], "y", tmp_path)
+    X, y, binning = load_binned(tmp_path)
+    assert X.dtype == np.uint8 and isinstance(X, np.memmap)
+    np.testing.assert_array_equal(X, apply_bins(df, binning))
+    np.testing.assert_array_equal(y, df["y"].to_numpy(dtype=np.float32))
+
+
+def _rows(X) -> np.ndarray:
+    """Rows in a canonical order, for comparing matrices whose row order differs"""
+    X = np.round(np.asarray(X, dtype=np.float64), 4)
+    return X[np.lexsort(X.T[::-1])]
+
+
+def test_transform_reproduces_the_training_features(tmp_path):
+    raw = _frame()
+    run_preprocessing(_write(tmp_path, raw, "raw.csv"))
+    run_dir = current_run_dir()
+
+    train_and_save(binned=False)
+    bundle = load_bundle(model_path())
+    assert bundle["run_id"] == run_dir.name and bundle["binning"] is None
+    features = read_features().drop(columns=[TARGET])
+    assert bundle["feature_columns"] == features.columns.tolist()
+    # the features dataset is partitioned, so only the set of rows is comparable
+    X = transform(bundle, raw)
+    np.testing.assert_allclose(_rows(X), _rows(features), atol=1e-3)
+
+    train_and_save(binned=True)
+    binned = load_bundle(model_path())
+    codes, _, binning = load_binned(run_dir)
+    assert binned["binning"] == binning and binned["feature_columns"] == binning["columns"]
+    # the bin-code matrix keeps the input's row order
+    np.testing.assert_array_equal(transform(binned, raw), codes)
+    np.testing.assert_array_equal(apply_bins(X, binning), codes)
+
+
+def test_stats_sidecar_and_footer_summary(tmp_path):
+    raw = _frame()
+    run_preprocessing(_write(tmp_path, raw, "raw.csv"))
+    summary = stats.dataset_summary()
+    assert summary["run_id"] == current_run_dir().name and summary["rows"] == ROWS
+    cols = summary["stats"]["columns"]
+    assert cols["Crop"]["frequencies"] == raw["Crop"].value_counts().to_dict()
+    # original units, not the scaled values that are stored
+    assert cols["Rainfall_mm"]["min"] == raw["Rainfall_mm"].min()
+    assert cols["Rainfall_mm"]["max"] == raw["Rainfall_mm"].max()
+    assert cols["Fertilizer_Used"] == {"kind": "bool", "nulls": 0, "true": int(raw["Fertilizer_Used"].sum())}
+    assert sum(p["rows"] for p in summary["stats"]["partitions"]) == ROWS
+    assert sum(summary["stats"]["target_histogram"]["counts"]) == ROWS
+    assert summary["stored"][TARGET]["min"] == pytest.approx(raw[TARGET].min())
+
+    wheat = stats.dataset_summary(crop="Wheat")
+    n = int((raw["Crop"] == "Wheat").sum())
+    # from the footers of the matching partitions and the per-partition histograms
+    assert wheat["rows"] == n and sum(wheat["stats"]["target_histogram"]["counts"]) == n
+    assert {p["crop"] for p in wheat["stats"]["partitions"]} == {"Wheat"}
@@ -0,0 +1,86 @@
+# tests/test_history.py
+from pathlib import Path
+
+import pytest
+
+from common import history
+
+
+@pytest.fixture
+def unwritable_db(monkeypatch):
+    # a regular file where the database directory should be
+    Path("blocker").write_text("")
+    monkeypatch.setattr(history, "DB_PATH", Path("blocker/history.db"))
+
+
+def test_tracked_work_succeeds_without_a_history_db(unwritable_db, caplog):
+    with history.track("train", "run-1") as rec:
+        rec.update(rows=10, output={"ok": True})
+        result = 42
+    assert result == 42
+    assert "Could not record train start" in caplog.text
+
+
+def test_tracked_failure_is_still_raised_without_a_history_db(unwritable_db):
+    with pytest.raises(RuntimeError, match="boom"):
+        with history.track("train"):
+            raise RuntimeError("boom")
+
+
+def test_history_failing_after_the_start_does_not_fail_the_work(monkeypatch, caplog):
+    history.init_db()
+    real = history.transaction
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) > 1:
+            raise OSError("disk full")
+        return real()
+    monkeypatch.setattr(history, "transaction", flaky)
+    with history.track("preprocess", "run-1") as rec:
+        rec.update(rows="not a number")  # would break the rate calculation too
+    assert "Could not record preprocess result" in caplog.text
+    row = history.list_stage_runs()["stages"][0]
+    assert row["stage"] == "preprocess" and row["status"] == "running"
+
+
+def test_tracked_run_is_recorded():
+    with history.track("train", "run-1", "api") as rec:
+        rec.update(rows=100, peak_rss_mb=12.5, output={"rmse": 0.2})
+    with pytest.raises(ValueError):
+        with history.track("train", "run-2"):
+            raise ValueError("bad features")
+    failed, ok = history.list_stage_runs()["stages"]
+    assert ok["status"] == "succeeded" and ok["rows"] == 100 and ok["trigger"] == "api"
+    assert ok["output"] == {"rmse": 0.2} and ok["rows_per_sec"] and ok["peak_rss_mb"] == 12.5
+    assert failed["status"] == "failed" and failed["error"] == "bad features"
+
+
+def _record(run_id, stage, started_at, seconds, status="succeeded", cache_hit=False):
+    history.record_stage(run_id, stage, status, cache_hit=cache_hit, started_at=started_at, seconds=seconds)
+
+
+def test_trends_bucket_by_time_prefix():
+    history.init_db()
+    _record("a", "train", "2026-01-01T10:05:00.000000Z", 10)
+    _record("b", "train", "2026-01-01T10:55:00.000000Z", 20, status="failed")
+    _record("c", "train", "2026-01-01T10:58:00.000000Z", None, cache_hit=True)
+    _record("d", "train", "2026-01-01T11:10:00.000000Z", 30)
+    _record("d", "collect", "2026-01-01T11:00:00.000000Z", 1)
+    _record("e", "train", "2026-01-02T09:00:00.000000Z", 40)
+
+    hourly = history.trends(bucket="hour", stage="train")
+    assert [(t["bucket"], t["runs"]) for t in hourly] == [
+        ("2026-01-01T10", 3), ("2026-01-01T11", 1), ("2026-01-02T09", 1)]
+    first = hourly[0]
+    assert first["failed"] == 1 and first["cache_hits"] == 1
+    assert first["avg_seconds"] == 15  # cache hits don't count towards durations
+
+    daily = history.trends(bucket="day")
+    assert [(t["bucket"], t["stage"], t["runs"]) for t in daily] == [
+        ("2026-01-01", "collect", 1), ("2026-01-01", "train", 4), ("2026-01-02", "train", 1)]
+    assert [t["bucket"] for t in history.trends(bucket="minute", since="2026-01-01T10:50", until="2026-01-01T11")] \
+        == ["2026-01-01T10:55", "2026-01-01T10:58"]
+    with pytest.raises(ValueError):
+        history.trends(bucket="week")
@@ -0,0 +1,72 @@
+# tests/test_preprocess.py
+import json
+
+import pandas as pd
+import pytest
+
+from common import dataset
+from preprocessor.preprocess import run_preprocessing
+
+HEADER = ("Region,Soil_Type,Crop,Rainfall_mm,Temperature_Celsius,Fertilizer_Used,"
+          "Irrigation_Used,Weather_Condition,Days_to_Harvest,Yield_tons_per_hectare\n")
+GOOD = [
+    "West,Sandy,Wheat,800,25,True,True,Sunny,120,3.2",
+    "East,Loam,Rice,1200,28,True,False,Cloudy,140,4.1",
+    "North,Clay,Soybean,600,22,False,True,,110,2.8",
+    "South,Silt,Barley,900,26,True,True,,130,3.6",
+    "west,sandy,wheat,850,24,False,False,,125,3.0",
+]
+BAD = {
+    5: ("East,Loam,Rice,-5,28,True,False,Cloudy,140,4.1", "range:Rainfall_mm"),
+    6: ("East,Loam,Banana,1000,28,True,False,Cloudy,140,4.1", "category:Crop"),
+    7: ("East,Loam,Rice,1000,hot,True,False,Cloudy,140,4.1", "unparseable:Temperature_Celsius"),
+    8: ("East,Loam,Rice,1000,28,True,False,Cloudy,140,", "null:Yield_tons_per_hectare"),
+    9: ("Mars,Loam,Rice,1000,28,True,False,Cloudy,400,4.1", "range:Days_to_Harvest;category:Region"),
+}
+
+
+def _raw(tmp_path, lines, name="raw.csv") -> str:
+    path = tmp_path / name
+    path.write_text(HEADER + "\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_bad_rows_are_quarantined_with_their_reasons(tmp_path):
+    res = run_preprocessing(_raw(tmp_path, GOOD + [line for line, _ in BAD.values()]))
+    v = res["validation"]
+    assert (v["rows"], v["accepted"], v["rejected"]) == (10, 5, 5)
+    assert v["rules"]["range:Rainfall_mm"] == 1 and v["rules"]["category:Crop"] == 1
+    assert v["rules"]["unparseable:Temperature_Celsius"] == 1 and v["rules"]["null:Yield_tons_per_hectare"] == 1
+    assert v["rules"]["range:Days_to_Harvest"] == 1 and v["rules"]["category:Region"] == 1
+    # a category is missing in 3 of 10 rows, over the 20% limit
+    assert v["nulls"]["Weather_Condition"] == 3 and v["null_ratio"]["Weather_Condition"] == 0.3
+    assert v["null_ratio_violations"] == ["Weather_Condition"]
+
+    run_dir = dataset.current_run_dir()
+    assert res["run_id"] == run_dir.name
+    manifest = json.loads((run_dir / "manifest.json").read_text())
+    assert manifest["validation"]["rejected"] == 5 and manifest["validation"]["quarantine_path"] == str(
+        run_dir / "quarantine")
+
+    q = pd.read_parquet(next((run_dir / "quarantine").glob("*.parquet"))).sort_values("source_row")
+    assert q["source_row"].tolist() == sorted(BAD)
+    assert dict(zip(q["source_row"], q["reject_reasons"])) == {row: reason for row, (_, reason) in BAD.items()}
+    # the original values are kept, as text
+    assert q.set_index("source_row").loc[7, "Temperature_Celsius"] == "hot"
+    assert set(q["source_file"]) == {str(tmp_path / "raw.csv")}
+
+    features = pd.read_parquet(res["features_path"])
+    assert len(features) == 5
+
+
+def test_clean_input_has_no_quarantine(tmp_path):
+    res = run_preprocessing(_raw(tmp_path, GOOD[:2]))
+    assert res["validation"]["rejected"] == 0 and "quarantine_path" not in res["validation"]
+    assert not (dataset.current_run_dir() / "quarantine").exists()
+
+
+def test_input_without_valid_rows_fails_and_publishes_nothing(tmp_path):
+    with pytest.raises(ValueError, match="no valid rows"):
+        run_preprocessing(_raw(tmp_path, [line for line, _ in BAD.values()]))
+    assert dataset.current_run_dir() is None
+    assert not list((dataset.PROCESSED_DIR / "runs").iterdir())
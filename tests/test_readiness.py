@@ -0,0 +1,107 @@
+# tests/test_readiness.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from common import readiness
+from common.readiness import wait_ready
+
+
+class FakeServices:
+    """requests.get stand-in: per URL, a response delay and how many attempts fail first"""
+
+    def __init__(self, delay=None, failures=None, down=()):
+        self.delay = delay or {}
+        self.failures = dict(failures or {})
+        self.down = set(down)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout):
+        with self._lock:
+            self.calls.append((url, timeout))
+            attempt = sum(1 for u, _ in self.calls if u == url)
+        time.sleep(self.delay.get(url, 0))
+        if url in self.down:
+            raise requests.ConnectionError(url)
+        ok = attempt > self.failures.get(url, 0)
+        return SimpleNamespace(ok=ok, status_code=200 if ok else 503)
+
+    def attempts(self, url) -> int:
+        return sum(1 for u, _ in self.calls if u == url)
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    """The backoff caps asked for; sleeps are skipped"""
+    caps = []
+
+    def uniform(lo, hi):
+        caps.append(hi)
+        return 0.0
+    monkeypatch.setattr(readiness.random, "uniform", uniform)
+    return caps
+
+
+def _serve(monkeypatch, **kw) -> FakeServices:
+    services = FakeServices(**kw)
+    monkeypatch.setattr(readiness.requests, "get", services.get)
+    return services
+
+
+def test_a_slow_service_does_not_hold_up_the_others(monkeypatch):
+    _serve(monkeypatch, delay={"http://slow/health": 0.6})
+    seen = {}
+    res = wait_ready({"slow": "http://slow/health", "a": "http://a/health", "b": "http://b/health"},
+                     deadline=5, on_update=lambda name, r: seen.setdefault(name, time.perf_counter()))
+    assert res["ready"] and set(res["services"]) == {"slow", "a", "b"}
+    assert res["seconds"] < 1.0  # as slow as the slowest, not the sum
+    assert seen["a"] < seen["slow"] - 0.4 and seen["b"] < seen["slow"] - 0.4
+    assert res["services"]["slow"]["latency_ms"] >= 600
+
+
+def test_retries_back_off_with_full_jitter_until_ready(monkeypatch, jitter):
+    services = _serve(monkeypatch, failures={"http://x/health": 3})
+    res = wait_ready({"x": "http://x/health"}, deadline=30)
+    assert res["ready"] and res["services"]["x"]["attempts"] == 4
+    assert jitter == [readiness.BASE_DELAY, 2 * readiness.BASE_DELAY, 4 * readiness.BASE_DELAY]
+    assert services.attempts("http://x/health") == 4
+
+
+def test_backoff_is_capped(monkeypatch, jitter):
+    _serve(monkeypatch, failures={"http://x/health": 8})
+    wait_ready({"x": "http://x/health"}, deadline=30)
+    assert max(jitter) == readiness.MAX_DELAY
+
+
+def test_gives_up_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(readiness, "BASE_DELAY", 0.05)
+    _serve(monkeypatch, down={"http://x/health"})
+    started = time.perf_counter()
+    res = wait_ready({"x": "http://x/health", "y": "http://y/health"}, deadline=0.5)
+    assert time.perf_counter() - started < 1.0
+    assert not res["ready"] and res["services"]["y"]["ready"]
+    x = res["services"]["x"]
+    assert x["attempts"] > 1 and x["error"] == "ConnectionError" and x["waited_seconds"] <= 0.5
+
+
+def test_deadline_zero_probes_once_with_the_full_timeout(monkeypatch):
+    services = _serve(monkeypatch, failures={"http://x/health": 5})
+    res = wait_ready({"x": "http://x/health", "y": "http://y/health"}, deadline=0, timeout=3)
+    assert services.attempts("http://x/health") == services.attempts("http://y/health") == 1
+    assert {t for _, t in services.calls} == {3}
+    assert not res["ready"] and res["services"]["x"]["error"] == "HTTP 503" and res["services"]["y"]["ready"]
+
+
+def test_a_service_can_have_its_own_deadline(monkeypatch, jitter):
+    services = _serve(monkeypatch, failures={"http://x/health": 2, "http://y/health": 2})
+    res = wait_ready({"x": {"url": "http://x/health", "deadline": 0}, "y": "http://y/health"}, deadline=30)
+    assert services.attempts("http://x/health") == 1 and not res["services"]["x"]["ready"]
+    assert res["services"]["y"]["ready"] and res["services"]["y"]["attempts"] == 3
+
+
+def test_no_services_is_ready():
+    assert wait_ready({}) == {"ready": True, "seconds": 0.0, "services": {}}
@@ -0,0 +1,103 @@
+# tests/test_resumable.py
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from common import catalog
+from data_collector import collector, resumable
+from data_collector.collector import InvalidUpload
+
+DATA = b"Region,Crop,Rainfall_mm\n" + b"".join(b"East,Rice,%d\n" % i for i in range(200))
+SHA = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def csv_format(monkeypatch):
+    monkeypatch.setattr(collector, "RAW_FORMAT", "csv")
+
+
+def _put(upload_id: str, offset: int, body: bytes, block: int = 100, fail_after: int | None = None) -> dict:
+    """PUT body at offset; fail_after drops the connection after that many bytes"""
+    async def blocks():
+        for i in range(0, len(body), block):
+            if fail_after is not None and i >= fail_after:
+                raise ConnectionResetError("client went away")
+            yield body[i:i + block]
+    return asyncio.run(resumable.write_chunk(upload_id, offset, blocks()))
+
+
+def _upload(sha256: str | None = SHA) -> str:
+    return resumable.initiate("crops.csv", len(DATA), sha256)["upload_id"]
+
+
+def test_chunks_out_of_order_complete_the_file():
+    upload_id = _upload()
+    third, half = len(DATA) // 3, len(DATA) // 2
+    st = _put(upload_id, half, DATA[half:])
+    assert st["missing"] == [[0, half]] and not st["complete"]
+    # overlapping the range already received
+    _put(upload_id, third, DATA[third:half + 50])
+    st = _put(upload_id, 0, DATA[:third])
+    assert st["complete"] and st["received"] == [[0, len(DATA)]] and st["received_bytes"] == len(DATA)
+
+    res = resumable.complete(upload_id)
+    assert not res["deduplicated"] and res["sha256"] == SHA
+    with open(res["path"], "rb") as f:
+        assert f.read() == DATA
+    assert catalog.lookup(SHA)["source"] == "resumable:crops.csv"
+    assert not os.path.exists(resumable.UPLOADS_DIR / upload_id)
+
+
+def test_retry_from_first_missing_byte_after_a_disconnect():
+    upload_id = _upload()
+    with pytest.raises(ConnectionResetError):
+        _put(upload_id, 0, DATA, fail_after=700)
+    st = resumable.status(upload_id)
+    # the blocks written before the drop are kept
+    assert st["received"] == [[0, 700]] and st["missing"] == [[700, len(DATA)]]
+    with pytest.raises(InvalidUpload, match="incomplete"):
+        resumable.complete(upload_id)
+
+    resume = st["missing"][0][0]
+    assert _put(upload_id, resume, DATA[resume:])["complete"]
+    with open(resumable.complete(upload_id)["path"], "rb") as f:
+        assert f.read() == DATA
+
+
+def test_checksum_mismatch_is_refused_and_the_upload_kept():
+    upload_id = _upload(sha256=None)
+    _put(upload_id, 0, DATA)
+    with pytest.raises(InvalidUpload, match="sha256"):
+        resumable.complete(upload_id)
+    with pytest.raises(InvalidUpload, match="Checksum mismatch"):
+        resumable.complete(upload_id, "0" * 64)
+    assert catalog.lookup(SHA) is None
+    # the right checksum still completes it
+    assert resumable.complete(upload_id, SHA.upper())["sha256"] == SHA
+
+
+def test_duplicate_payload_is_not_stored_twice():
+    first = _upload()
+    _put(first, 0, DATA)
+    stored = resumable.complete(first)
+    second = _upload()
+    _put(second, 0, DATA)
+    assert resumable.complete(second) == collector._deduplicated(stored["path"], SHA)
+
+
+def test_chunk_outside_the_file_is_rejected():
+    upload_id = _upload()
+    with pytest.raises(InvalidUpload, match="past the declared size"):
+        _put(upload_id, len(DATA) - 10, DATA[:20])
+    with pytest.raises(InvalidUpload, match="Offset"):
+        _put(upload_id, len(DATA), b"x")
+
+
+def test_non_csv_first_chunk_drops_the_upload():
+    upload_id = resumable.initiate("crops.csv", 1000)["upload_id"]
+    with pytest.raises(InvalidUpload):
+        _put(upload_id, 0, b"\x00\x01binary" * 10)
+    with pytest.raises(resumable.UploadNotFound):
+        resumable.status(upload_id)
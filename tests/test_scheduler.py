@@ -0,0 +1,230 @@
+# tests/test_scheduler.py
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from common.scheduler import (BULK, INTERACTIVE, MARK_STALE_SECONDS, Scheduler, interactive_elsewhere,
+                              work_class, yield_to_interactive)
+
+
+def test_work_class_header():
+    assert work_class(None) == INTERACTIVE
+    assert work_class(" Bulk ") == BULK
+    assert work_class("", default=BULK) == BULK
+    with pytest.raises(ValueError):
+        work_class("urgent")
+
+
+def test_bulk_work_does_not_hold_interactive_slots():
+    s = Scheduler(concurrency={INTERACTIVE: 1, BULK: 1})
+    release = threading.Event()
+
+    async def main():
+        bulk = asyncio.ensure_future(s.run(BULK, release.wait, 5))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        assert await s.run(INTERACTIVE, lambda: "fast") == "fast"
+        took = time.perf_counter() - started
+        release.set()
+        await bulk
+        return took
+
+    assert asyncio.run(main()) < 0.5
+    stats = s.stats()["classes"]
+    assert stats[INTERACTIVE]["completed"] == stats[BULK]["completed"] == 1
+    assert stats[BULK]["queued"] == stats[BULK]["running"] == 0
+
+
+def test_failures_are_counted_and_raised():
+    s = Scheduler()
+
+    def boom():
+        raise KeyError("x")
+    with pytest.raises(KeyError):
+        asyncio.run(s.run(INTERACTIVE, boom))
+    assert s.stats()["classes"][INTERACTIVE]["failed"] == 1
+
+
+def test_checkpoint_returns_at_once_when_idle():
+    s = Scheduler()
+    started = time.perf_counter()
+    s.checkpoint()
+    assert time.perf_counter() - started < 0.1
+    assert s.stats()["preemptions"] == 0
+
+
+def test_checkpoint_waits_for_interactive_work():
+    s = Scheduler(max_pause=5)
+    paused = []
+
+    def bulk():
+        time.sleep(0.05)  # interactive work arrives meanwhile
+        started = time.perf_counter()
+        s.checkpoint()
+        paused.append(time.perf_counter() - started)
+
+    async def main():
+        job = asyncio.ensure_future(s.run(BULK, bulk))
+        await s.run(INTERACTIVE, time.sleep, 0.3)
+        await job
+
+    asyncio.run(main())
+    assert 0.1 < paused[0] < 1
+    assert s.stats()["preemptions"] == 1
+
+
+def test_checkpoint_pause_is_bounded():
+    s = Scheduler(max_pause=0.1)
+    release = threading.Event()
+
+    async def main():
+        interactive = asyncio.ensure_future(s.run(INTERACTIVE, release.wait, 5))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        await s.run(BULK, s.checkpoint)
+        took = time.perf_counter() - started
+        release.set()
+        await interactive
+        return took
+
+    assert asyncio.run(main()) < 0.5
+
+
+def _gather(s, n, fn, *args):
+    """Submit n calls at once; results or the HTTPException each one got"""
+    async def one():
+        try:
+            return await s.run(INTERACTIVE, fn, *args)
+        except HTTPException as e:
+            return e
+    async def main():
+        return await asyncio.gather(*[one() for _ in range(n)])
+    return asyncio.run(main())
+
+
+def test_full_queue_is_shed_at_once():
+    s = Scheduler(concurrency={INTERACTIVE: 1}, max_queue={INTERACTIVE: 2}, max_wait={INTERACTIVE: 10})
+    started = time.perf_counter()
+    results = _gather(s, 5, time.sleep, 0.1)
+    shed = [r for r in results if isinstance(r, HTTPException)]
+    assert len(shed) == 2  # 1 running + 2 queued admitted
+    assert all(e.status_code == 503 and int(e.headers["Retry-After"]) >= 1 for e in shed)
+    assert time.perf_counter() - started < 1
+    stats = s.stats()["classes"][INTERACTIVE]
+    assert stats["rejected"] == {"queue_full": 2, "expected_wait": 0, "wait_timeout": 0}
+    assert stats["completed"] == 3
+    assert stats["queued"] == stats["running"] == 0 and stats["oldest_wait_ms"] is None
+
+
+def test_request_that_would_wait_too_long_is_shed():
+    s = Scheduler(concurrency={INTERACTIVE: 1}, max_queue={INTERACTIVE: 50}, max_wait={INTERACTIVE: 0.5})
+    _gather(s, 1, time.sleep, 0.2)  # learn the run time
+
+    async def main():
+        running = asyncio.ensure_future(s.run(INTERACTIVE, time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        results = await asyncio.gather(*[s.run(INTERACTIVE, time.sleep, 0.2) for _ in range(4)],
+                                       return_exceptions=True)
+        await running
+        return results
+
+    shed = [r for r in asyncio.run(main()) if isinstance(r, HTTPException)]
+    # behind the running call, a 1st and 2nd queued call wait ~0.2s and ~0.4s; a 3rd would wait 0.6s
+    assert len(shed) == 2
+    assert s.stats()["classes"][INTERACTIVE]["rejected"]["expected_wait"] == 2
+
+
+def test_request_still_queued_after_max_wait_is_shed():
+    s = Scheduler(concurrency={INTERACTIVE: 1}, max_queue={INTERACTIVE: 10}, max_wait={INTERACTIVE: 0.2})
+    calls = []
+
+    def work(seconds):
+        calls.append(seconds)
+        time.sleep(seconds)
+
+    async def main():
+        first = asyncio.ensure_future(s.run(INTERACTIVE, work, 0.5))  # no run times known yet
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as e:
+            await s.run(INTERACTIVE, work, 0)
+        await first
+        return e.value
+
+    err = asyncio.run(main())
+    assert err.status_code == 503 and "Retry-After" in err.headers
+    assert calls == [0.5]  # the expired request never ran
+    stats = s.stats()["classes"][INTERACTIVE]
+    assert stats["rejected"]["wait_timeout"] == 1 and stats["queued"] == 0
+
+
+def test_retry_after_follows_the_backlog():
+    s = Scheduler(concurrency={INTERACTIVE: 1}, max_queue={INTERACTIVE: 0}, max_wait={INTERACTIVE: 60})
+    _gather(s, 1, time.sleep, 1.2)  # learn the run time
+
+    async def main():
+        running = asyncio.ensure_future(s.run(INTERACTIVE, time.sleep, 1.2))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as e:
+            await s.run(INTERACTIVE, time.sleep, 0)
+        await running
+        return e.value
+
+    assert asyncio.run(main()).headers["Retry-After"] == "2"  # ceil(1.2s)
+
+
+def test_overload_is_a_503_over_http():
+    s = Scheduler(concurrency={INTERACTIVE: 1}, max_queue={INTERACTIVE: 0})
+    release = threading.Event()
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        return await s.run(INTERACTIVE, release.wait, 5)
+
+    with TestClient(app) as client:
+        busy = threading.Thread(target=client.get, args=("/work",))
+        busy.start()
+        while s.stats()["classes"][INTERACTIVE]["running"] == 0:
+            time.sleep(0.01)
+        r = client.get("/work")
+        release.set()
+        busy.join()
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+    assert "retry later" in r.json()["detail"]
+
+
+def test_interactive_work_is_marked_for_other_processes(tmp_path):
+    marks = str(tmp_path / "marks")
+    s = Scheduler(mark_dir=marks)
+    assert not interactive_elsewhere(marks)
+    seen = _gather(s, 2, lambda: interactive_elsewhere(marks))
+    assert seen == [True, True]
+    # cleared once nothing interactive is in flight
+    assert not interactive_elsewhere(marks) and not os.listdir(marks)
+    asyncio.run(s.run(BULK, time.sleep, 0))
+    assert not os.listdir(marks)
+
+
+def test_stale_marker_is_ignored(tmp_path):
+    (tmp_path / "4242").touch()
+    assert interactive_elsewhere(str(tmp_path))
+    old = time.time() - MARK_STALE_SECONDS - 1
+    os.utime(tmp_path / "4242", (old, old))
+    assert not interactive_elsewhere(str(tmp_path))
+    assert yield_to_interactive(directory=str(tmp_path)) == 0.0
+
+
+def test_yield_waits_for_interactive_work_elsewhere_up_to_max_pause(tmp_path):
+    marker = tmp_path / "4242"
+    marker.touch()
+    threading.Timer(0.2, marker.unlink).start()
+    paused = yield_to_interactive(max_pause=5, directory=str(tmp_path))
+    assert 0.15 < paused < 1
+    marker.touch()
+    assert 0.2 <= yield_to_interactive(max_pause=0.2, directory=str(tmp_path)) < 0.5
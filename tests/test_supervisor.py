@@ -0,0 +1,81 @@
+# tests/test_supervisor.py
+import pytest
+
+from orchestrator import supervisor
+from orchestrator.supervisor import WorkerPool
+
+
+class FakeWorker:
+    pid = 0
+
+    def __init__(self):
+        self.terminated = False
+
+    def poll(self):
+        return 0 if self.terminated else None
+
+    def terminate(self):
+        self.terminated = True
+
+
+def _pool(workers: int = 0, **kw) -> WorkerPool:
+    pool = WorkerPool("predictor.worker", "features_ready", **{"min_workers": 1, "max_workers": 4,
+                                                                "per_worker": 2, "max_age": 60, **kw})
+    pool.workers = [FakeWorker() for _ in range(workers)]
+    return pool
+
+
+def _stats(depth, age=None) -> dict:
+    return {"queue": "features_ready", "depth": depth, "oldest_age_seconds": age, "consumers": None}
+
+
+def test_pool_follows_the_backlog_within_bounds():
+    pool = _pool(2)
+    assert pool.desired(_stats(0)) == 1      # never below min
+    assert pool.desired(_stats(3)) == 2      # 2 messages per worker
+    assert pool.desired(_stats(8)) == 4
+    assert pool.desired(_stats(100)) == 4    # never above max
+    assert _pool(0, min_workers=0).desired(_stats(0)) == 0
+
+
+def test_old_messages_add_a_worker():
+    pool = _pool(2)
+    assert pool.desired(_stats(2, age=10)) == 1
+    assert pool.desired(_stats(2, age=61)) == 3
+    assert _pool(4).desired(_stats(2, age=61)) == 4
+    # an empty queue has nothing waiting, whatever the age field says
+    assert pool.desired(_stats(0, age=600)) == 1
+
+
+def test_unknown_backlog_holds_the_pool():
+    assert _pool(3).desired(None) == 3
+    assert _pool(3).desired(_stats(None)) == 3
+    assert _pool(0).desired(None) == 1
+
+
+def test_bounds_are_checked():
+    with pytest.raises(ValueError):
+        WorkerPool("m", "q", min_workers=3, max_workers=2)
+    with pytest.raises(ValueError):
+        WorkerPool("m", "q", min_workers=0, max_workers=0)
+
+
+def test_step_grows_at_once_and_shrinks_after_the_cooldown(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(supervisor.time, "monotonic", lambda: now[0])
+    pool = _pool(1, cooldown=120)
+    monkeypatch.setattr(pool, "_spawn", lambda: pool.workers.append(FakeWorker()))
+    assert pool.step(_stats(7)) == 4
+    assert pool.step(_stats(0)) == 4         # low since now
+    now[0] += 119
+    assert pool.step(_stats(0)) == 4
+    now[0] += 1
+    draining = pool.workers[-1]
+    assert pool.step(_stats(0)) == 3         # one at a time, newest first
+    assert draining.terminated and draining in pool.draining
+    assert pool.step(_stats(0)) == 3
+    now[0] += 120
+    assert pool.step(_stats(0)) == 2
+    # a busy spell resets the cooldown
+    assert pool.step(_stats(4)) == 2
+    assert pool.step(_stats(0)) == 2
@@ -0,0 +1,77 @@
+# tests/test_transcode.py
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from data_collector import transcode
+from data_collector.transcode import transcode_csv
+from preprocessor.preprocess import _ParquetChunks
+
+ROWS = 3000
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # types are inferred from the first block only
+    monkeypatch.setattr(transcode, "BLOCK_SIZE", 4096)
+
+
+def _csv(tmp_path, last: dict) -> str:
+    df = pd.DataFrame({"Region": ["East", "West"] * (ROWS // 2),
+                       "Rainfall_mm": range(ROWS),
+                       "Temperature_Celsius": [20.5] * ROWS,
+                       "Days_to_Harvest": [100] * ROWS}).astype(object)
+    for col, value in last.items():
+        df.loc[ROWS - 1, col] = value
+    path = tmp_path / "raw.csv"
+    df.to_csv(path, index=False)
+    assert path.stat().st_size > transcode.BLOCK_SIZE * 5
+    return path
+
+
+def test_late_values_widen_the_column(tmp_path):
+    # an int column meeting a float, an int column meeting text, a float column meeting text
+    path = _csv(tmp_path, {"Rainfall_mm": 1.5, "Days_to_Harvest": "unknown", "Temperature_Celsius": "hot"})
+    info = transcode_csv(path)
+    assert info["rows"] == ROWS
+    assert info["schema"] == {"Region": "string", "Rainfall_mm": "double",
+                              "Temperature_Celsius": "string", "Days_to_Harvest": "string"}
+    assert sorted(info["text_numeric_columns"]) == ["Days_to_Harvest", "Temperature_Celsius"]
+    df = pd.read_parquet(info["path"])
+    assert df["Rainfall_mm"].iloc[-1] == 1.5 and df["Rainfall_mm"].iloc[0] == 0
+    assert df["Days_to_Harvest"].iloc[-1] == "unknown" and df["Days_to_Harvest"].iloc[0] == "100"
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_clean_file_keeps_its_types(tmp_path):
+    info = transcode_csv(_csv(tmp_path, {}))
+    assert info["schema"]["Rainfall_mm"] == "int64" and info["schema"]["Temperature_Celsius"] == "double"
+    assert info["text_numeric_columns"] == []
+    assert pq.ParquetFile(info["path"]).metadata.row_group(0).column(0).compression == "ZSTD"
+
+
+def test_preprocessing_reads_the_parquet_in_chunks(tmp_path):
+    path = _csv(tmp_path, {"Rainfall_mm": 1.5})
+    expected = pd.read_csv(path)
+    chunks = _ParquetChunks(transcode_csv(path)["path"])
+    parts = []
+    try:
+        while True:
+            parts.append(chunks.get_chunk(1000))
+    except StopIteration:
+        pass
+    finally:
+        chunks.close()
+    assert [len(p) for p in parts] == [1000, 1000, 1000]
+    df = pd.concat(parts)
+    # row numbers run on across chunks, as they do reading the CSV
+    assert df.index.tolist() == list(range(ROWS))
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+
+def test_unusable_header_is_refused(tmp_path):
+    path = tmp_path / "raw.csv"
+    path.write_text("a,a\n1,2\n")
+    with pytest.raises(ValueError, match="header"):
+        transcode_csv(path)
+    assert not (tmp_path / "raw.parquet").exists()
@@ -0,0 +1,78 @@
+# tests/test_workers.py
+# Event handlers of the pipeline workers, called directly (no broker)
+from common import dataset, events
+from data_collector import collector
+from predictor import worker as train_worker
+from predictor.train import model_path
+from preprocessor import worker as preprocess_worker
+
+
+def _collect() -> dict:
+    # a missing source makes the collector write its demo dataset
+    return collector.save_raw_from_path("missing.csv")
+
+
+def test_raw_ready_emits_features_ready_once():
+    raw = _collect()
+    out = preprocess_worker.handle_raw_ready({"path": raw["path"]})
+    assert [q for q, _ in out] == [events.FEATURES_READY]
+    payload = out[0][1]
+    assert payload["run_id"] == dataset.current_run_dir().name and payload["source_sha256"] == raw["sha256"]
+    # the same raw data again: nothing new downstream
+    assert preprocess_worker.handle_raw_ready({"path": raw["path"]}) == []
+
+
+def test_redelivered_raw_ready_emits_features_ready_again():
+    raw = _collect()
+    first = preprocess_worker.handle_raw_ready({"path": raw["path"]})
+    # the worker died after preprocessing but before features_ready went out
+    again = preprocess_worker.handle_raw_ready({"path": raw["path"]}, redelivered=True)
+    assert again == first
+
+
+def test_raw_ready_builds_from_the_newest_file():
+    raw = _collect()
+    assert preprocess_worker.handle_raw_ready({"path": "data/raw/gone.csv"})[0][1]["source_sha256"] == raw["sha256"]
+
+
+def test_raw_ready_without_raw_data_does_nothing():
+    assert preprocess_worker.handle_raw_ready({}) == []
+
+
+def _current_run(name=None) -> str:
+    return dataset.current_run_dir(name).name
+
+
+def _fake_training(monkeypatch) -> list:
+    runs = []
+
+    def train_and_save(dataset=None, trigger=None):
+        run_id = _current_run(dataset)
+        runs.append(run_id)
+        model_path(dataset).with_suffix(".run_id").write_text(run_id)
+        return {"run_id": run_id, "rmse": 0.1}
+    monkeypatch.setattr(train_worker, "train_and_save", train_and_save)
+    return runs
+
+
+def test_features_ready_trains_once_per_run(monkeypatch):
+    runs = _fake_training(monkeypatch)
+    _collect()
+    preprocess_worker.handle_raw_ready({})
+    run_id = _current_run()
+    out = train_worker.handle_features_ready({"run_id": run_id})
+    assert [q for q, _ in out] == [events.MODEL_READY]
+    assert out[0][1]["run_id"] == run_id and out[0][1]["model_path"] == str(model_path())
+    # queued behind it from a burst of uploads, or redelivered: the model is current
+    assert train_worker.handle_features_ready({"run_id": "older"}) == []
+    assert train_worker.handle_features_ready({"run_id": run_id}, redelivered=True) == []
+    assert runs == [run_id]
+    # unless a retrain is forced
+    assert train_worker.handle_features_ready({"run_id": run_id, "force": True})
+    assert runs == [run_id, run_id]
+
+
+def test_features_ready_without_published_features_does_nothing(monkeypatch):
+    runs = _fake_training(monkeypatch)
+    assert train_worker.handle_features_ready({"run_id": "r"}) == []
+    assert runs == []
@@ -8,13 +8,15 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import sys
 import os
+import time
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import (
-    check_service_health, collect_data, preprocess_data, train_model,
-    predict_yield, explain_prediction, create_metrics_dashboard,
-    create_feature_importance_chart, create_yield_distribution_chart
+    check_service_health, collect_data, start_preprocess_job, get_preprocess_job,
+    cancel_preprocess_job, train_model, predict_yield, explain_prediction, create_metrics_dashboard,
+    create_feature_importance_chart, create_yield_distribution_chart,
+    get_pipeline_status, get_stage_history, get_pipeline_trends
 )
 from auth_utils import is_authenticated
 from modern_footer import render_modern_footer
@@ -40,26 +42,56 @@ with st.sidebar:
         st.rerun()
     
     if st.button("📊 Run Full Pipeline"):
-        with st.spinner("Running full pipeline..."):
-            # Collect data
+        with st.spinner("Collecting data..."):
             success, msg = collect_data()
+        if success:
+            st.success("✅ Data collected")
+            # Preprocess as a background job; its progress is polled below
+            success, job = start_preprocess_job()
             if success:
-                st.success("✅ Data collected")
-                # Preprocess
-                success, msg = preprocess_data()
-                if success:
-                    st.success("✅ Data preprocessed")
-                    # Train model
+                st.session_state.pipeline_job_id = job["job_id"]
+            else:
+                st.error(f"❌ Preprocessing failed: {job.get('error', 'Unknown error')}")
+        else:
+            st.error(f"❌ Collection failed: {msg}")
+
+    job_id = st.session_state.get("pipeline_job_id")
+    if job_id:
+        ok, status = get_preprocess_job(job_id)
+        if not ok:
+            st.session_state.pipeline_job_id = None
+            st.error(f"❌ Preprocessing failed: {status.get('error', 'Unknown error')}")
+        elif status["state"] in ("queued", "running"):
+            total = status.get("rows_total_estimate") or 0
+            done = status.get("rows_processed") or 0
+            st.progress(min(done / total, 1.0) if total else 0.0)
+            eta = status.get("eta_seconds")
+            st.caption(
+                f"{status.get('stage') or 'queued'} · {done:,} rows"
+                + (f" · ETA {eta:.0f}s" if eta is not None else "")
+            )
+            if st.button("⏹️ Cancel Preprocessing"):
+                cancel_preprocess_job(job_id)
+                st.rerun()
+            # poll until the job finishes
+            time.sleep(1)
+            st.rerun()
+        else:
+            st.session_state.pipeline_job_id = None
+            if status["state"] == "succeeded":
+                st.success("✅ Data preprocessed")
+                # Train model
+                with st.spinner("Training model..."):
                     success, metrics = train_model()
-                    if success:
-                        st.success("✅ Model trained")
-                        st.session_state.training_metrics = metrics
-                    else:
-                        st.error(f"❌ Training failed: {metrics.get('error', 'Unknown error')}")
+                if success:
+                    st.success("✅ Model trained")
+                    st.session_state.training_metrics = metrics
                 else:
-                    st.error(f"❌ Preprocessing failed: {msg}")
+                    st.error(f"❌ Training failed: {metrics.get('error', 'Unknown error')}")
+            elif status["state"] == "cancelled":
+                st.warning("⏹️ Preprocessing cancelled")
             else:
-                st.error(f"❌ Collection failed: {msg}")
+                st.error(f"❌ Preprocessing failed: {status.get('error') or status['state']}")
 
 # Main content
 col1, col2 = st.columns([2, 1])
@@ -79,30 +111,83 @@ with col1:
             else:
                 st.error(f"❌ {service}")
     
-    # Pipeline status
+    # Pipeline status: latest run of each stage from the pipeline history
     st.subheader("🔄 Pipeline Status")
-    
+
+    def _ago(ts):
+        if not ts:
+            return None
+        secs = (datetime.utcnow() - datetime.fromisoformat(ts.rstrip("Z"))).total_seconds()
+        for unit, size in (("d", 86400), ("h", 3600), ("min", 60)):
+            if secs >= size:
+                return f"{secs / size:.0f} {unit} ago"
+        return "just now"
+
+    status_icons = {"succeeded": "✅ Succeeded", "failed": "❌ Failed", "running": "⏳ Running",
+                    "skipped": "⏭️ Skipped"}
+    ok_status, pipeline_status = get_pipeline_status()
     pipeline_cols = st.columns(4)
-    with pipeline_cols[0]:
-        st.metric("Data Collection", "Ready", "✅")
-    with pipeline_cols[1]:
-        st.metric("Preprocessing", "Ready", "✅")
-    with pipeline_cols[2]:
-        st.metric("Model Training", "Ready", "✅")
+    for i, (stage, label) in enumerate([("collect", "Data Collection"), ("preprocess", "Preprocessing"),
+                                        ("train", "Model Training")]):
+        with pipeline_cols[i]:
+            last = pipeline_status.get(stage, {}).get("last") if ok_status else None
+            if last is None:
+                st.metric(label, "Never run" if ok_status else "Unknown")
+            else:
+                st.metric(label, status_icons.get(last["status"], last["status"]),
+                          _ago(last["started_at"]), delta_color="off")
     with pipeline_cols[3]:
-        st.metric("Prediction", "Ready", "✅")
-    
-    # Recent activity
+        st.metric("Prediction", "✅ Ready" if health_status.get("Predictor") else "❌ Down")
+    if not ok_status:
+        st.caption(f"Pipeline history unavailable: {pipeline_status.get('error')}")
+
+    # Recent activity and trends for a time range (indexed range queries on the history store)
     st.subheader("📈 Recent Activity")
-    
-    # Sample activity data
-    activity_data = pd.DataFrame({
-        "Time": [datetime.now() - timedelta(hours=i) for i in range(5, 0, -1)],
-        "Activity": ["Model Training", "Data Collection", "Prediction", "Data Preprocessing", "System Startup"],
-        "Status": ["Success", "Success", "Success", "Success", "Success"]
-    })
-    
-    st.dataframe(activity_data, use_container_width=True)
+    ranges = {"Last 24 hours": (timedelta(days=1), "hour"), "Last 7 days": (timedelta(days=7), "day"),
+              "Last 30 days": (timedelta(days=30), "day")}
+    window = st.selectbox("Time range", list(ranges), label_visibility="collapsed")
+    span, bucket = ranges[window]
+    since = (datetime.utcnow() - span).isoformat()
+
+    ok_hist, stage_history = get_stage_history(since=since, limit=100)
+    if ok_hist and stage_history["stages"]:
+        activity = pd.DataFrame(stage_history["stages"])
+        activity["Time"] = pd.to_datetime(activity["started_at"].str.rstrip("Z")).dt.strftime("%Y-%m-%d %H:%M:%S")
+        activity["status"] = activity["status"].map(lambda v: status_icons.get(v, v))
+        activity = activity.rename(columns={
+            "stage": "Stage", "status": "Status", "trigger": "Trigger", "rows": "Rows",
+            "seconds": "Seconds", "rows_per_sec": "Rows/s", "peak_rss_mb": "Peak MB", "cache_hit": "Cached"})
+        st.dataframe(activity[["Time", "Stage", "Status", "Trigger", "Rows", "Seconds", "Rows/s",
+                               "Peak MB", "Cached"]], use_container_width=True, hide_index=True)
+    elif ok_hist:
+        st.info("No pipeline activity in this time range.")
+    else:
+        st.warning(stage_history.get("error"))
+
+    ok_trends, trend_data = get_pipeline_trends(since=since, bucket=bucket)
+    if ok_trends and trend_data["trends"]:
+        trend_df = pd.DataFrame(trend_data["trends"])
+        duration_tab, throughput_tab, memory_tab, runs_tab = st.tabs(
+            ["⏱️ Duration", "🚀 Throughput", "🧠 Peak memory", "📋 Runs"])
+        with duration_tab:
+            fig = px.line(trend_df, x="bucket", y="avg_seconds", color="stage", markers=True,
+                          labels={"bucket": "Time (UTC)", "avg_seconds": "Mean duration (s)"})
+            st.plotly_chart(fig, use_container_width=True)
+        with throughput_tab:
+            fig = px.line(trend_df.dropna(subset=["avg_rows_per_sec"]), x="bucket", y="avg_rows_per_sec",
+                          color="stage", markers=True,
+                          labels={"bucket": "Time (UTC)", "avg_rows_per_sec": "Rows / second"})
+            st.plotly_chart(fig, use_container_width=True)
+        with memory_tab:
+            fig = px.bar(trend_df.dropna(subset=["peak_rss_mb"]), x="bucket", y="peak_rss_mb", color="stage",
+                         barmode="group", labels={"bucket": "Time (UTC)", "peak_rss_mb": "Peak RSS (MB)"})
+            st.plotly_chart(fig, use_container_width=True)
+        with runs_tab:
+            runs_long = trend_df.melt(id_vars=["bucket", "stage"], value_vars=["runs", "failed", "cache_hits"],
+                                      var_name="kind", value_name="count")
+            fig = px.bar(runs_long, x="bucket", y="count", color="kind", facet_row="stage",
+                         barmode="group", labels={"bucket": "Time (UTC)"})
+            st.plotly_chart(fig, use_container_width=True)
 
 with col2:
     st.header("🎯 Quick Predict")
@@ -8,12 +8,15 @@ import plotly.graph_objects as go
 from datetime import datetime
 import sys
 import os
+import time
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import (
     predict_yield, explain_prediction, create_feature_importance_chart,
-    create_yield_distribution_chart, save_predictions_to_csv, load_sample_data
+    create_yield_distribution_chart, save_predictions_to_csv, load_sample_data,
+    submit_batch_job, list_batch_jobs, get_batch_job, cancel_batch_job, download_batch_result,
+    get_batch_summary
 )
 from weather_soil import fetch_weather, fetch_soil
 from auth_utils import is_authenticated
@@ -192,81 +195,59 @@ if prediction_mode == "Single Prediction":
 
 elif prediction_mode == "Batch Upload":
     st.header("📊 Batch Prediction")
-    
+    st.caption("Batches run on the server: you can close this tab and come back for the results.")
+
     col1, col2 = st.columns([1, 1])
-    
+
     with col1:
-        st.subheader("Upload CSV File")
-        
+        st.subheader("Upload File")
+
         # File upload
         uploaded_file = st.file_uploader(
-            "Choose a CSV file",
-            type="csv",
-            help="Upload a CSV file with columns: Region, Soil_Type, Crop, Rainfall_mm, Temperature_Celsius, Fertilizer_Used, Irrigation_Used, Weather_Condition, Days_to_Harvest"
+            "Choose a CSV or Parquet file",
+            type=["csv", "parquet"],
+            help="Upload a file with columns: Region, Soil_Type, Crop, Rainfall_mm, Temperature_Celsius, Fertilizer_Used, Irrigation_Used, Weather_Condition, Days_to_Harvest"
         )
-        
+
         if uploaded_file is not None:
             try:
-                df = pd.read_csv(uploaded_file)
-                st.success(f"✅ File uploaded successfully! {len(df)} rows found.")
-                
+                # only a preview is read here; the whole file is processed server-side
+                if uploaded_file.name.endswith(".parquet"):
+                    df = pd.read_parquet(uploaded_file).head(100)
+                else:
+                    df = pd.read_csv(uploaded_file, nrows=100)
+                uploaded_file.seek(0)
+
                 # Display sample data
                 st.subheader("📋 Sample Data")
                 st.dataframe(df.head(), use_container_width=True)
-                
+
                 # Validate required columns
                 required_columns = [
-                    "Region", "Soil_Type", "Crop", "Rainfall_mm", 
-                    "Temperature_Celsius", "Fertilizer_Used", 
+                    "Region", "Soil_Type", "Crop", "Rainfall_mm",
+                    "Temperature_Celsius", "Fertilizer_Used",
                     "Irrigation_Used", "Weather_Condition", "Days_to_Harvest"
                 ]
-                
+
                 missing_columns = [col for col in required_columns if col not in df.columns]
-                
+
                 if missing_columns:
                     st.error(f"❌ Missing required columns: {', '.join(missing_columns)}")
                 else:
-                    if st.button("🔮 Process Batch Predictions", type="primary"):
-                        with st.spinner("Processing batch predictions..."):
-                            batch_predictions = []
-                            batch_explanations = []
-                            
-                            progress_bar = st.progress(0)
-                            status_text = st.empty()
-                            
-                            for i, row in df.iterrows():
-                                status_text.text(f"Processing row {i+1}/{len(df)}")
-                                progress_bar.progress((i+1) / len(df))
-                                
-                                payload = row.to_dict()
-                                
-                                # Make prediction
-                                success, result = predict_yield(payload)
-                                if success:
-                                    predicted_yield = result.get("predicted_yield", 0)
-                                    batch_predictions.append({
-                                        "timestamp": datetime.now(),
-                                        "predicted_yield": predicted_yield,
-                                        "payload": payload
-                                    })
-                                    
-                                    # Get explanation (optional for batch)
-                                    exp_success, explanation = explain_prediction(payload)
-                                    if exp_success:
-                                        batch_explanations.append(explanation)
-                                    else:
-                                        batch_explanations.append({"summary": "No explanation available"})
-                            
-                            # Store results
-                            st.session_state.predictions.extend(batch_predictions)
-                            st.session_state.explanations.extend(batch_explanations)
-                            
-                            st.success(f"✅ Batch processing complete! {len(batch_predictions)} predictions made.")
+                    explain = st.checkbox("Include SHAP explanations", value=False,
+                                          help="Per-feature contributions for every row (slower)")
+                    if st.button("🔮 Submit Batch Job", type="primary"):
+                        success, job = submit_batch_job(uploaded_file, uploaded_file.name, explain)
+                        if success:
+                            st.session_state.batch_job_id = job["job_id"]
+                            st.success(f"✅ Job {job['job_id']} queued")
                             st.rerun()
-            
+                        else:
+                            st.error(f"❌ {job.get('error', 'Unknown error')}")
+
             except Exception as e:
                 st.error(f"❌ Error reading file: {e}")
-        
+
         # Sample data download
         st.subheader("📥 Download Sample Template")
         sample_data = load_sample_data()
@@ -277,34 +258,87 @@ elif prediction_mode == "Batch Upload":
             file_name="cropsense_sample.csv",
             mime="text/csv"
         )
-    
+
     with col2:
-        st.subheader("Batch Results")
-        
-        if st.session_state.predictions:
-            # Create results dataframe
-            results_df = pd.DataFrame([
-                {
-                    "Timestamp": pred["timestamp"],
-                    "Region": pred["payload"]["Region"],
-                    "Crop": pred["payload"]["Crop"],
-                    "Predicted Yield": pred["predicted_yield"]
-                }
-                for pred in st.session_state.predictions
-            ])
-            
-            st.dataframe(results_df, use_container_width=True)
-            
-            # Summary statistics
-            st.subheader("📊 Summary Statistics")
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.metric("Total Predictions", len(results_df))
-            with col2:
-                st.metric("Average Yield", f"{results_df['Predicted Yield'].mean():.2f} t/ha")
-            with col3:
-                st.metric("Max Yield", f"{results_df['Predicted Yield'].max():.2f} t/ha")
+        st.subheader("Batch Jobs")
+
+        ok, listing = list_batch_jobs()
+        jobs = listing.get("jobs", []) if ok else []
+        if not ok:
+            st.error(f"❌ {listing.get('error')}")
+        elif not jobs:
+            st.info("No batch jobs yet.")
+        else:
+            ids = [j["job_id"] for j in jobs]
+            current = st.session_state.get("batch_job_id")
+            job_id = st.selectbox(
+                "Job", ids, index=ids.index(current) if current in ids else 0,
+                format_func=lambda i: next(f"{j['filename']} · {j['state']} · {j['created_at']}"
+                                           for j in jobs if j["job_id"] == i)
+            )
+            st.session_state.batch_job_id = job_id
+            ok, job = get_batch_job(job_id)
+            if not ok:
+                st.error(f"❌ {job.get('error')}")
+            else:
+                st.progress(min(job["progress"], 1.0))
+                eta = job.get("eta_seconds")
+                st.caption(
+                    f"{job['state']} · {job['rows_done']:,} / {job['rows_total'] or 0:,} rows"
+                    + (f" · {job['rows_per_sec']:,.0f} rows/s" if job.get("rows_per_sec") else "")
+                    + (f" · ETA {eta:.0f}s" if eta is not None else "")
+                    + (" · with explanations" if job["explain"] else "")
+                )
+
+                if job["state"] in ("queued", "staging", "running"):
+                    if st.button("⏹️ Cancel Job"):
+                        cancel_batch_job(job_id)
+                        st.rerun()
+                    # poll until the job finishes
+                    time.sleep(2)
+                    st.rerun()
+                elif job["state"] == "failed":
+                    st.error(f"❌ Job failed: {job.get('error')}")
+                elif job["state"] == "succeeded":
+                    # the server summarises the results; the full file is only fetched to download it
+                    name = job["filename"].rsplit(".", 1)[0]
+                    fmt = st.radio("Format", ["csv", "parquet"], horizontal=True, key=f"fmt_{job_id}")
+                    if st.button("📦 Prepare Download"):
+                        with st.spinner("Downloading results..."):
+                            ok, data = download_batch_result(job_id, fmt)
+                        if ok:
+                            # held for this run only, not in session_state
+                            st.download_button(
+                                label=f"📥 Download Results ({fmt.upper()})",
+                                data=data,
+                                file_name=f"{name}_predictions.{fmt}",
+                                mime="text/csv" if fmt == "csv" else "application/octet-stream"
+                            )
+                        else:
+                            st.error(f"❌ Download failed: {data.decode(errors='replace')}")
+
+                    ok, summary = get_batch_summary(job_id)
+                    if not ok:
+                        st.error(f"❌ {summary.get('error')}")
+                    else:
+                        st.dataframe(pd.DataFrame(summary["preview"]), use_container_width=True)
+
+                        # Summary statistics
+                        st.subheader("📊 Summary Statistics")
+                        col1, col2, col3 = st.columns(3)
+
+                        with col1:
+                            st.metric("Total Predictions", f"{summary['rows']:,}")
+                        with col2:
+                            st.metric("Average Yield", f"{summary['mean'] or 0:.2f} t/ha")
+                        with col3:
+                            st.metric("Max Yield", f"{summary['max'] or 0:.2f} t/ha")
+
+                        if summary.get("top_feature"):
+                            st.subheader("🧠 Most Influential Features")
+                            counts = pd.DataFrame(sorted(summary["top_feature"].items(), key=lambda kv: -kv[1]),
+                                                  columns=["Feature", "Rows"])
+                            st.plotly_chart(px.bar(counts, x="Feature", y="Rows"), use_container_width=True)
 
 elif prediction_mode == "Scenario Analysis":
     st.header("🎭 Scenario Analysis")
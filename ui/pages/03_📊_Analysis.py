@@ -15,7 +15,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import (
     predict_yield, explain_prediction, create_feature_importance_chart,
-    load_sample_data, check_service_health
+    load_sample_data, check_service_health, load_processed_features, get_dataset_summary
 )
 from auth_utils import is_authenticated
 from modern_footer import render_modern_footer
@@ -124,6 +124,46 @@ if not st.session_state.analysis_data:
     st.subheader("📋 Sample Data Preview")
     sample_data = load_sample_data()
     st.dataframe(sample_data, use_container_width=True)
+
+    # Processed dataset (reads only the selected crop/region partitions)
+    st.subheader("📂 Processed Dataset")
+    pcols = st.columns(2)
+    with pcols[0]:
+        sel_crop = st.selectbox("Crop", ["All", "Wheat", "Rice", "Soybean", "Barley", "Maize", "Cotton"])
+    with pcols[1]:
+        sel_region = st.selectbox("Region", ["All", "West", "East", "North", "South"])
+    crop_arg = None if sel_crop == "All" else sel_crop
+    region_arg = None if sel_region == "All" else sel_region
+    ok, summary = get_dataset_summary(crop=crop_arg, region=region_arg)
+    target_hist = (summary.get("stats") or {}).get("target_histogram") if ok else None
+    # the summary answers from metadata; only older runs without stats need a read
+    processed = None if target_hist else load_processed_features(
+        columns=["Yield_tons_per_hectare"], crop=crop_arg, region=region_arg,
+    )
+    if target_hist:
+        mcols = st.columns(3)
+        mcols[0].metric("Rows", f"{summary['rows']:,}")
+        mcols[1].metric("Files", summary["files"])
+        mcols[2].metric("Size", f"{summary['bytes'] / 1e6:.1f} MB")
+        edges = target_hist["edges"]
+        centers = [(a + b) / 2 for a, b in zip(edges[:-1], edges[1:])]
+        fig = px.bar(x=centers, y=target_hist["counts"], title="Observed Yield Distribution",
+                     labels={"x": target_hist["column"], "y": "count"})
+        fig.update_layout(height=350, bargap=0)
+        st.plotly_chart(fig, use_container_width=True)
+        nulls = {c: v["nulls"] for c, v in summary["stats"]["columns"].items() if v.get("nulls")}
+        if nulls:
+            st.caption("Missing values: " + ", ".join(f"{c} {n:,}" for c, n in nulls.items()))
+    elif processed is None:
+        st.info("No processed data yet. Run the pipeline from the Dashboard.")
+    elif processed.empty:
+        st.info("No processed rows for this selection.")
+    else:
+        st.metric("Rows", f"{len(processed):,}")
+        fig = px.histogram(processed, x="Yield_tons_per_hectare", nbins=30,
+                           title="Observed Yield Distribution")
+        fig.update_layout(height=350)
+        st.plotly_chart(fig, use_container_width=True)
     
     st.markdown("""
     ### 🎯 Analysis Features Available:
@@ -10,6 +10,14 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import json
+import sys
+
+# Ensure project root is on path to import `common`
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from common.readiness import wait_ready
 
 # Service URLs (work both in Docker and locally via env overrides)
 COLLECTOR_URL = os.environ.get("COLLECTOR_URL", "http://collector:8001")
@@ -17,6 +25,7 @@ PREPROCESSOR_URL = os.environ.get("PREPROCESSOR_URL", "http://preprocessor:8002"
 PREDICTOR_URL = os.environ.get("PREDICTOR_URL", "http://predictor:8003")
 INTERPRETER_URL = os.environ.get("INTERPRETER_URL", "http://interpreter:8004")
 OLLAMA_URL = os.environ.get("OLLAMA_HOST", "http://ollama:11434")
+PIPELINE_URL = os.environ.get("PIPELINE_URL", "http://pipeline-api:8005")
 
 def check_service_health() -> Dict[str, bool]:
     """Check health of all services"""
@@ -28,15 +37,9 @@ def check_service_health() -> Dict[str, bool]:
         "Ollama": f"{OLLAMA_URL}/api/tags"
     }
     
-    health_status = {}
-    for name, url in services.items():
-        try:
-            response = requests.get(url, timeout=3)
-            health_status[name] = response.status_code == 200
-        except Exception:
-            health_status[name] = False
-    
-    return health_status
+    # all probed at once, one attempt each: as slow as the slowest service, not the sum
+    status = wait_ready(services, deadline=0, timeout=3)
+    return {name: res["ready"] for name, res in status["services"].items()}
 
 def collect_data() -> Tuple[bool, str]:
     """Collect data from source"""
@@ -66,6 +69,38 @@ def preprocess_data() -> Tuple[bool, str]:
     except Exception as e:
         return False, f"Preprocessing error: {e}"
 
+def start_preprocess_job(params: Optional[Dict] = None) -> Tuple[bool, Dict]:
+    """Submit a background preprocessing job"""
+    try:
+        response = requests.post(f"{PREPROCESSOR_URL}/preprocess/jobs",
+                               json=params or {},
+                               timeout=15)
+        if response.status_code == 202:
+            return True, response.json()
+        else:
+            return False, {"error": f"Preprocessing failed: {response.text}"}
+    except Exception as e:
+        return False, {"error": f"Preprocessing error: {e}"}
+
+def get_preprocess_job(job_id: str) -> Tuple[bool, Dict]:
+    """Fetch progress of a preprocessing job"""
+    try:
+        response = requests.get(f"{PREPROCESSOR_URL}/preprocess/jobs/{job_id}", timeout=5)
+        if response.status_code == 200:
+            return True, response.json()
+        else:
+            return False, {"error": f"Job status failed: {response.text}"}
+    except Exception as e:
+        return False, {"error": f"Job status error: {e}"}
+
+def cancel_preprocess_job(job_id: str) -> Tuple[bool, Dict]:
+    """Cancel a preprocessing job"""
+    try:
+        response = requests.delete(f"{PREPROCESSOR_URL}/preprocess/jobs/{job_id}", timeout=5)
+        return response.status_code == 200, response.json()
+    except Exception as e:
+        return False, {"error": f"Cancel error: {e}"}
+
 def train_model() -> Tuple[bool, Dict]:
     """Train the ML model"""
     try:
@@ -89,6 +124,8 @@ def predict_yield(payload: Dict) -> Tuple[bool, Dict]:
         if response.status_code == 200:
             result = response.json()
             return True, result
+        elif response.status_code == 503 and "Retry-After" in response.headers:
+            return False, {"error": f"Service busy, retry in {response.headers['Retry-After']} s"}
         else:
             return False, {"error": f"Prediction failed: {response.text}"}
     except Exception as e:
@@ -104,11 +141,118 @@ def explain_prediction(payload: Dict) -> Tuple[bool, Dict]:
         if response.status_code == 200:
             result = response.json()
             return True, result
+        elif response.status_code == 503 and "Retry-After" in response.headers:
+            return False, {"error": f"Service busy, retry in {response.headers['Retry-After']} s"}
         else:
             return False, {"error": f"Explanation failed: {response.text}"}
     except Exception as e:
         return False, {"error": f"Explanation error: {e}"}
 
+def get_dataset_summary(crop: Optional[str] = None, region: Optional[str] = None) -> Tuple[bool, Dict]:
+    """Processed dataset summary from the preprocessor (metadata only, no data scan)"""
+    try:
+        params = {k: v for k, v in {"crop": crop, "region": region}.items() if v}
+        response = requests.get(f"{PREPROCESSOR_URL}/summary", params=params, timeout=5)
+        if response.status_code == 200:
+            return True, response.json()
+        return False, {"error": f"Summary failed: {response.text}"}
+    except Exception as e:
+        return False, {"error": f"Summary error: {e}"}
+
+def submit_batch_job(file, filename: str, explain: bool = False) -> Tuple[bool, Dict]:
+    """Queue a CSV/Parquet file (an open file object, streamed) for server-side batch prediction"""
+    try:
+        response = requests.post(f"{PREDICTOR_URL}/batch/jobs", params={"explain": explain},
+                                 files={"file": (filename, file)}, timeout=120)
+        if response.status_code == 202:
+            return True, response.json()
+        return False, {"error": f"Batch job failed: {response.text}"}
+    except Exception as e:
+        return False, {"error": f"Batch job error: {e}"}
+
+def list_batch_jobs(limit: int = 20) -> Tuple[bool, Dict]:
+    """Recent batch jobs, newest first"""
+    try:
+        response = requests.get(f"{PREDICTOR_URL}/batch/jobs", params={"limit": limit}, timeout=5)
+        if response.status_code == 200:
+            return True, response.json()
+        return False, {"error": f"Batch jobs failed: {response.text}"}
+    except Exception as e:
+        return False, {"error": f"Batch jobs error: {e}"}
+
+def get_batch_job(job_id: str) -> Tuple[bool, Dict]:
+    """Progress of a batch job"""
+    try:
+        response = requests.get(f"{PREDICTOR_URL}/batch/jobs/{job_id}", timeout=5)
+        if response.status_code == 200:
+            return True, response.json()
+        return False, {"error": f"Job status failed: {response.text}"}
+    except Exception as e:
+        return False, {"error": f"Job status error: {e}"}
+
+def cancel_batch_job(job_id: str) -> Tuple[bool, Dict]:
+    """Cancel a batch job"""
+    try:
+        response = requests.delete(f"{PREDICTOR_URL}/batch/jobs/{job_id}", timeout=5)
+        return response.status_code == 200, response.json()
+    except Exception as e:
+        return False, {"error": f"Cancel error: {e}"}
+
+def get_batch_summary(job_id: str, rows: int = 200) -> Tuple[bool, Dict]:
+    """Prediction count, mean, max and the first rows of a finished batch job"""
+    try:
+        response = requests.get(f"{PREDICTOR_URL}/batch/jobs/{job_id}/summary",
+                                params={"rows": rows}, timeout=30)
+        if response.status_code == 200:
+            return True, response.json()
+        return False, {"error": f"Job summary failed: {response.text}"}
+    except Exception as e:
+        return False, {"error": f"Job summary error: {e}"}
+
+def download_batch_result(job_id: str, fmt: str = "csv") -> Tuple[bool, bytes]:
+    """Results of a finished batch job as CSV or Parquet bytes"""
+    try:
+        response = requests.get(f"{PREDICTOR_URL}/batch/jobs/{job_id}/result",
+                                params={"format": fmt}, timeout=300)
+        if response.status_code == 200:
+            return True, response.content
+        return False, response.text.encode()
+    except Exception as e:
+        return False, str(e).encode()
+
+def _pipeline_get(path: str, params: Optional[Dict] = None) -> Tuple[bool, Dict]:
+    try:
+        response = requests.get(f"{PIPELINE_URL}{path}",
+                                params={k: v for k, v in (params or {}).items() if v is not None}, timeout=5)
+        if response.status_code == 200:
+            return True, response.json()
+        return False, {"error": f"Pipeline history failed: {response.text}"}
+    except Exception as e:
+        return False, {"error": f"Pipeline history error: {e}"}
+
+def get_pipeline_status() -> Tuple[bool, Dict]:
+    """Latest run of each pipeline stage"""
+    return _pipeline_get("/history/status")
+
+def get_stage_history(since: Optional[str] = None, stage: Optional[str] = None,
+                      limit: int = 50) -> Tuple[bool, Dict]:
+    """Recent collect/preprocess/train executions, newest first"""
+    return _pipeline_get("/history/stages", {"since": since, "stage": stage, "limit": limit})
+
+def get_pipeline_trends(since: Optional[str] = None, bucket: str = "hour") -> Tuple[bool, Dict]:
+    """Per-stage runs, duration, throughput and peak memory per time bucket"""
+    return _pipeline_get("/history/trends", {"since": since, "bucket": bucket})
+
+def load_processed_features(columns: Optional[List[str]] = None,
+                            crop: Optional[str] = None,
+                            region: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Read processed features for a crop/region (partition-pruned, selected columns only)"""
+    from common.dataset import read_features
+    try:
+        return read_features(columns=columns, crop=crop, region=region)
+    except FileNotFoundError:
+        return None
+
 def create_feature_importance_chart(features: List[Tuple[str, float]]) -> go.Figure:
     """Create feature importance chart"""
     if not features: